@@ -0,0 +1,301 @@
+"""
+Batch runner that generates the datasets of many config files on a shared worker pool
+
+Usage:
+$ python voronoi/batch.py configs/sample_case_*.yaml --workers 8
+
+All diagrams of all configs are expanded into a single queue of
+(config, datatype, index) work items. The items are sorted by their
+estimated cost and processed longest-first, so that the slow diagrams
+(many seed points, Poisson disk sampling, noise processors) do not end
+up at the tail of the run.
+
+Each diagram is seeded with `seed_diagram(seed, index)`, so the output
+does not depend on the scheduling order and is identical to running
+main.py with `seeding: per_diagram`.
+
+With --memory_budget, the number of workers and of diagrams in flight are
+chosen so that their peak memory fits the budget (see memory.py): peaks are
+estimated from each config, measured on its first diagrams, and recorded
+in <output_dir>/run_report.json.
+
+The dataset statistics of each diagram are computed by its worker and
+merged as they arrive into <output_dir>/stats.json, as main.py writes them
+(they are integer counts, so the merge order does not matter).
+"""
+
+import os
+import sys
+import json
+import queue
+import argparse
+import multiprocessing
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, NamedTuple
+from tqdm import tqdm
+from utils import VoronoiGenerator
+from utils.rng import seed_diagram
+from utils.label_codecs import PackedLabel
+from splitters import VoronoiSplitter
+from main import load_config, validate_config_file, check_directory, create_directory, save_images, get_point_params
+from memory import MemoryModel, MemoryBudget, current_rss, measure_peak
+from dataset_stats import DatasetStatistics, write_statistics
+
+# Rough per-unit costs in seconds, measured on a 3072x2048 canvas
+RENDER_COST_PER_PIXEL = 2e-9
+RENDER_COST_PER_POINT = 2.5e-5
+POISSON_COST_PER_POINT = 2.5e-4
+SAVE_COST_PER_PIXEL = 1e-8
+PROCESSOR_COST_PER_PIXEL = {
+    "crop": 0.0,
+    "elliptical_mask": 1e-9,
+    "gaussian_noise": 4.5e-8,
+    "perlin_noise": 3e-7,
+}
+
+
+class WorkItem(NamedTuple):
+    """One diagram to be generated"""
+    cost: float
+    config_index: int
+    datatype: str
+    index: int
+
+
+def estimate_points_num(voronoi_config: Dict[str, Any], point_params: Dict[str, Any]) -> float:
+    """Estimate the number of seed points of a diagram."""
+    if "points_num" in point_params:
+        return point_params["points_num"]
+    # Dart throwing stops at roughly half of the hexagonal packing density
+    area = voronoi_config["width"] * voronoi_config["height"]
+    return 0.5 * area / point_params["min_distance"] ** 2
+
+def estimate_cost(voronoi_config: Dict[str, Any], index: int) -> float:
+    """Estimate the time needed to generate and save the index-th diagram."""
+    width, height = voronoi_config["width"], voronoi_config["height"]
+    point_params = get_point_params(voronoi_config, index)
+    points_num = estimate_points_num(voronoi_config, point_params)
+
+    cost = RENDER_COST_PER_PIXEL * width * height + RENDER_COST_PER_POINT * points_num
+    if "min_distance" in point_params and "bank" not in voronoi_config["point_generation"]["params"]:
+        cost += POISSON_COST_PER_POINT * points_num
+
+    for proc_config in voronoi_config.get("post_processors", []):
+        if proc_config["type"] == "crop":
+            width = proc_config["params"]["crop_width"]
+            height = proc_config["params"]["crop_height"]
+        cost += PROCESSOR_COST_PER_PIXEL.get(proc_config["type"], 0.0) * width * height
+
+    return cost + SAVE_COST_PER_PIXEL * width * height
+
+def build_work_items(voronoi_configs: List[Dict[str, Any]]) -> List[WorkItem]:
+    """Expand all configs into work items sorted longest-first."""
+    items = []
+    for config_index, voronoi_config in enumerate(voronoi_configs):
+        for datatype, params in voronoi_config["datatype_info"].items():
+            for i in range(params["diagram_num"]):
+                items.append(WorkItem(estimate_cost(voronoi_config, i), config_index, datatype, i))
+    items.sort(key=lambda item: item.cost, reverse=True)
+    return items
+
+def generator_key(voronoi_config: Dict[str, Any]) -> str:
+    """Key of the settings that affect the generator and splitter (configs differing only in the output directory, datatypes, seeding or file format share a cache entry)."""
+    settings = {k: v for k, v in voronoi_config.items() if k not in ("output_dir", "output", "datatype_info", "seeding")}
+    # Weight maps and grain graphs are built by the generator, unlike the file format settings
+    settings["output"] = {k: v for k, v in voronoi_config.get("output", {}).items() if k not in ("label_format", "backend", "shard_size_mb")}
+    return json.dumps(settings, sort_keys=True)
+
+
+def prepare_point_bank(voronoi_config: Dict[str, Any]):
+    """Build and save the Poisson disk point-set bank of a config once, so that workers only load it (they never write it)."""
+    point_params = voronoi_config["point_generation"]["params"]
+    if voronoi_config["point_generation"]["method"] != "poisson_disk" or "bank" not in point_params:
+        return
+    if point_params["bank"].get("path") is None:
+        return  # In-memory banks are built by each worker
+    with VoronoiGenerator(voronoi_config) as voronoi_generator:
+        point_generator = voronoi_generator.point_generator
+    bank = point_generator.get_bank(voronoi_config["width"], voronoi_config["height"], point_params.get("max_attempts", 100))
+    for min_distance in point_params["min_distance"]:
+        bank.get_sets(min_distance)
+
+
+# Number of generators a worker keeps (their thread pools and cached spectra are not part of the measured peaks)
+WORKER_CACHE_SIZE = 2
+
+# State of each worker process
+_worker_configs = []
+_worker_cache = OrderedDict()
+
+def init_worker(voronoi_configs):
+    """Initialize a worker process."""
+    global _worker_configs
+    _worker_configs = voronoi_configs
+
+def get_components(voronoi_config):
+    """Get the generator and splitter of a config, reusing the ones recently built by this worker (least recently used ones are closed)."""
+    key = generator_key(voronoi_config)
+    if key in _worker_cache:
+        _worker_cache.move_to_end(key)
+    else:
+        _worker_cache[key] = (VoronoiGenerator(voronoi_config), VoronoiSplitter(voronoi_config))
+        while len(_worker_cache) > WORKER_CACHE_SIZE:
+            _, (voronoi_generator, _) = _worker_cache.popitem(last=False)
+            voronoi_generator.close()
+    return _worker_cache[key]
+
+def run_item(item: WorkItem, measure: bool = False):
+    """Generate, split and save one diagram, measuring its peak memory if requested (calibration)."""
+    if measure:
+        return measure_peak(generate_item, item)
+    return generate_item(item), None
+
+def generate_item(item: WorkItem):
+    """Generate, split and save one diagram, returning the statistics of its tiles."""
+    voronoi_config = _worker_configs[item.config_index]
+    voronoi_generator, voronoi_splitter = get_components(voronoi_config)
+    seed_diagram(voronoi_config["datatype_info"][item.datatype]["seed"], item.index)
+
+    kwargs = get_point_params(voronoi_config, item.index)
+    graphs = voronoi_config.get("output", {}).get("grain_graph", False)
+    if graphs:
+        diagram = voronoi_generator.generate_vector(**kwargs)
+        voronoi_image, voronoi_label = voronoi_generator.rasterize(diagram)
+    else:
+        voronoi_image, voronoi_label = voronoi_generator.generate(**kwargs)
+    voronoi_weight = voronoi_generator.generate_weights(voronoi_label)
+    label_format = voronoi_config.get("output", {}).get("label_format", "png")
+    if label_format != "png":
+        voronoi_label = PackedLabel.from_label(voronoi_label)
+    image_list, label_list = voronoi_splitter(voronoi_image, voronoi_label)
+    weight_list = voronoi_splitter.split(voronoi_weight) if voronoi_weight is not None else [None] * len(image_list)
+    graph_list = voronoi_generator.grain_graphs(diagram, voronoi_splitter.tile_boxes(*voronoi_label.shape[1::-1])) if graphs else [None] * len(image_list)
+
+    # Tile names only depend on the diagram index, so they match a sequential run
+    tiles_num = len(image_list)
+    statistics = DatasetStatistics()
+    for j, (image, label, weight, graph) in enumerate(zip(image_list, label_list, weight_list, graph_list)):
+        save_images(voronoi_config["output_dir"], item.datatype, item.index * tiles_num + j, image, label, label_format, weight, graph)
+        statistics.add(image, label)
+    return item, statistics
+
+def main(config_files, workers, memory_budget=None, calibration_items=1):
+    # Load and validate all config files before starting
+    voronoi_configs = []
+    for config_file in config_files:
+        config = load_config(config_file)
+        validate_config_file(config)
+        voronoi_config = config["voronoi"]
+        if voronoi_config.get("seeding", "sequential") != "per_diagram":
+            print(f"Note: {config_file} is generated with per-diagram seeding (set 'seeding: per_diagram' to reproduce it with main.py)")
+        if voronoi_config.get("output", {}).get("backend", "files") != "files":
+            raise ValueError(f"ValueError: {config_file}: the batch runner only supports 'output.backend: files'.")
+        voronoi_configs.append(voronoi_config)
+
+    output_dirs = [voronoi_config["output_dir"] for voronoi_config in voronoi_configs]
+    if len(set(output_dirs)) != len(output_dirs):
+        raise ValueError("ValueError: Each config file must have a different output_dir.")
+
+    # Create output directories
+    for voronoi_config in voronoi_configs:
+        check_directory(voronoi_config["output_dir"])
+        output_config = voronoi_config.get("output", {})
+        create_directory(voronoi_config["output_dir"], voronoi_config["datatype_info"], "weight_map" in output_config, output_config.get("grain_graph", False))
+
+    for voronoi_config in voronoi_configs:
+        prepare_point_bank(voronoi_config)
+
+    items = build_work_items(voronoi_configs)
+    remaining = [0] * len(voronoi_configs)
+    statistics = [{datatype: DatasetStatistics() for datatype in voronoi_config["datatype_info"]} for voronoi_config in voronoi_configs]
+    for item in items:
+        remaining[item.config_index] += 1
+
+    # Size the pool to the memory budget (workers are forked from this process)
+    memory_model = MemoryModel(voronoi_configs, calibration_items)
+    worker_bytes = current_rss()
+    workers = MemoryBudget.pool_size(memory_budget, worker_bytes, workers, min(memory_model.estimated))
+    budget = MemoryBudget(memory_budget, worker_bytes, workers)
+    if memory_budget is not None:
+        print(f"Running {workers} workers within {memory_budget / 2 ** 30:.1f} GB")
+    for config_file, voronoi_config in zip(config_files, voronoi_configs):
+        if "parallel" in voronoi_config and workers > 1:
+            threads = voronoi_config["parallel"].get("threads") or os.cpu_count()
+            if workers * threads > os.cpu_count():
+                print(f"Warning: {config_file} uses 'parallel' ({threads} threads per diagram) in each of {workers} workers, "
+                      f"so up to {workers * threads} threads share {os.cpu_count()} CPUs (set 'parallel.threads' to about CPUs / workers)")
+
+    # Generate all diagrams on a shared pool, admitting them longest-first while they fit the budget
+    results = queue.Queue()
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(voronoi_configs,)) as pool:
+        progress = tqdm(total=len(items), desc="Generating diagrams")
+        pending = deque(items)
+        while pending or budget.running > 0:
+            while pending and budget.fits(memory_model.peak(pending[0].config_index)):
+                item = pending.popleft()
+                peak = memory_model.peak(item.config_index)
+                budget.acquire(peak)
+                pool.apply_async(run_item, (item, memory_model.start(item.config_index)),
+                                 callback=lambda result, peak=peak: results.put((result, peak)),
+                                 error_callback=lambda error: results.put((error, None)))
+            result, peak = results.get()
+            if isinstance(result, BaseException):
+                raise result
+            (item, diagram_statistics), measured = result
+            statistics[item.config_index][item.datatype].merge(diagram_statistics)
+            budget.release(peak)
+            if measured is not None:
+                memory_model.observe(item.config_index, measured)
+
+            progress.update(1)
+            remaining[item.config_index] -= 1
+            if remaining[item.config_index] == 0:
+                finished = len(voronoi_configs) - sum(1 for r in remaining if r > 0)
+                progress.write(f"[{finished}/{len(voronoi_configs)}] Finished {config_files[item.config_index]}")
+        progress.close()
+
+    for config_index, voronoi_config in enumerate(voronoi_configs):
+        write_statistics(voronoi_config["output_dir"], statistics[config_index])
+
+    # Record the memory model of each config
+    for config_index, voronoi_config in enumerate(voronoi_configs):
+        with open(os.path.join(voronoi_config["output_dir"], "run_report.json"), "w") as f:
+            json.dump({
+                "workers": workers,
+                "memory_budget": memory_budget,
+                "worker_rss": worker_bytes,
+                "max_in_flight": budget.max_in_flight,
+                "estimated_peak": memory_model.estimated[config_index],
+                "observed_peaks": memory_model.observed[config_index],
+                "reserved_peak": memory_model.peak(config_index),
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the datasets of multiple config files")
+    parser.add_argument("config_files", nargs="+", help="Paths to the config files (yaml)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--memory_budget", type=float, default=None, help="RAM budget of the run in GB (default: no limit)")
+    parser.add_argument("--calibration_items", type=int, default=1, help="Number of diagrams of each config whose peak memory is measured (default: 1)")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        for config_file in args.config_files:
+            if not os.path.exists(config_file):
+                raise FileNotFoundError(f"File not found: {config_file}")
+            if not config_file.endswith('.yaml'):
+                raise ValueError("ValueError: The configuration file must be in yaml format.")
+        if args.workers <= 0:
+            raise ValueError("ValueError: The number of workers must be a positive integer.")
+        if args.memory_budget is not None and args.memory_budget <= 0:
+            raise ValueError("ValueError: The memory budget must be a positive number.")
+        if args.calibration_items < 0:
+            raise ValueError("ValueError: The number of calibration items must be a non-negative integer.")
+
+        # Run the main function
+        memory_budget = int(args.memory_budget * 2 ** 30) if args.memory_budget is not None else None
+        main(args.config_files, args.workers, memory_budget, args.calibration_items)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,111 @@
+"""
+Benchmark the generation of one diagram with band-parallel threads
+
+Usage:
+$ python voronoi/benchmark.py configs/sample_case_10.yaml
+$ python voronoi/benchmark.py configs/sample_case_10.yaml --threads 1 2 4 8 16 --repeat 5
+
+The first diagram of the first datatype is generated without `parallel`
+(the single-threaded code) and then with `parallel.threads` set to each
+given count, and the best time of every stage (facets, rendering, each
+post-processor) is reported. The speedup over 1 thread is that of the
+threads alone; the speedup over the single-threaded code also includes the
+differences between the serial and the banded implementations.
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from typing import Any, Dict, List
+from utils import VoronoiGenerator
+from main import load_config, validate_config_file, get_point_params
+
+
+def time_stages(voronoi_config: Dict[str, Any], seed: int, repeat: int) -> Dict[str, float]:
+    """Get the best time of each stage of generate over repeated runs of the same diagram, in seconds"""
+    best = {}
+    with VoronoiGenerator(voronoi_config) as voronoi_generator:
+        pipeline = voronoi_generator.image_pipeline
+        processors = pipeline.both_processors + pipeline.image_processors
+        for _ in range(repeat):
+            times = {}
+
+            def timed(name, process):
+                def wrapper(image):
+                    start = time.perf_counter()
+                    result = process(image)
+                    times[name] = times.get(name, 0.0) + time.perf_counter() - start
+                    return result
+                return wrapper
+
+            # Processors are timed through their instances (both_processors run on the image and the label)
+            for k, processor in enumerate(processors):
+                processor.process = timed(f"{k}:{type(processor).__name__.replace('Processor', '')}", type(processor).process.__get__(processor))
+
+            np.random.seed(seed)
+            start = time.perf_counter()
+            diagram = voronoi_generator.generate_vector(**get_point_params(voronoi_config, 0))
+            facets_end = time.perf_counter()
+            voronoi_generator.rasterize(diagram)
+            end = time.perf_counter()
+
+            stages = {"facets": facets_end - start, "render": end - facets_end - sum(times.values()), **times, "total": end - start}
+            for name, seconds in stages.items():
+                best[name] = min(best.get(name, seconds), seconds)
+    return best
+
+def main(config_file, threads: List[int], repeat: int, band_rows: int):
+    # Load config file
+    config = load_config(config_file)
+
+    # Execute validation
+    validate_config_file(config)
+
+    voronoi_config = config["voronoi"]
+    if "laguerre" in voronoi_config:
+        raise ValueError("ValueError: The benchmark does not support 'laguerre' (power diagrams are not rendered in bands).")
+    serial_config = {k: v for k, v in voronoi_config.items() if k != "parallel"}
+    seed = next(iter(voronoi_config["datatype_info"].values()))["seed"]
+
+    columns = {"serial": time_stages(serial_config, seed, repeat)}
+    for count in threads:
+        parallel_config = dict(serial_config, parallel={"threads": count, "band_rows": band_rows})
+        columns[f"{count} thread{'s' if count > 1 else ''}"] = time_stages(parallel_config, seed, repeat)
+
+    # Report
+    print(f"{voronoi_config['width']}x{voronoi_config['height']} diagram, best of {repeat} runs on {os.cpu_count()} CPUs (ms)")
+    names = list(columns["serial"])
+    print(f"{'stage':<24}" + "".join(f"{column:>12}" for column in columns))
+    for name in names:
+        print(f"{name:<24}" + "".join(f"{stages.get(name, 0.0) * 1000:>12.1f}" for stages in columns.values()))
+    serial_total = columns["serial"]["total"]
+    print(f"{'speedup vs serial':<24}" + "".join(f"{serial_total / stages['total']:>11.2f}x" for stages in columns.values()))
+    if threads and threads[0] == 1:
+        one_total = columns["1 thread"]["total"]
+        print(f"{'speedup vs 1 thread':<24}" + "".join(f"{one_total / stages['total']:>11.2f}x" for stages in columns.values()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the generation of one diagram with band-parallel threads")
+    parser.add_argument("config_file", help="Path to the config file (yaml)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Thread counts to time (default: 1 2 4 8 16)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per setting, the best is reported (default: 3)")
+    parser.add_argument("--band_rows", type=int, default=256, help="Height of the random number bands (default: 256)")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        if not os.path.exists(args.config_file):
+            raise FileNotFoundError(f"File not found: {args.config_file}")
+        if not args.config_file.endswith('.yaml'):
+            raise ValueError("ValueError: The configuration file must be in yaml format.")
+        if args.repeat <= 0 or any(count <= 0 for count in args.threads) or args.band_rows <= 0:
+            raise ValueError("ValueError: Thread counts, repeats and band rows must be positive integers.")
+
+        # Run the main function
+        main(args.config_file, sorted(set(args.threads)), args.repeat, args.band_rows)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
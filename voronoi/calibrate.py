@@ -0,0 +1,83 @@
+"""
+Calibrate points_num or min_distance lists to target grain sizes
+
+Usage:
+$ python voronoi/calibrate.py configs/sample_case_1.yaml --target 40 50 60
+$ python voronoi/calibrate.py configs/sample_case_1.yaml --match_min_distance 40 50 60 --method random
+
+Grain sizes are measured inside the center crop of the config (grains cut
+by the crop are excluded) from the facets of simulated diagrams, without
+rendering. --match_min_distance uses the grain sizes of Poisson disk
+sampling with the given min_distance values as targets, to find the
+points_num values giving the same sizes with random sampling.
+"""
+
+import os
+import sys
+import time
+import argparse
+from utils.calibration import GrainSizeCalibrator, CALIBRATION_STATISTICS
+from main import load_config, validate_config_file
+
+
+def main(config_file, method, targets, match_min_distance, trials, statistic, cache, verify):
+    # Load config file
+    config = load_config(config_file)
+
+    # Execute validation
+    validate_config_file(config)
+
+    voronoi_config = config["voronoi"]
+    method = method or voronoi_config["point_generation"]["method"]
+    calibrator = GrainSizeCalibrator.from_config(voronoi_config, trials=trials, statistic=statistic, cache_path=cache)
+    start = time.time()
+
+    # Targets matching the grain sizes of Poisson disk sampling
+    if match_min_distance:
+        targets = [calibrator.simulate("poisson_disk", float(d))[statistic] for d in match_min_distance]
+        calibrator.save_cache()
+
+    results = calibrator.calibrate(method, targets)
+    parameter = "points_num" if method == "random" else "min_distance"
+
+    print(f"{'target':>10} {parameter:>12} {'predicted':>10}" + (f" {'simulated':>10}" if verify else ""))
+    for target, (value, predicted) in zip(targets, results):
+        line = f"{target:10.1f} {value:12} {predicted:10.1f}"
+        if verify:
+            line += f" {calibrator.simulate(method, value)[statistic]:10.1f}"
+        print(line)
+    calibrator.save_cache()
+    print(f"\n{parameter}: [{', '.join(str(value) for value, _ in results)}]")
+    print(f"(calibrated {statistic} on {calibrator.box[2] - calibrator.box[0]}x{calibrator.box[3] - calibrator.box[1]} crops in {time.time() - start:.1f} s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate points_num or min_distance to target grain sizes")
+    parser.add_argument("config_file", help="Path to the config file (yaml)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--target", type=float, nargs="+", help="Target grain sizes (equivalent diameters in pixels)")
+    group.add_argument("--match_min_distance", type=float, nargs="+", help="Use the grain sizes of Poisson disk sampling with these min_distance values as targets")
+    parser.add_argument("--method", choices=["random", "poisson_disk"], default=None, help="Method to calibrate (default: the method of the config)")
+    parser.add_argument("--statistic", choices=CALIBRATION_STATISTICS, default="mean_diameter", help="Calibrated statistic (default: mean_diameter)")
+    parser.add_argument("--trials", type=int, default=3, help="Number of diagrams pooled per simulation (default: 3)")
+    parser.add_argument("--cache", default=None, help="JSON file caching the simulations across runs")
+    parser.add_argument("--verify", action="store_true", help="Simulate the solved values and report their grain sizes")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        if not os.path.exists(args.config_file):
+            raise FileNotFoundError(f"File not found: {args.config_file}")
+        if not args.config_file.endswith('.yaml'):
+            raise ValueError("ValueError: The configuration file must be in yaml format.")
+        if args.trials <= 0:
+            raise ValueError("ValueError: The number of trials must be a positive integer.")
+        if any(t <= 0 for t in (args.target or args.match_min_distance)):
+            raise ValueError("ValueError: Targets must be positive.")
+
+        # Run the main function
+        main(args.config_file, args.method, args.target, args.match_min_distance,
+             args.trials, args.statistic, args.cache, args.verify)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
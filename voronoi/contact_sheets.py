@@ -0,0 +1,178 @@
+"""
+Classes related to QA contact sheets of generated datasets
+"""
+
+import os
+import math
+import json
+import cv2
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+from utils.label_codecs import PackedLabel
+
+# Height of the intensity histogram strip under each sheet
+HISTOGRAM_HEIGHT = 96
+
+
+class ReservoirSampler:
+    """Uniform sample of fixed size from a stream of unknown length (Algorithm L, Li 1994)
+
+    The indices of the kept items are drawn by geometric skips, so the cost
+    per skipped item is a comparison and only about size * (1 + ln(N / size))
+    items are ever stored. The sampler has its own random generator and does
+    not touch the global random state.
+
+    Attributes:
+        size (int): Number of items kept
+        count (int): Number of items offered so far
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+        self._w = math.exp(math.log(self._rng.random()) / size)
+        self._next = size + self._skip()
+
+    def offer(self) -> Optional[int]:
+        """Offer the next item of the stream
+
+        Returns:
+            Optional[int]: Slot to store the item in (replacing its content), or None to skip the item
+        """
+        index = self.count
+        self.count += 1
+        if index < self.size:
+            return index
+        if index < self._next:
+            return None
+        slot = int(self._rng.integers(self.size))
+        self._w *= math.exp(math.log(self._rng.random()) / self.size)
+        self._next = index + 1 + self._skip()
+        return slot
+
+    def _skip(self) -> int:
+        return int(math.floor(math.log(self._rng.random()) / math.log(1 - self._w)))
+
+
+class ContactSheetBuilder:
+    """Class for building contact sheets of a stream of tiles at a fixed memory footprint
+
+    Tiles are sampled with a reservoir and only loaded when sampled. Each
+    sampled tile is immediately downsampled with cv2.INTER_AREA into a
+    thumbnail with the label drawn over it (the area-averaged label gives
+    the boundary coverage of each thumbnail pixel), and its full-resolution
+    intensity histogram is kept, so memory does not depend on the tile size
+    or on the number of tiles. Sheets show the sampled tiles in stream order
+    with the intensity histogram of their tiles in a strip underneath.
+
+    Attributes:
+        output_dir (str): Directory the sheets are written to
+        sheets (int): Number of sheets
+        tiles_per_sheet (int): Number of tiles per sheet
+        thumb_size (int): Size of the square thumbnail cells in pixels
+        overlay_color (Tuple[int, int, int]): BGR color of the label overlay
+        overlay_alpha (float): Opacity of the label overlay on boundary pixels
+    """
+
+    def __init__(self, output_dir: str, sheets: int = 1, tiles_per_sheet: int = 64, thumb_size: int = 128,
+                 seed: int = 0, overlay_color: Tuple[int, int, int] = (0, 0, 255), overlay_alpha: float = 0.6):
+        self.output_dir = output_dir
+        self.sheets = sheets
+        self.tiles_per_sheet = tiles_per_sheet
+        self.thumb_size = thumb_size
+        self.overlay_color = overlay_color
+        self.overlay_alpha = overlay_alpha
+        self._sampler = ReservoirSampler(sheets * tiles_per_sheet, seed)
+        self._thumbs = np.zeros((sheets * tiles_per_sheet, thumb_size, thumb_size, 3), dtype=np.uint8)
+        self._histograms = np.zeros((sheets * tiles_per_sheet, 256), dtype=np.int64)
+        self._entries = [None] * (sheets * tiles_per_sheet)  # (stream index, name) of each slot
+
+    @property
+    def tiles_seen(self) -> int:
+        """Number of tiles offered so far"""
+        return self._sampler.count
+
+    def offer(self, name, load: Callable[[], Tuple[np.ndarray, Optional[np.ndarray]]]):
+        """Offer the next tile of the stream
+
+        Args:
+            name: Name of the tile (file name or sample key)
+            load (Callable[[], Tuple[np.ndarray, Optional[np.ndarray]]]): Function returning the (image, label) of the tile, called only if the tile is sampled
+        """
+        index = self._sampler.count
+        slot = self._sampler.offer()
+        if slot is None:
+            return
+        image, label = load()
+        gray = image if image.ndim == 2 or image.shape[2] == 1 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self._histograms[slot] = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+        self._thumbs[slot] = self.thumbnail(image, label)
+        self._entries[slot] = (index, name)
+
+    def add(self, name, image: np.ndarray, label: Optional[np.ndarray] = None):
+        """Offer a tile that is already in memory"""
+        self.offer(name, lambda: (image, label))
+
+    def thumbnail(self, image: np.ndarray, label: Optional[np.ndarray] = None) -> np.ndarray:
+        """Downsample a tile into a letterboxed BGR thumbnail with the label drawn over it"""
+        h, w = image.shape[:2]
+        scale = self.thumb_size / max(h, w)
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_GRAY2BGR) if small.ndim == 2 or small.shape[2] == 1 else small
+        if label is not None:
+            if isinstance(label, PackedLabel):
+                label = label.unpack()
+            label = label.reshape(label.shape[:2]) if label.ndim == 3 and label.shape[2] == 1 else label
+            coverage = cv2.resize((label != 0).view(np.uint8) * np.uint8(255), size, interpolation=cv2.INTER_AREA)
+            alpha = coverage.astype(np.float32)[:, :, np.newaxis] * np.float32(self.overlay_alpha / 255)
+            small = (small * (1 - alpha) + np.float32(self.overlay_color) * alpha + 0.5).astype(np.uint8)
+
+        thumb = np.zeros((self.thumb_size, self.thumb_size, 3), dtype=np.uint8)
+        top, left = (self.thumb_size - size[1]) // 2, (self.thumb_size - size[0]) // 2
+        thumb[top:top + size[1], left:left + size[0]] = small
+        return thumb
+
+    def write(self) -> List[str]:
+        """Write the sheets and an index of their tiles and histograms
+
+        Returns:
+            List[str]: Paths of the written sheets
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        slots = sorted((entry[0], slot) for slot, entry in enumerate(self._entries) if entry is not None)
+        columns = math.ceil(math.sqrt(self.tiles_per_sheet))
+        rows = math.ceil(self.tiles_per_sheet / columns)
+        paths, index = [], {"tiles_seen": self.tiles_seen, "sheets": []}
+        for s in range(0, len(slots), self.tiles_per_sheet):
+            sheet_slots = [slot for _, slot in slots[s:s + self.tiles_per_sheet]]
+            sheet = np.zeros((rows * self.thumb_size + HISTOGRAM_HEIGHT, columns * self.thumb_size, 3), dtype=np.uint8)
+            for k, slot in enumerate(sheet_slots):
+                r, c = divmod(k, columns)
+                sheet[r * self.thumb_size:(r + 1) * self.thumb_size, c * self.thumb_size:(c + 1) * self.thumb_size] = self._thumbs[slot]
+            histogram = self._histograms[sheet_slots].sum(axis=0)
+            self._draw_histogram(sheet[rows * self.thumb_size:], histogram)
+
+            path = os.path.join(self.output_dir, f"sheet-{len(paths):03d}.png")
+            cv2.imwrite(path, sheet)
+            paths.append(path)
+            index["sheets"].append({
+                "file": os.path.basename(path),
+                "tiles": [self._entries[slot][1] for slot in sheet_slots],
+                "histogram": histogram.tolist(),
+            })
+        with open(os.path.join(self.output_dir, "index.json"), "w") as f:
+            json.dump(index, f, indent=2)
+        return paths
+
+    def _draw_histogram(self, strip: np.ndarray, histogram: np.ndarray):
+        """Draw a 256-bin histogram as bars (scaled to its maximum) into a strip of the sheet"""
+        height, width = strip.shape[:2]
+        peak = max(int(histogram.max()), 1)
+        edges = np.linspace(0, width, 257).round().astype(int)
+        for value in range(256):
+            bar = round((height - 4) * histogram[value] / peak)
+            if bar > 0:
+                cv2.rectangle(strip, (edges[value], height - 2 - bar), (max(edges[value], edges[value + 1] - 1), height - 2),
+                              (value, value, value) if value > 64 else (64, 64, 64), -1)
@@ -0,0 +1,155 @@
+"""
+Classes related to streaming statistics of generated datasets
+"""
+
+import os
+import json
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Optional
+from utils.label_codecs import PackedLabel
+
+STATS_NAME = "stats.json"
+
+# Number of set bits of every byte value (boundary pixels of bit-packed labels)
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+
+class DatasetStatistics:
+    """Intensity and label statistics of a stream of tiles, mergeable across workers and shards
+
+    Only integer counts are accumulated: per-channel 256-bin histograms of
+    the images and a 256-bin histogram of the labels. The per-channel mean
+    and variance are computed exactly from the image histograms (integer
+    sums), so they do not depend on the order tiles, workers and shards are
+    merged in, and a statistics pass over the written dataset is not needed.
+    Label histograms give the boundary pixel ratio (and the mean coverage
+    of anti-aliased labels).
+
+    Attributes:
+        tiles (int): Number of tiles added
+        pixels (int): Number of pixels per channel
+        histogram (Optional[np.ndarray]): Per-channel 256-bin intensity histograms (None before the first tile)
+        label_histogram (np.ndarray): 256-bin histogram of the label values
+    """
+
+    def __init__(self):
+        self.tiles = 0
+        self.pixels = 0
+        self.histogram = None
+        self.label_histogram = np.zeros(256, dtype=np.int64)
+
+    def add(self, image: np.ndarray, label=None):
+        """Add a tile (uint8 image of shape (H, W) or (H, W, C), label as an array or PackedLabel)"""
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        image = np.ascontiguousarray(image)
+        histogram = np.stack([
+            cv2.calcHist([image], [channel], None, [256], [0, 256]).ravel().astype(np.int64)
+            for channel in range(channels)
+        ])
+        self._combine(1, int(histogram[0].sum()), histogram)
+        if label is not None:
+            self.label_histogram += self._label_histogram(label)
+
+    def merge(self, other: "DatasetStatistics") -> "DatasetStatistics":
+        """Merge the statistics of another stream into this one (in place)"""
+        if other.tiles > 0:
+            self._combine(other.tiles, other.pixels, other.histogram)
+            self.label_histogram += other.label_histogram
+        return self
+
+    def _combine(self, tiles: int, pixels: int, histogram: np.ndarray):
+        """Add the counts of tiles"""
+        if self.tiles == 0:
+            self.histogram = histogram.copy()
+        else:
+            if histogram.shape != self.histogram.shape:
+                raise ValueError(f"Tiles with {histogram.shape[0]} channels cannot be merged with tiles with {self.histogram.shape[0]} channels")
+            self.histogram += histogram
+        self.tiles += tiles
+        self.pixels += pixels
+
+    @property
+    def mean(self) -> Optional[np.ndarray]:
+        """Per-channel mean intensity (None before the first tile)"""
+        if self.tiles == 0:
+            return None
+        return np.array([total / self.pixels for total in self._sums(1)])
+
+    @property
+    def m2(self) -> Optional[np.ndarray]:
+        """Per-channel sum of squared deviations from the mean (None before the first tile)"""
+        if self.tiles == 0:
+            return None
+        # pixels * sum(x^2) - sum(x)^2 in Python integers, so nothing is rounded before the division
+        return np.array([
+            (self.pixels * squares - total * total) / self.pixels
+            for total, squares in zip(self._sums(1), self._sums(2))
+        ])
+
+    def _sums(self, power: int) -> List[int]:
+        """Get the exact per-channel sums of the intensities raised to a power"""
+        values = np.arange(256, dtype=np.int64) ** power
+        return [sum(count * value for count, value in zip(row, values.tolist()) if count) for row in self.histogram.tolist()]
+
+    @staticmethod
+    def _label_histogram(label) -> np.ndarray:
+        """Get the 256-bin histogram of a label"""
+        histogram = np.zeros(256, dtype=np.int64)
+        if isinstance(label, PackedLabel):
+            boundary = int(np.bincount(label.bits.ravel(), minlength=256) @ _POPCOUNT)  # Padding bits are zero
+            height, width, _ = label.shape
+            histogram[0] = height * width - boundary
+            histogram[label.value] += boundary
+            return histogram
+        return cv2.calcHist([np.ascontiguousarray(label)], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the statistics as a JSON-serializable dictionary (readable with from_dict)"""
+        label_pixels = int(self.label_histogram.sum())
+        boundary = label_pixels - int(self.label_histogram[0])
+        mean, m2 = self.mean, self.m2
+        return {
+            "tiles": self.tiles,
+            "pixels": self.pixels,
+            "mean": mean.tolist() if mean is not None else None,
+            "std": np.sqrt(m2 / self.pixels).tolist() if m2 is not None else None,
+            "m2": m2.tolist() if m2 is not None else None,
+            "histogram": self.histogram.tolist() if self.tiles > 0 else None,
+            "boundary_pixels": boundary,
+            "boundary_fraction": boundary / label_pixels if label_pixels else None,
+            "boundary_ratio": boundary / (label_pixels - boundary) if label_pixels > boundary else None,
+            "label_mean": float(self.label_histogram @ np.arange(256)) / (255 * label_pixels) if label_pixels else None,
+            "label_histogram": self.label_histogram.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DatasetStatistics":
+        """Restore statistics written by to_dict (e.g. to merge the stats.json of shards)"""
+        statistics = cls()
+        statistics.tiles = data["tiles"]
+        statistics.pixels = data["pixels"]
+        if statistics.tiles > 0:
+            statistics.histogram = np.array(data["histogram"], dtype=np.int64)  # mean and m2 follow from it
+        statistics.label_histogram = np.array(data["label_histogram"], dtype=np.int64)
+        return statistics
+
+
+def write_statistics(output_dir: str, statistics: Dict[str, DatasetStatistics]) -> str:
+    """Write the statistics of each datatype to <output_dir>/stats.json
+
+    Returns:
+        str: Path of the written file
+    """
+    path = os.path.join(output_dir, STATS_NAME)
+    with open(path, "w") as f:
+        json.dump({datatype: stats.to_dict() for datatype, stats in statistics.items()}, f, indent=2)
+    return path
+
+def load_statistics(output_dir: str) -> Optional[Dict[str, DatasetStatistics]]:
+    """Load the statistics of each datatype from <output_dir>/stats.json (None if there is none)"""
+    path = os.path.join(output_dir, STATS_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return {datatype: DatasetStatistics.from_dict(data) for datatype, data in json.load(f).items()}
@@ -0,0 +1,146 @@
+"""
+Random access to the tiles of a dataset by index
+
+Tile `n` of a datatype is tile `n % T` of diagram `n // T`, where T is the
+number of tiles per diagram (the names main.py saves tiles under). With
+`seeding: per_diagram`, the random state of a diagram only depends on the
+datatype seed and the diagram index (a counter-based key, see
+utils.rng.diagram_seed), so any diagram is regenerated directly. With
+sequential seeding, the diagrams before it have to be replayed.
+"""
+
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from utils import VoronoiGenerator
+from utils.rng import seed_diagram
+from utils.adjacency import GrainGraph
+from splitters import VoronoiSplitter
+from main import get_point_params
+
+
+class VoronoiTileDataset:
+    """Map-style dataset generating the tiles of a datatype on demand
+
+    Items are (image, label) tuples, or (image, label, weight) when
+    output.weight_map is configured, identical to the tiles main.py writes.
+    With output.grain_graph, the grain graphs of the tiles are computed
+    with them (see graphs).
+    The tiles of the last generated diagram are cached, so reading the tiles
+    of a diagram in turn generates it once. Generation uses the global
+    random state, so a dataset must not be shared between threads (each
+    process of a data loader can hold its own).
+
+    Attributes:
+        voronoi_config (Dict[str, Any]): Voronoi configuration
+        datatype (str): Datatype the tiles belong to
+        seed (int): Seed of the datatype
+        diagram_num (int): Number of diagrams of the datatype
+        seeding (str): Seeding mode ('sequential' or 'per_diagram')
+        grain_graph (bool): Whether the grain graphs of the tiles are computed (output.grain_graph)
+        tiles_per_diagram (int): Number of tiles per diagram
+    """
+
+    def __init__(self, voronoi_config: Dict[str, Any], datatype: str):
+        if datatype not in voronoi_config["datatype_info"]:
+            raise ValueError(f"ValueError: Unknown datatype: {datatype}")
+        bank = voronoi_config["point_generation"]["params"].get("bank")
+        if isinstance(bank, dict) and bank.get("max_uses") is not None:
+            raise ValueError("ValueError: Tiles cannot be regenerated with 'bank.max_uses' (served sets depend on the generation order).")
+
+        self.voronoi_config = voronoi_config
+        self.datatype = datatype
+        self.seed = voronoi_config["datatype_info"][datatype]["seed"]
+        self.diagram_num = voronoi_config["datatype_info"][datatype]["diagram_num"]
+        self.seeding = voronoi_config.get("seeding", "sequential")
+        self.grain_graph = voronoi_config.get("output", {}).get("grain_graph", False)
+        self.generator = VoronoiGenerator(voronoi_config)
+        self.splitter = VoronoiSplitter(voronoi_config)
+        width, height = self.generator.image_pipeline.output_size(self.generator.width, self.generator.height)
+        self.tiles_per_diagram = self.splitter.tiles_num(width, height)
+        self._cache = None       # (diagram index, tiles, grain graphs or None) of the last generated diagram
+        self._sequential = None  # (next diagram index, random state) of a sequential replay
+
+    def __len__(self) -> int:
+        return self.diagram_num * self.tiles_per_diagram
+
+    def __getitem__(self, tile_index: int) -> Tuple[np.ndarray, ...]:
+        diagram_index, position = self.locate(tile_index)
+        return self.diagram(diagram_index)[position]
+
+    def locate(self, tile_index: int) -> Tuple[int, int]:
+        """Get the diagram index of a tile and its position among the tiles of the diagram
+
+        Raises:
+            IndexError: If the tile index is out of range
+        """
+        if not 0 <= tile_index < len(self):
+            raise IndexError(f"Tile index {tile_index} is out of range for {len(self)} {self.datatype} tiles")
+        return divmod(tile_index, self.tiles_per_diagram)
+
+    def diagram(self, diagram_index: int) -> List[Tuple[np.ndarray, ...]]:
+        """Generate the tiles of a diagram, in the order of their names
+
+        Returns:
+            List[Tuple[np.ndarray, ...]]: (image, label) or (image, label, weight) of each tile
+        """
+        if self._cache is not None and self._cache[0] == diagram_index:
+            return self._cache[1]
+        if not 0 <= diagram_index < self.diagram_num:
+            raise IndexError(f"Diagram index {diagram_index} is out of range for {self.diagram_num} {self.datatype} diagrams")
+
+        self._seed(diagram_index)
+        kwargs = get_point_params(self.voronoi_config, diagram_index)
+        graphs = None
+        if self.grain_graph:
+            vector_diagram = self.generator.generate_vector(**kwargs)
+            image, label = self.generator.rasterize(vector_diagram)
+            graphs = self.generator.grain_graphs(vector_diagram, self.splitter.tile_boxes(*label.shape[1::-1]))
+        else:
+            image, label = self.generator.generate(**kwargs)
+        if self.seeding != "per_diagram":
+            self._sequential = (diagram_index + 1, np.random.get_state())
+        weight = self.generator.generate_weights(label)
+        image_list, label_list = self.splitter(image, label)
+        if weight is None:
+            tiles = list(zip(image_list, label_list))
+        else:
+            tiles = list(zip(image_list, label_list, self.splitter.split(weight)))
+        self._cache = (diagram_index, tiles, graphs)
+        return tiles
+
+    def graphs(self, diagram_index: int) -> Optional[List[GrainGraph]]:
+        """Get the grain graphs of the tiles of a diagram, in the order of their names (None without output.grain_graph)"""
+        self.diagram(diagram_index)
+        return self._cache[2]
+
+    def _seed(self, diagram_index: int):
+        """Set the random state of a diagram (replaying the diagrams before it with sequential seeding)"""
+        if self.seeding == "per_diagram":
+            seed_diagram(self.seed, diagram_index)
+            return
+        if self._sequential is not None and self._sequential[0] <= diagram_index:
+            start = self._sequential[0]
+            np.random.set_state(self._sequential[1])
+        else:
+            start = 0
+            np.random.seed(self.seed)
+        for i in range(start, diagram_index):
+            self.generator.generate(**get_point_params(self.voronoi_config, i))
+
+
+def regenerate(voronoi_config: Dict[str, Any], datatype: str, tile_index: int,
+               dataset: Optional[VoronoiTileDataset] = None) -> Tuple[int, int, List[Tuple[np.ndarray, ...]]]:
+    """Regenerate the diagram a tile was cut from
+
+    Args:
+        voronoi_config (Dict[str, Any]): Voronoi configuration
+        datatype (str): Datatype of the tile
+        tile_index (int): Index (name) of the tile
+        dataset (Optional[VoronoiTileDataset]): Dataset to reuse for repeated calls
+
+    Returns:
+        Tuple[int, int, List[Tuple[np.ndarray, ...]]]: Diagram index, position of the tile in the diagram, and the tiles of the diagram
+    """
+    dataset = dataset or VoronoiTileDataset(voronoi_config, datatype)
+    diagram_index, position = dataset.locate(tile_index)
+    return diagram_index, position, dataset.diagram(diagram_index)
@@ -6,8 +6,19 @@ import yaml
 import cv2
 from tqdm import tqdm
 from utils import VoronoiGenerator
+from utils.rng import seed_diagram
+from utils.label_codecs import PackedLabel, save_label
 from splitters import VoronoiSplitter
 from validation import VoronoiConfigValidator
+from writers import TarShardWriter
+from contact_sheets import ContactSheetBuilder
+from dataset_stats import DatasetStatistics, write_statistics
+from shards import parse_shard, shard_range, part_dir, config_digest, check_shardable, write_manifest
+
+def load_config(config_file):
+    """Load the configuration file."""
+    with open(config_file, 'r') as f:
+        return yaml.load(f, Loader=yaml.FullLoader)
 
 def validate_config_file(config):
     """Execute validation of the configuration file"""
@@ -27,22 +38,69 @@ def check_directory(output_dir):
             print("The process was interrupted.")
             sys.exit(0)
 
-def create_directory(output_dir, datatype_info):
+def create_directory(output_dir, datatype_info, weights=False, graphs=False):
     """Create the output directory."""
     for datatype, params in datatype_info.items():
         os.makedirs(f"{output_dir}/{datatype}/images", exist_ok=True)
         os.makedirs(f"{output_dir}/{datatype}/labels", exist_ok=True)
+        if weights:
+            os.makedirs(f"{output_dir}/{datatype}/weights", exist_ok=True)
+        if graphs:
+            os.makedirs(f"{output_dir}/{datatype}/graphs", exist_ok=True)
 
-def save_images(output_dir, datatype, name, image, label):
-    """Save images and labels."""
+def save_images(output_dir, datatype, name, image, label, label_format="png", weight=None, graph=None):
+    """Save images, labels, weight maps (float16 .npy) and grain graphs (.npz)."""
     base_path = f"{output_dir}/{datatype}"
     cv2.imwrite(f"{base_path}/images/{name}.png", image)
-    cv2.imwrite(f"{base_path}/labels/{name}.png", label)
+    if label_format == "png" and not isinstance(label, PackedLabel):
+        cv2.imwrite(f"{base_path}/labels/{name}.png", label)
+    else:
+        save_label(f"{base_path}/labels/{name}", label, label_format)
+    if weight is not None:
+        np.save(f"{base_path}/weights/{name}.npy", weight.astype(np.float16, copy=False))
+    if graph is not None:
+        graph.save(f"{base_path}/graphs/{name}.npz")
+
+def create_writer(voronoi_config, datatype):
+    """Create the tar shard writer of a datatype (None when tiles are saved as files)."""
+    output_config = voronoi_config.get("output", {})
+    if output_config.get("backend", "files") != "tar":
+        return None
+    return TarShardWriter(
+        f"{voronoi_config['output_dir']}/{datatype}",
+        int(output_config.get("shard_size_mb", 256) * 1024 ** 2),
+        output_config.get("label_format", "png")
+    )
 
-def main(config_file):
+def create_contact_sheets(voronoi_config, datatype):
+    """Create the QA contact sheet builder of a datatype (None when qa is not configured)."""
+    qa_config = voronoi_config.get("qa")
+    if qa_config is None:
+        return None
+    return ContactSheetBuilder(
+        f"{voronoi_config['output_dir']}/{datatype}/qa",
+        qa_config.get("sheets", 1),
+        qa_config.get("tiles_per_sheet", 64),
+        qa_config.get("thumb_size", 128),
+        qa_config.get("seed", 0)
+    )
+
+def get_point_params(voronoi_config, i):
+    """Get the seed point generation parameters for the i-th diagram."""
+    point_params = voronoi_config["point_generation"]["params"]
+    if voronoi_config["point_generation"]["method"] == "random": # random_sampling
+        points_num_list = point_params["points_num"]
+        points_num = points_num_list[i % len(points_num_list)]
+        return {"points_num": points_num}
+    else:  # poisson_disk_sampling
+        min_distance_list = point_params["min_distance"]
+        min_distance = min_distance_list[i % len(min_distance_list)]
+        max_attempts = point_params.get("max_attempts", 100)
+        return {"min_distance": min_distance, "max_attempts": max_attempts}
+
+def main(config_file, shard=None):
     # Load config file
-    with open(config_file, 'r') as f:
-        config = yaml.load(f, Loader=yaml.FullLoader)
+    config = load_config(config_file)
     
     # Execute validation
     validate_config_file(config)
@@ -50,6 +108,21 @@ def main(config_file):
     voronoi_config = config["voronoi"]
     output_dir = voronoi_config["output_dir"]
     datatype_info = voronoi_config["datatype_info"]
+    seeding = voronoi_config.get("seeding", "sequential")
+    output_config = voronoi_config.get("output", {})
+    label_format = output_config.get("label_format", "png")
+    weights = "weight_map" in output_config
+    graphs = output_config.get("grain_graph", False)
+    backend = output_config.get("backend", "files")
+    if backend == "vector" and "qa" in voronoi_config:
+        voronoi_config = {k: v for k, v in voronoi_config.items() if k != "qa"} # No tiles are written (see validation)
+    if shard is not None:
+        check_shardable(voronoi_config)
+        output_dir = part_dir(output_dir, *shard) # Each shard writes into its own part directory
+        voronoi_config = dict(voronoi_config, output_dir=output_dir)
+        if "qa" in voronoi_config:
+            print("Note: QA contact sheets are not merged across shards (run qa.py on the merged dataset).")
+            voronoi_config = {k: v for k, v in voronoi_config.items() if k != "qa"}
 
     # Initialize
     voronoi_generator = VoronoiGenerator(voronoi_config)
@@ -57,47 +130,111 @@ def main(config_file):
     
     # Create output directory
     check_directory(output_dir)
-    create_directory(output_dir, datatype_info)
+    if backend == "files":
+        create_directory(output_dir, datatype_info, weights, graphs)
+    elif backend == "vector":
+        for datatype in datatype_info:
+            os.makedirs(f"{output_dir}/{datatype}/vectors", exist_ok=True)
+    elif shard is not None:
+        os.makedirs(output_dir, exist_ok=True)
 
     # Generate and save Voronoi diagrams
+    manifest_datatypes = {}
+    statistics = {}
     for datatype, params in datatype_info.items():
-        np.random.seed(params["seed"]) # Set random seed
-        name_counter = 0
-        for i in tqdm(range(params["diagram_num"]), desc=f"Generating {datatype} images"):
+        if seeding == "sequential":
+            np.random.seed(params["seed"]) # Set random seed
+        writer = create_writer(voronoi_config, datatype)
+        contact_sheets = create_contact_sheets(voronoi_config, datatype)
+        indices = range(params["diagram_num"]) if shard is None else shard_range(params["diagram_num"], *shard)
+        tiles_num, tiles = None, []
+        statistics[datatype] = DatasetStatistics()
+        for i in tqdm(indices, desc=f"Generating {datatype} images"):
+            if seeding == "per_diagram":
+                seed_diagram(params["seed"], i) # Set random seed of this diagram
+
             # Get parameters
-            point_params = voronoi_config["point_generation"]["params"]
-            if voronoi_config["point_generation"]["method"] == "random": # random_sampling
-                points_num_list = point_params["points_num"]
-                points_num = points_num_list[i % len(points_num_list)]
-                kwargs = {"points_num": points_num}
-            else:  # poisson_disk_sampling
-                min_distance_list = point_params["min_distance"]
-                min_distance = min_distance_list[i % len(min_distance_list)]
-                max_attempts = point_params.get("max_attempts", 100)
-                kwargs = {"min_distance": min_distance, "max_attempts": max_attempts}
+            kwargs = get_point_params(voronoi_config, i)
+
+            if backend == "vector":
+                voronoi_generator.generate_vector(**kwargs).save(f"{output_dir}/{datatype}/vectors/{i}.npz") # Tiles are rasterized on demand (rasterize.py)
+                continue
             
-            voronoi_image, voronoi_label = voronoi_generator.generate(**kwargs) # Generate Voronoi diagram
+            if graphs:
+                diagram = voronoi_generator.generate_vector(**kwargs) # Keep the facets for the grain graphs
+                voronoi_image, voronoi_label = voronoi_generator.rasterize(diagram)
+            else:
+                voronoi_image, voronoi_label = voronoi_generator.generate(**kwargs) # Generate Voronoi diagram
+            voronoi_weight = voronoi_generator.generate_weights(voronoi_label) # Weight map of the full label (None if not configured)
+            if label_format != "png":
+                voronoi_label = PackedLabel.from_label(voronoi_label) # Keep the label bit-packed
             image_list, label_list = voronoi_splitter(voronoi_image, voronoi_label) # Split images and labels
+            weight_list = voronoi_splitter.split(voronoi_weight) if weights else [None] * len(image_list)
+            graph_list = voronoi_generator.grain_graphs(diagram, voronoi_splitter.tile_boxes(*voronoi_label.shape[1::-1])) if graphs else [None] * len(image_list)
+
+            # Save (tile names only depend on the diagram index, so shards do not overlap)
+            tiles_num = len(image_list)
+            for j, (image, label, weight, graph) in enumerate(zip(image_list, label_list, weight_list, graph_list)):
+                name = i * tiles_num + j
+                if writer is None:
+                    save_images(output_dir, datatype, name, image, label, label_format, weight, graph)
+                else:
+                    metadata = {"diagram_index": i, "tile_index": j, "seed": params["seed"], "seeding": seeding, **kwargs}
+                    writer.write(f"{name:08d}", image, label, metadata, weight, graph)
+                if contact_sheets is not None:
+                    contact_sheets.add(str(name) if writer is None else f"{name:08d}", image, label) # Only sampled tiles are downsampled
+                statistics[datatype].add(image, label) # Accumulated while streaming (no read pass over the dataset)
+                tiles.append(name)
+        if writer is not None:
+            writer.close() # Flush the last shard and write the shard index
+        if contact_sheets is not None:
+            contact_sheets.write()
+
+        if shard is not None:
+            entry = {"diagram_num": params["diagram_num"], "diagrams": [indices.start, indices.stop],
+                     "tiles_per_diagram": tiles_num, "tiles": tiles}
+            if backend == "vector":
+                entry["files"] = [f"vectors/{i}.npz" for i in indices]
+            elif writer is None:
+                label_extension = "png" if label_format == "png" else "npz"
+                folders = [("images", "png"), ("labels", label_extension)] + ([("weights", "npy")] if weights else []) + ([("graphs", "npz")] if graphs else [])
+                entry["files"] = [f"{folder}/{name}.{extension}" for name in tiles for folder, extension in folders]
+            else:
+                entry["files"] = [shard_info["file"] for shard_info in writer.shards]
+                entry["shards"] = writer.shards
+            manifest_datatypes[datatype] = entry
+
+    voronoi_generator.close() # Stop the threads of "parallel"
+
+    if backend != "vector":
+        write_statistics(output_dir, statistics)
 
-            # Save
-            for image, label in zip(image_list, label_list):
-                save_images(output_dir, datatype, name_counter, image, label)
-                name_counter += 1
+    # The manifest is written last, so that its presence marks a finished shard
+    if shard is not None:
+        write_manifest(output_dir, {
+            "shard": shard[0],
+            "num_shards": shard[1],
+            "config_digest": config_digest(config["voronoi"]),
+            "backend": backend,
+            "label_format": label_format,
+            "datatypes": manifest_datatypes,
+        })
 
 if __name__ == "__main__":
     args = sys.argv
     try:
         # Validate the arguments
-        if len(args) != 2:
+        if len(args) not in (2, 4) or (len(args) == 4 and args[2] != "--shard"):
             raise ValueError("ValueError: The number of arguments is invalid.")
         config_file = args[1]
+        shard = parse_shard(args[3]) if len(args) == 4 else None
         if not os.path.exists(config_file):
             raise FileNotFoundError(f"File not found: {config_file}")
         if not config_file.endswith('.yaml'):
             raise ValueError("ValueError: The configuration file must be in yaml format.")
         
         # Run the main function
-        main(config_file)
+        main(config_file, shard)
 
     except Exception as e:
         print(e, file=sys.stderr)
@@ -0,0 +1,179 @@
+"""
+Memory model of generation runs, used to size worker pools to a RAM budget
+
+The peak memory of a diagram is dominated by the full-canvas temporaries of
+its processors (noise is drawn in float64). It is first estimated from the
+canvas size and the processor chain, then measured on the first diagrams of
+each config (tracemalloc for numpy and Python allocations, the peak RSS for
+native buffers). MemoryBudget admits diagrams to a worker pool so that the
+resident workers and the peaks of the diagrams in flight fit the budget.
+"""
+
+import os
+import sys
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Peak bytes per pixel, measured on a 3072x2048 canvas (processors: per pixel of their input)
+RENDER_BYTES_PER_PIXEL = 2
+WEIGHT_MAP_BYTES_PER_PIXEL = 25
+PROCESSOR_BYTES_PER_PIXEL = {
+    "crop": 0,
+    "elliptical_mask": 1,
+    "gaussian_noise": 25,
+    "perlin_noise": 113,
+    "gaussian_blur": 9,
+    "psf": 9,
+    "brightness_gradient": 9,
+}
+# Margin applied to measured peaks (allocator slack, diagrams with more seeds than the measured ones)
+PEAK_MARGIN = 1.25
+
+
+def estimate_peak(voronoi_config: Dict[str, Any]) -> int:
+    """Estimate the peak memory of a diagram in bytes from its canvas size and processor chain"""
+    width, height = voronoi_config["width"], voronoi_config["height"]
+    peak = RENDER_BYTES_PER_PIXEL * width * height
+    temporaries = 0
+    for proc_config in voronoi_config.get("post_processors", []):
+        temporaries = max(temporaries, PROCESSOR_BYTES_PER_PIXEL.get(proc_config["type"], 9) * width * height)
+        if proc_config["type"] == "crop":
+            width = proc_config["params"]["crop_width"]
+            height = proc_config["params"]["crop_height"]
+    if "weight_map" in voronoi_config.get("output", {}):
+        temporaries = max(temporaries, WEIGHT_MAP_BYTES_PER_PIXEL * width * height)
+    return int(peak + temporaries)
+
+def current_rss() -> int:
+    """Get the resident set size of this process in bytes (0 if unknown)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def peak_rss() -> int:
+    """Get the peak resident set size of this process in bytes (0 if unknown)"""
+    if resource is None:
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024  # Kilobytes on Linux
+
+def measure_peak(func: Callable, *args, **kwargs) -> Tuple[Any, int]:
+    """Call a function and measure the peak memory it allocates
+
+    Returns:
+        Tuple[Any, int]: The result of the function and its peak memory in bytes
+    """
+    rss_before, peak_rss_before = current_rss(), peak_rss()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    try:
+        result = func(*args, **kwargs)
+        traced_peak = tracemalloc.get_traced_memory()[1] - traced_before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    # The peak RSS only tells about this call when the call raised it
+    peak_rss_after = peak_rss()
+    native_peak = peak_rss_after - rss_before if peak_rss_after > peak_rss_before else 0
+    return result, max(traced_peak, native_peak)
+
+
+class MemoryModel:
+    """Per-config peak memory of diagrams, estimated and then calibrated on the first diagrams
+
+    Attributes:
+        estimated (List[int]): Estimated peak of each config in bytes (see estimate_peak)
+        observed (List[List[int]]): Measured peaks of the calibration diagrams of each config
+        calibration_items (int): Number of diagrams measured per config
+    """
+
+    def __init__(self, voronoi_configs: List[Dict[str, Any]], calibration_items: int = 1):
+        self.estimated = [estimate_peak(voronoi_config) for voronoi_config in voronoi_configs]
+        self.observed = [[] for _ in voronoi_configs]
+        self.calibration_items = calibration_items
+        self._measuring = [0] * len(voronoi_configs)
+
+    def start(self, config_index: int) -> bool:
+        """Start a diagram of a config
+
+        Returns:
+            bool: Whether its peak should be measured (calibration diagram)
+        """
+        if len(self.observed[config_index]) + self._measuring[config_index] < self.calibration_items:
+            self._measuring[config_index] += 1
+            return True
+        return False
+
+    def observe(self, config_index: int, peak: int):
+        """Record the measured peak of a calibration diagram"""
+        self._measuring[config_index] -= 1
+        self.observed[config_index].append(peak)
+
+    def peak(self, config_index: int) -> int:
+        """Get the peak memory to reserve for a diagram of a config (measured with margin, or estimated)"""
+        if self.observed[config_index]:
+            return int(max(self.observed[config_index]) * PEAK_MARGIN)
+        return self.estimated[config_index]
+
+
+class MemoryBudget:
+    """Admission of diagrams to a worker pool within a RAM budget
+
+    A diagram is admitted when the resident workers and the peaks of the
+    diagrams in flight, including its own, fit the budget. One diagram is
+    always admitted when none is in flight, so runs make progress even if a
+    single diagram exceeds the budget.
+
+    Attributes:
+        budget (Optional[int]): RAM budget in bytes (None for no limit)
+        worker_bytes (int): Resident memory of an idle worker in bytes
+        workers (int): Number of worker processes
+        in_flight (int): Sum of the peaks of the admitted diagrams in bytes
+        running (int): Number of diagrams in flight
+        max_in_flight (int): Largest number of diagrams in flight so far
+    """
+
+    def __init__(self, budget: Optional[int], worker_bytes: int, workers: int):
+        self.budget = budget
+        self.worker_bytes = worker_bytes
+        self.workers = workers
+        self.in_flight = 0
+        self.running = 0
+        self.max_in_flight = 0
+
+    @staticmethod
+    def pool_size(budget: Optional[int], worker_bytes: int, requested: int, smallest_peak: int) -> int:
+        """Get the number of workers that fit a budget when running the smallest diagrams"""
+        if budget is None:
+            return requested
+        return max(1, min(requested, budget // max(worker_bytes + smallest_peak, 1)))
+
+    def fits(self, peak: int) -> bool:
+        """Check whether a diagram of the given peak can be admitted"""
+        if self.running >= self.workers:
+            return False
+        if self.budget is None or self.running == 0:
+            return True
+        return self.workers * self.worker_bytes + self.in_flight + peak <= self.budget
+
+    def acquire(self, peak: int):
+        """Admit a diagram"""
+        self.in_flight += peak
+        self.running += 1
+        self.max_in_flight = max(self.max_in_flight, self.running)
+
+    def release(self, peak: int):
+        """Release a finished diagram"""
+        self.in_flight -= peak
+        self.running -= 1
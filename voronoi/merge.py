@@ -0,0 +1,42 @@
+"""
+Merge the parts of a dataset generated on several nodes
+
+Usage:
+$ python voronoi/main.py configs/sample_case_1.yaml --shard 0/4   # on each node, 0/4 ... 3/4
+$ python voronoi/merge.py ./outputs/sample_case_1
+
+The part-<i>-of-<N> directories found in the output directory are checked
+for completeness (all N shards, every diagram and tile exactly once, all
+files present) and consistency (same config), then moved into the output
+directory. With --copy, the files are copied and the parts are kept.
+"""
+
+import os
+import sys
+import argparse
+from shards import merge_shards
+
+
+def main(output_dir, copy):
+    merged = merge_shards(output_dir, copy)
+    for datatype, entry in merged["datatypes"].items():
+        print(f"{datatype}: {entry['diagram_num']} diagrams, {entry['tiles']} tiles")
+    print(f"Merged {merged['num_shards']} shards into {output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the shards of a dataset generated with main.py --shard")
+    parser.add_argument("output_dir", help="Output directory of the config (containing the part-<i>-of-<N> directories)")
+    parser.add_argument("--copy", action="store_true", help="Copy the files and keep the shard directories")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        if not os.path.isdir(args.output_dir):
+            raise FileNotFoundError(f"Directory not found: {args.output_dir}")
+
+        # Run the main function
+        main(args.output_dir, args.copy)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
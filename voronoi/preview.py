@@ -0,0 +1,132 @@
+"""
+Low-latency preview of Voronoi diagrams for parameter tuning
+
+Usage:
+$ python voronoi/preview.py configs/sample_case_1.yaml --index 0 1 2 --scale 0.25
+$ python voronoi/preview.py configs/sample_case_1.yaml --index 3 --refine
+
+A preview is rendered at reduced scale from the same random draws as the
+full-resolution diagram (seed points, gray values and mask geometry), so
+refining it reproduces exactly what main.py writes for that diagram.
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+from typing import Dict, Any, Tuple
+from utils import VoronoiGenerator
+from utils.rng import seed_diagram
+from main import load_config, validate_config_file, get_point_params
+
+
+class VoronoiPreview:
+    """Reduced-scale preview of a Voronoi diagram that can be refined to full resolution
+
+    Attributes:
+        generator (VoronoiGenerator): Generator the preview was made with
+        scale (float): Scale of the preview
+        kwargs (Dict[str, Any]): Seed point generation parameters
+        random_state (tuple): State of the random number generator before the preview
+        image (np.ndarray): Preview image
+        label (np.ndarray): Preview label
+    """
+
+    def __init__(self, generator: VoronoiGenerator, scale: float = 0.25, **kwargs):
+        self.generator = generator
+        self.scale = scale
+        self.kwargs = kwargs
+        self.random_state = np.random.get_state()
+        self.image, self.label = generator.preview(scale, **kwargs)
+
+    def refine(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Generate the full-resolution version of the previewed diagram
+
+        The random number generator is left in the same state as after a
+        full-resolution run, so previews and refinements can be interleaved
+        with a sequentially seeded run.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label)
+        """
+        np.random.set_state(self.random_state)
+        return self.generator.generate(**self.kwargs)
+
+
+def preview_diagrams(voronoi_config: Dict[str, Any], datatype: str, indices, scale: float, refine: bool, output_dir: str):
+    """Preview (and optionally refine) diagrams of a datatype and save them."""
+    voronoi_generator = VoronoiGenerator(voronoi_config)
+    params = voronoi_config["datatype_info"][datatype]
+    seeding = voronoi_config.get("seeding", "sequential")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if seeding == "sequential":
+        np.random.seed(params["seed"])
+    next_index = 0  # Index of the diagram the sequential random state is at
+
+    for i in sorted(indices):
+        if seeding == "per_diagram":
+            seed_diagram(params["seed"], i)
+        else:
+            # The sequential random state can only be advanced by generating the diagrams before i
+            for j in range(next_index, i):
+                voronoi_generator.generate(**get_point_params(voronoi_config, j))
+            next_index = i + 1
+
+        start = time.perf_counter()
+        preview = VoronoiPreview(voronoi_generator, scale, **get_point_params(voronoi_config, i))
+        elapsed = (time.perf_counter() - start) * 1000
+        cv2.imwrite(f"{output_dir}/{datatype}_{i}_preview_image.png", preview.image)
+        cv2.imwrite(f"{output_dir}/{datatype}_{i}_preview_label.png", preview.label)
+        print(f"{datatype}[{i}]: preview {preview.image.shape[1]}x{preview.image.shape[0]} in {elapsed:.0f} ms")
+
+        if refine or seeding == "sequential":
+            # A sequential run also needs the full diagram to reach the state of the next one
+            image, label = preview.refine()
+            if refine:
+                cv2.imwrite(f"{output_dir}/{datatype}_{i}_image.png", image)
+                cv2.imwrite(f"{output_dir}/{datatype}_{i}_label.png", label)
+    voronoi_generator.close()
+
+def main(config_file, datatype, indices, scale, refine, output_dir):
+    # Load config file
+    config = load_config(config_file)
+
+    # Execute validation
+    validate_config_file(config)
+
+    voronoi_config = config["voronoi"]
+    if datatype not in voronoi_config["datatype_info"]:
+        raise ValueError(f"ValueError: Unknown datatype: {datatype}")
+    if output_dir is None:
+        output_dir = os.path.join(voronoi_config["output_dir"], "preview")
+
+    preview_diagrams(voronoi_config, datatype, indices, scale, refine, output_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preview Voronoi diagrams at reduced scale")
+    parser.add_argument("config_file", help="Path to the config file (yaml)")
+    parser.add_argument("--datatype", default="train", help="Datatype to preview (default: train)")
+    parser.add_argument("--index", type=int, nargs="+", default=[0], help="Indices of the diagrams to preview (default: 0)")
+    parser.add_argument("--scale", type=float, default=0.25, help="Scale of the preview (default: 0.25)")
+    parser.add_argument("--refine", action="store_true", help="Also render the diagrams at full resolution")
+    parser.add_argument("--output_dir", default=None, help="Output directory (default: <output_dir>/preview)")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        if not os.path.exists(args.config_file):
+            raise FileNotFoundError(f"File not found: {args.config_file}")
+        if not 0 < args.scale <= 1:
+            raise ValueError("ValueError: The scale must be in (0, 1].")
+        if any(i < 0 for i in args.index):
+            raise ValueError("ValueError: The indices must be non-negative.")
+
+        # Run the main function
+        main(args.config_file, args.datatype, args.index, args.scale, args.refine, args.output_dir)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,93 @@
+"""
+Write QA contact sheets of a generated dataset
+
+Usage:
+$ python voronoi/qa.py ./outputs/sample_case_1 --sheets 4 --tiles_per_sheet 64
+
+Tiles of every datatype (files or tar shards) are streamed in name order
+and sampled with a reservoir, so only the sampled tiles are decoded and the
+cost does not grow with the dataset size. Sheets of downsampled tiles with
+label overlays and their intensity histograms are written to
+<output_dir>/<datatype>/qa.
+"""
+
+import os
+import sys
+import json
+import argparse
+import cv2
+import numpy as np
+from natsort import natsorted
+from typing import Callable, Iterator, Tuple
+from contact_sheets import ContactSheetBuilder
+from utils.label_codecs import load_label, decode_label
+from writers import read_shard
+
+
+def stream_file_tiles(datatype_dir: str) -> Iterator[Tuple[str, Callable]]:
+    """Stream the (name, loader) pairs of the tiles of a dataset saved as files"""
+    for file in natsorted(os.listdir(os.path.join(datatype_dir, "images"))):
+        name, extension = os.path.splitext(file)
+        if extension != ".png":
+            continue
+        def load(name=name):
+            image = cv2.imread(os.path.join(datatype_dir, "images", f"{name}.png"), cv2.IMREAD_UNCHANGED)
+            for label_extension in ["png", "npz"]:
+                label_path = os.path.join(datatype_dir, "labels", f"{name}.{label_extension}")
+                if os.path.exists(label_path):
+                    return image, load_label(label_path)
+            return image, None
+        yield name, load
+
+def stream_tar_tiles(datatype_dir: str) -> Iterator[Tuple[str, Callable]]:
+    """Stream the (key, loader) pairs of the samples of a dataset saved as tar shards"""
+    with open(os.path.join(datatype_dir, "index.json")) as f:
+        index = json.load(f)
+    label_extension = "png" if index["label_format"] == "png" else "npz"
+    for shard in index["shards"]:
+        for key, sample in read_shard(os.path.join(datatype_dir, shard["file"]), decode=False):
+            def load(sample=sample):
+                image = cv2.imdecode(np.frombuffer(sample["image"], dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+                return image, decode_label(sample["label"], label_extension)
+            yield key, load
+
+def main(output_dir, sheets, tiles_per_sheet, thumb_size, seed):
+    datatypes = [name for name in natsorted(os.listdir(output_dir))
+                 if os.path.isdir(os.path.join(output_dir, name, "images")) or os.path.exists(os.path.join(output_dir, name, "index.json"))]
+    if not datatypes:
+        raise FileNotFoundError(f"No datasets (images/ or index.json) found in {output_dir}")
+
+    for datatype in datatypes:
+        datatype_dir = os.path.join(output_dir, datatype)
+        if os.path.exists(os.path.join(datatype_dir, "index.json")):
+            tiles = stream_tar_tiles(datatype_dir)
+        else:
+            tiles = stream_file_tiles(datatype_dir)
+        builder = ContactSheetBuilder(os.path.join(datatype_dir, "qa"), sheets, tiles_per_sheet, thumb_size, seed)
+        for name, load in tiles:
+            builder.offer(name, load)
+        paths = builder.write()
+        print(f"{datatype}: {len(paths)} sheets from {builder.tiles_seen} tiles in {builder.output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write QA contact sheets of a generated dataset")
+    parser.add_argument("output_dir", help="Output directory of the config")
+    parser.add_argument("--sheets", type=int, default=1, help="Number of sheets per datatype (default: 1)")
+    parser.add_argument("--tiles_per_sheet", type=int, default=64, help="Number of tiles per sheet (default: 64)")
+    parser.add_argument("--thumb_size", type=int, default=128, help="Size of the thumbnails in pixels (default: 128)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the tile sampling (default: 0)")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        if not os.path.isdir(args.output_dir):
+            raise FileNotFoundError(f"Directory not found: {args.output_dir}")
+        if min(args.sheets, args.tiles_per_sheet, args.thumb_size) <= 0:
+            raise ValueError("ValueError: --sheets, --tiles_per_sheet and --thumb_size must be positive integers.")
+
+        # Run the main function
+        main(args.output_dir, args.sheets, args.tiles_per_sheet, args.thumb_size, args.seed)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
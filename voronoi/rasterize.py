@@ -0,0 +1,112 @@
+"""
+Rasterize the tiles of a dataset saved with `output.backend: vector`
+
+Usage:
+$ python voronoi/rasterize.py configs/sample_case_1.yaml
+$ python voronoi/rasterize.py configs/sample_case_1.yaml --datatypes valid --diagrams 0 1 2
+$ python voronoi/rasterize.py configs/sample_case_1.yaml --scale 0.5 --thickness 3
+
+Each <output_dir>/<datatype>/vectors/<i>.npz holds the facets, gray values
+and random state of diagram i (see utils.vectors.VectorDiagram). At full
+scale, the tiles are identical to the ones main.py saves with the files
+backend, under the same names. With --scale, diagrams are rendered at
+another resolution (as preview.py does) and split into tiles of the scaled
+split size; --thickness changes the label line thickness (in full-resolution
+pixels). With `output.grain_graph`, the grain graphs of the tiles are saved
+too (at full scale only, since they are in full-resolution tile coordinates).
+"""
+
+import os
+import sys
+import argparse
+from tqdm import tqdm
+from utils import VoronoiGenerator
+from utils.vectors import VectorDiagram
+from utils.label_codecs import PackedLabel
+from splitters import VoronoiSplitter
+from main import load_config, validate_config_file, create_directory, save_images
+
+
+def scaled_splitter(voronoi_config, scale):
+    """Create the splitter of a config for diagrams rendered at a scale (tiles cover the same regions)."""
+    if "split" not in voronoi_config or scale == 1.0:
+        return VoronoiSplitter(voronoi_config)
+    split_width = voronoi_config["split"]["split_width"] * scale
+    split_height = voronoi_config["split"]["split_height"] * scale
+    if not (float(split_width).is_integer() and float(split_height).is_integer()):
+        raise ValueError(f"ValueError: The split size ({split_width}x{split_height}) is not a whole number of pixels at scale {scale}.")
+    return VoronoiSplitter({"split": {"split_width": int(split_width), "split_height": int(split_height)}})
+
+def main(config_file, datatypes, diagrams, scale, thickness, output_dir):
+    # Load config file
+    config = load_config(config_file)
+
+    # Execute validation
+    validate_config_file(config)
+
+    voronoi_config = config["voronoi"]
+    output_config = voronoi_config.get("output", {})
+    if output_config.get("backend", "files") != "vector":
+        raise ValueError("ValueError: The dataset was not saved with 'output.backend: vector'.")
+    label_format = output_config.get("label_format", "png")
+    datatypes = datatypes or list(voronoi_config["datatype_info"])
+    for datatype in datatypes:
+        if datatype not in voronoi_config["datatype_info"]:
+            raise ValueError(f"ValueError: Unknown datatype: {datatype}")
+    if output_dir is None:
+        output_dir = os.path.join(voronoi_config["output_dir"], "rasterized")
+
+    # Initialize
+    voronoi_generator = VoronoiGenerator(voronoi_config)
+    voronoi_splitter = scaled_splitter(voronoi_config, scale)
+    graphs = output_config.get("grain_graph", False) and scale == 1.0
+    if output_config.get("grain_graph", False) and not graphs:
+        print("Note: grain graphs are only saved at full scale (--scale 1).")
+    create_directory(output_dir, {datatype: None for datatype in datatypes}, "weight_map" in output_config, graphs)
+
+    for datatype in datatypes:
+        indices = diagrams if diagrams is not None else range(voronoi_config["datatype_info"][datatype]["diagram_num"])
+        for i in tqdm(indices, desc=f"Rasterizing {datatype} diagrams"):
+            diagram = VectorDiagram.load(os.path.join(voronoi_config["output_dir"], datatype, "vectors", f"{i}.npz"))
+            voronoi_image, voronoi_label = voronoi_generator.rasterize(diagram, scale, thickness)
+            voronoi_weight = voronoi_generator.generate_weights(voronoi_label)
+            if label_format != "png":
+                voronoi_label = PackedLabel.from_label(voronoi_label)
+            image_list, label_list = voronoi_splitter(voronoi_image, voronoi_label)
+            weight_list = voronoi_splitter.split(voronoi_weight) if voronoi_weight is not None else [None] * len(image_list)
+            graph_list = voronoi_generator.grain_graphs(diagram, voronoi_splitter.tile_boxes(*voronoi_label.shape[1::-1])) if graphs else [None] * len(image_list)
+
+            # Tiles are named as main.py names them
+            tiles_num = len(image_list)
+            for j, (image, label, weight, graph) in enumerate(zip(image_list, label_list, weight_list, graph_list)):
+                save_images(output_dir, datatype, i * tiles_num + j, image, label, label_format, weight, graph)
+    voronoi_generator.close()
+    print(f"Saved to {output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rasterize the tiles of a dataset saved as vector diagrams")
+    parser.add_argument("config_file", help="Path to the config file (yaml)")
+    parser.add_argument("--datatypes", nargs="+", default=None, help="Datatypes to rasterize (default: all)")
+    parser.add_argument("--diagrams", type=int, nargs="+", default=None, help="Indices of the diagrams to rasterize (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale of the rendering (default: 1.0, the saved tiles)")
+    parser.add_argument("--thickness", type=float, default=None, help="Label line thickness in full-resolution pixels (default: label_info.thickness)")
+    parser.add_argument("--output_dir", default=None, help="Output directory (default: <output_dir>/rasterized)")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        if not os.path.exists(args.config_file):
+            raise FileNotFoundError(f"File not found: {args.config_file}")
+        if not args.config_file.endswith('.yaml'):
+            raise ValueError("ValueError: The configuration file must be in yaml format.")
+        if args.scale <= 0:
+            raise ValueError("ValueError: The scale must be a positive number.")
+        if args.thickness is not None and args.thickness <= 0:
+            raise ValueError("ValueError: The thickness must be a positive number.")
+
+        # Run the main function
+        main(args.config_file, args.datatypes, args.diagrams, args.scale, args.thickness, args.output_dir)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,83 @@
+"""
+Regenerate single tiles of a dataset by index
+
+Usage:
+$ python voronoi/regenerate.py configs/sample_case_1.yaml train 4711
+$ python voronoi/regenerate.py configs/sample_case_1.yaml train 4711 --all
+
+The diagram the tile was cut from is regenerated on its own (with
+`seeding: per_diagram`; sequentially seeded datasets replay the diagrams
+before it), and the tile is saved under the name main.py gave it. --all
+saves all tiles of the diagram.
+"""
+
+import os
+import sys
+import time
+import argparse
+from utils.label_codecs import PackedLabel
+from datasets import VoronoiTileDataset, regenerate
+from main import load_config, validate_config_file, create_directory, save_images
+
+
+def pack_labels(labels):
+    """Bit-pack the label tiles of a diagram as main.py does (with the label value of the whole diagram)"""
+    packed_labels = [PackedLabel.from_label(label) for label in labels]
+    value = max(int(label.max()) for label in labels) or 255
+    for packed_label in packed_labels:
+        packed_label.value = value  # Tiles without boundary pixels get the value of the diagram too
+    return packed_labels
+
+def main(config_file, datatype, tile_indices, save_all, output_dir):
+    # Load config file
+    config = load_config(config_file)
+
+    # Execute validation
+    validate_config_file(config)
+
+    voronoi_config = config["voronoi"]
+    dataset = VoronoiTileDataset(voronoi_config, datatype)
+    if dataset.seeding != "per_diagram":
+        print("Note: the dataset uses sequential seeding, so the diagrams before each tile are replayed (use 'seeding: per_diagram' for direct access).")
+    if output_dir is None:
+        output_dir = os.path.join(voronoi_config["output_dir"], "regenerated")
+    output_config = voronoi_config.get("output", {})
+    label_format = output_config.get("label_format", "png")
+    create_directory(output_dir, {datatype: None}, "weight_map" in output_config, dataset.grain_graph)
+
+    for tile_index in tile_indices:
+        start = time.perf_counter()
+        diagram_index, position, tiles = regenerate(voronoi_config, datatype, tile_index, dataset)
+        elapsed = time.perf_counter() - start
+        first = diagram_index * dataset.tiles_per_diagram
+        labels = pack_labels([tile[1] for tile in tiles]) if label_format != "png" else [tile[1] for tile in tiles]
+        graphs = dataset.graphs(diagram_index) or [None] * len(tiles)
+        for j, tile in enumerate(tiles):
+            if save_all or j == position:
+                weight = tile[2] if len(tile) > 2 else None
+                save_images(output_dir, datatype, first + j, tile[0], labels[j], label_format, weight, graphs[j])
+        print(f"{datatype}/{tile_index}: tile {position} of diagram {diagram_index} (tiles {first}-{first + len(tiles) - 1}) in {elapsed:.2f} s")
+    print(f"Saved to {os.path.join(output_dir, datatype)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate single tiles of a dataset by index")
+    parser.add_argument("config_file", help="Path to the config file (yaml)")
+    parser.add_argument("datatype", help="Datatype of the tiles (e.g. train)")
+    parser.add_argument("tile_index", type=int, nargs="+", help="Indices (names) of the tiles")
+    parser.add_argument("--all", action="store_true", help="Save all tiles of the diagrams of the tiles")
+    parser.add_argument("--output_dir", default=None, help="Output directory (default: <output_dir>/regenerated)")
+    args = parser.parse_args()
+
+    try:
+        # Validate the arguments
+        if not os.path.exists(args.config_file):
+            raise FileNotFoundError(f"File not found: {args.config_file}")
+        if not args.config_file.endswith('.yaml'):
+            raise ValueError("ValueError: The configuration file must be in yaml format.")
+
+        # Run the main function
+        main(args.config_file, args.datatype, args.tile_index, args.all, args.output_dir)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,127 @@
+"""
+Generate a dataset from planar sections of 3D Voronoi volumes
+
+Usage:
+$ python voronoi/sections.py configs/sample_volume.yaml
+
+Each volume is labelled once into a memory-mapped file and yields
+volume.sections_per_volume sections, which go through the same
+post-processing and splitting as 2D diagrams. datatype_info.diagram_num is
+the number of sections per datatype.
+"""
+
+import os
+import sys
+import math
+import tempfile
+import numpy as np
+from tqdm import tqdm
+from utils.volume import VoronoiVolumeGenerator
+from utils.rng import seed_diagram
+from utils.label_codecs import PackedLabel
+from splitters import VoronoiSplitter
+from main import load_config, validate_config_file, check_directory, create_directory, save_images, get_point_params, create_writer, create_contact_sheets
+from dataset_stats import DatasetStatistics, write_statistics
+
+
+def main(config_file):
+    # Load config file
+    config = load_config(config_file)
+
+    # Execute validation
+    validate_config_file(config)
+
+    voronoi_config = config["voronoi"]
+    if "volume" not in voronoi_config:
+        raise ValueError("ValueError: The 'volume' section is required.")
+    output_dir = voronoi_config["output_dir"]
+    datatype_info = voronoi_config["datatype_info"]
+    seeding = voronoi_config.get("seeding", "sequential")
+    volume_config = voronoi_config["volume"]
+    sections_per_volume = volume_config.get("sections_per_volume", 100)
+    volume_dir = volume_config.get("path")
+    label_format = voronoi_config.get("output", {}).get("label_format", "png")
+    weights = "weight_map" in voronoi_config.get("output", {})
+
+    # Initialize
+    volume_generator = VoronoiVolumeGenerator(voronoi_config)
+    voronoi_splitter = VoronoiSplitter(voronoi_config)
+
+    # Create output directory
+    check_directory(output_dir)
+    if voronoi_config.get("output", {}).get("backend", "files") == "files":
+        create_directory(output_dir, datatype_info, weights)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+    if volume_dir is not None:
+        os.makedirs(volume_dir, exist_ok=True)
+
+    # Generate volumes and save their sections
+    statistics = {}
+    for datatype, params in datatype_info.items():
+        if seeding == "sequential":
+            np.random.seed(params["seed"]) # Set random seed
+        volumes_num = math.ceil(params["diagram_num"] / sections_per_volume)
+        writer = create_writer(voronoi_config, datatype)
+        contact_sheets = create_contact_sheets(voronoi_config, datatype)
+        name_counter = 0
+        statistics[datatype] = DatasetStatistics()
+        with tqdm(total=params["diagram_num"], desc=f"Generating {datatype} sections") as progress:
+            for v in range(volumes_num):
+                if seeding == "per_diagram":
+                    seed_diagram(params["seed"], v) # Set random seed of this volume
+                sections_num = min(sections_per_volume, params["diagram_num"] - v * sections_per_volume)
+
+                # Volumes are kept in volume.path, or written to a temporary file next to the outputs
+                if volume_dir is not None:
+                    path = os.path.join(volume_dir, f"{datatype}_{v}.npy")
+                else:
+                    fd, path = tempfile.mkstemp(suffix=".npy", dir=output_dir)
+                    os.close(fd)
+                try:
+                    volume = volume_generator.generate_volume(path, **get_point_params(voronoi_config, v))
+                    for k, (voronoi_image, voronoi_label) in enumerate(volume_generator.generate_sections(volume, sections_num)):
+                        voronoi_weight = volume_generator.generate_weights(voronoi_label) # Weight map of the full section
+                        if label_format != "png":
+                            voronoi_label = PackedLabel.from_label(voronoi_label) # Keep the label bit-packed
+                        image_list, label_list = voronoi_splitter(voronoi_image, voronoi_label) # Split images and labels
+                        weight_list = voronoi_splitter.split(voronoi_weight) if weights else [None] * len(image_list)
+                        for j, (image, label, weight) in enumerate(zip(image_list, label_list, weight_list)):
+                            if writer is None:
+                                save_images(output_dir, datatype, name_counter, image, label, label_format, weight)
+                            else:
+                                metadata = {"volume_index": v, "section_index": k, "tile_index": j, "seed": params["seed"], "seeding": seeding}
+                                writer.write(f"{name_counter:08d}", image, label, metadata, weight)
+                            if contact_sheets is not None:
+                                contact_sheets.add(str(name_counter) if writer is None else f"{name_counter:08d}", image, label)
+                            statistics[datatype].add(image, label)
+                            name_counter += 1
+                        progress.update(1)
+                    del volume
+                finally:
+                    if volume_dir is None:
+                        os.remove(path)
+        if writer is not None:
+            writer.close() # Flush the last shard and write the shard index
+        if contact_sheets is not None:
+            contact_sheets.write()
+    write_statistics(output_dir, statistics)
+
+if __name__ == "__main__":
+    args = sys.argv
+    try:
+        # Validate the arguments
+        if len(args) != 2:
+            raise ValueError("ValueError: The number of arguments is invalid.")
+        config_file = args[1]
+        if not os.path.exists(config_file):
+            raise FileNotFoundError(f"File not found: {config_file}")
+        if not config_file.endswith('.yaml'):
+            raise ValueError("ValueError: The configuration file must be in yaml format.")
+
+        # Run the main function
+        main(config_file)
+
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,229 @@
+"""
+Helpers for splitting a dataset build over several nodes and merging the parts
+
+Each node runs `main.py <config> --shard i/N` and generates a contiguous
+block of the diagram indices of every datatype into
+`<output_dir>/part-<i>-of-<N>`, with a manifest.json listing its diagrams
+and files. Tile names only depend on the diagram index, so the merged parts
+are identical to a single-node run with `seeding: per_diagram`.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+from typing import Dict, Any, List, Tuple
+from dataset_stats import load_statistics, write_statistics
+
+MANIFEST_NAME = "manifest.json"
+PART_PATTERN = re.compile(r"^part-(\d+)-of-(\d+)$")
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """Parse a shard specification 'i/N' (0 <= i < N)
+
+    Raises:
+        ValueError: If the specification is malformed or out of range
+    """
+    match = re.fullmatch(r"(\d+)/(\d+)", text)
+    if match is None:
+        raise ValueError(f"ValueError: The shard must be given as 'i/N' (e.g. 0/4): {text}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count <= 0 or index >= count:
+        raise ValueError(f"ValueError: The shard index must be between 0 and N-1: {text}")
+    return index, count
+
+
+def shard_range(diagram_num: int, index: int, count: int) -> range:
+    """Get the diagram indices generated by a shard (contiguous, balanced blocks)"""
+    return range(diagram_num * index // count, diagram_num * (index + 1) // count)
+
+
+def part_dir(output_dir: str, index: int, count: int) -> str:
+    """Get the output directory of a shard"""
+    return os.path.join(output_dir, f"part-{index:03d}-of-{count:03d}")
+
+
+def config_digest(voronoi_config: Dict[str, Any]) -> str:
+    """Get a digest of the settings that affect the generated data (everything but output_dir)"""
+    settings = {k: v for k, v in voronoi_config.items() if k != "output_dir"}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def check_shardable(voronoi_config: Dict[str, Any]):
+    """Check that the diagrams of a config do not depend on the generation order
+
+    Raises:
+        ValueError: If the config uses sequential seeding or a point-set bank with max_uses
+    """
+    if voronoi_config.get("seeding", "sequential") != "per_diagram":
+        raise ValueError("ValueError: Sharding requires 'seeding: per_diagram'.")
+    bank = voronoi_config["point_generation"]["params"].get("bank")
+    if isinstance(bank, dict) and bank.get("max_uses") is not None:
+        raise ValueError("ValueError: Sharding does not support 'bank.max_uses' (served sets depend on the generation order).")
+
+
+def write_manifest(directory: str, manifest: Dict[str, Any]):
+    """Write the manifest of a shard or of a merged dataset"""
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_manifests(output_dir: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Load the manifests of the shard directories of an output directory, sorted by shard index"""
+    manifests = []
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        if PART_PATTERN.match(name) and os.path.isdir(path):
+            manifest_path = os.path.join(path, MANIFEST_NAME)
+            if not os.path.exists(manifest_path):
+                raise FileNotFoundError(f"Manifest not found (unfinished shard?): {manifest_path}")
+            with open(manifest_path) as f:
+                manifests.append((path, json.load(f)))
+    return sorted(manifests, key=lambda item: item[1]["shard"])
+
+
+def verify_manifests(manifests: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """Check that the shards are complete, consistent and disjoint
+
+    Returns:
+        List[str]: Problems found (empty if the shards can be merged)
+    """
+    if not manifests:
+        return ["No shard directories (part-<i>-of-<N>) found"]
+
+    errors = []
+    first = manifests[0][1]
+    count = first["num_shards"]
+    for key in ["num_shards", "config_digest", "backend", "label_format"]:
+        values = {json.dumps(manifest[key]) for _, manifest in manifests}
+        if len(values) > 1:
+            errors.append(f"Shards disagree on '{key}': {sorted(values)}")
+    indices = [manifest["shard"] for _, manifest in manifests]
+    missing = sorted(set(range(count)) - set(indices))
+    if missing:
+        errors.append(f"Missing shards: {missing} of {count}")
+    duplicates = sorted({i for i in indices if indices.count(i) > 1})
+    if duplicates:
+        errors.append(f"Duplicate shards: {duplicates}")
+    if errors:
+        return errors
+
+    for datatype in first["datatypes"]:
+        entries = []
+        for path, manifest in manifests:
+            if datatype not in manifest["datatypes"]:
+                errors.append(f"{path}: datatype '{datatype}' is missing")
+                continue
+            entries.append((path, manifest["datatypes"][datatype]))
+        diagram_num = entries[0][1]["diagram_num"]
+
+        # Diagram ranges must tile [0, diagram_num) without gaps or overlaps
+        end = 0
+        for path, entry in sorted(entries, key=lambda item: item[1]["diagrams"][0]):
+            start, stop = entry["diagrams"]
+            if start != end:
+                errors.append(f"{datatype}: diagrams {min(start, end)}-{max(start, end) - 1} are {'missing' if start > end else 'generated twice'} ({path})")
+            end = max(end, stop)
+        if end != diagram_num:
+            errors.append(f"{datatype}: diagrams {end}-{diagram_num - 1} are missing")
+
+        # Every tile name must occur exactly once and its files must exist
+        tiles_nums = {entry["tiles_per_diagram"] for _, entry in entries if entry["tiles_per_diagram"] is not None}
+        if len(tiles_nums) > 1:
+            errors.append(f"{datatype}: shards disagree on the number of tiles per diagram: {sorted(tiles_nums)}")
+            continue
+        tiles_num = tiles_nums.pop() if tiles_nums else 0
+        seen = set()
+        for path, entry in entries:
+            names = set(entry["tiles"])
+            overlap = seen & names
+            if overlap:
+                errors.append(f"{datatype}: tiles generated twice: {sorted(overlap)[:10]}")
+            seen |= names
+            for file in entry["files"]:
+                if not os.path.exists(os.path.join(path, datatype, file)):
+                    errors.append(f"{datatype}: file not found: {os.path.join(path, datatype, file)}")
+        expected = set(range(diagram_num * tiles_num))
+        if seen != expected:
+            errors.append(f"{datatype}: {len(expected - seen)} tiles missing, {len(seen - expected)} unexpected")
+    return errors
+
+
+def merge_shards(output_dir: str, copy: bool = False) -> Dict[str, Any]:
+    """Merge the shard directories of an output directory into one dataset
+
+    Files are moved (or copied) to `<output_dir>/<datatype>`. Tar shards are
+    renumbered across nodes and their indexes are combined into one
+    index.json per datatype, and the statistics of the parts are merged into
+    one stats.json. Nothing is moved unless all checks pass.
+
+    Args:
+        output_dir (str): Output directory containing the part-<i>-of-<N> directories
+        copy (bool): Whether to copy the files and keep the shard directories
+
+    Returns:
+        Dict[str, Any]: Manifest of the merged dataset
+
+    Raises:
+        ValueError: If the shards are incomplete, inconsistent or overlapping
+    """
+    manifests = load_manifests(output_dir)
+    errors = verify_manifests(manifests)
+    if errors:
+        raise ValueError("ValueError: The shards cannot be merged:\n" + "\n".join(f"  - {error}" for error in errors))
+
+    first = manifests[0][1]
+    transfer = shutil.copy2 if copy else shutil.move
+    merged = {key: first[key] for key in ["num_shards", "config_digest", "backend", "label_format"]}
+    merged["datatypes"] = {}
+    for datatype in first["datatypes"]:
+        moves = []
+        tar_shards = []
+        for path, manifest in manifests:
+            entry = manifest["datatypes"][datatype]
+            if first["backend"] == "tar":
+                for shard in entry["shards"]:
+                    file = f"shard-{len(tar_shards):06d}.tar"
+                    moves.append((os.path.join(path, datatype, shard["file"]), file))
+                    tar_shards.append(dict(shard, file=file))
+            else:
+                moves.extend((os.path.join(path, datatype, file), file) for file in entry["files"])
+
+        conflicts = [file for _, file in moves if os.path.exists(os.path.join(output_dir, datatype, file))]
+        if conflicts:
+            raise ValueError(f"ValueError: {datatype}: {len(conflicts)} files already exist in the output directory (e.g. {conflicts[0]})")
+        for source, file in moves:
+            os.makedirs(os.path.dirname(os.path.join(output_dir, datatype, file)), exist_ok=True)
+            transfer(source, os.path.join(output_dir, datatype, file))
+        if first["backend"] == "tar":
+            index = {
+                "label_format": first["label_format"],
+                "samples": sum(shard["samples"] for shard in tar_shards),
+                "shards": tar_shards,
+            }
+            with open(os.path.join(output_dir, datatype, "index.json"), "w") as f:
+                json.dump(index, f, indent=2)
+
+        entries = [manifest["datatypes"][datatype] for _, manifest in manifests]
+        merged["datatypes"][datatype] = {
+            "diagram_num": entries[0]["diagram_num"],
+            "tiles_per_diagram": next((e["tiles_per_diagram"] for e in entries if e["tiles_per_diagram"] is not None), None),
+            "tiles": sum(len(e["tiles"]) for e in entries),
+        }
+
+    # Statistics of the parts are merged in shard order (parts written before they were recorded have none)
+    part_statistics = [load_statistics(path) for path, _ in manifests]
+    if all(statistics is not None for statistics in part_statistics):
+        statistics = part_statistics[0]
+        for other in part_statistics[1:]:
+            for datatype in statistics:
+                statistics[datatype].merge(other[datatype])
+        write_statistics(output_dir, statistics)
+
+    if not copy:
+        for path, _ in manifests:
+            shutil.rmtree(path)
+    write_manifest(output_dir, merged)
+    return merged
@@ -7,6 +7,7 @@ import numpy as np
 from typing import List, Tuple, Optional, Dict, Any
 import os
 from natsort import natsorted
+from utils.label_codecs import PackedLabel
 
 
 class ImageSplitter:
@@ -34,23 +35,39 @@ class ImageSplitter:
             ValueError: If the image size is not divisible by the split size
         """
         h, w = image.shape[:2]
+        return [image[top:bottom, left:right] for top, bottom, left, right in self.tile_boxes(w, h)]
+    
+    def split_packed(self, label: PackedLabel) -> List[PackedLabel]:
+        """Split a bit-packed label
+
+        Packed rows are sliced without unpacking when the split width is a
+        multiple of 8 (the tiles then start on byte boundaries).
+        """
+        h, w = label.shape[:2]
+        return [label.crop(top, bottom, left, right) for top, bottom, left, right in self.tile_boxes(w, h)]
+    
+    def tile_boxes(self, w: int, h: int) -> List[Tuple[int, int, int, int]]:
+        """Get the (top, bottom, left, right) boxes of the tiles of an image of size w x h
+
+        Raises:
+            ValueError: If the image size is not divisible by the split size
+        """
         rows = h // self.height
         columns = w // self.width
         
         if w % self.width != 0 or h % self.height != 0:
             raise ValueError(f"Image size ({w}x{h}) is not divisible by split size ({self.width}x{self.height})")
 
-        split_images = []
+        boxes = []
         for i in range(rows):
             for j in range(columns):
                 top = i * self.height
                 bottom = (i + 1) * self.height
                 left = j * self.width
                 right = (j + 1) * self.width
-                cropped_image = image[top:bottom, left:right]
-                split_images.append(cropped_image)
+                boxes.append((top, bottom, left, right))
         
-        return split_images
+        return boxes
 
 
 class VoronoiSplitter:
@@ -79,7 +96,7 @@ class VoronoiSplitter:
 
         Args:
             image (np.ndarray): The image to be split
-            label (np.ndarray): The label to be split
+            label (np.ndarray or PackedLabel): The label to be split (packed labels are split without unpacking when aligned)
 
         Returns:
             Tuple[List[np.ndarray], List[np.ndarray]]: A tuple of (list of split images, list of split labels)
@@ -90,8 +107,44 @@ class VoronoiSplitter:
         """
         if self.splitter:
             image_list = self.splitter.split_image(image)
-            label_list = self.splitter.split_image(label)
+            if isinstance(label, PackedLabel):
+                label_list = self.splitter.split_packed(label)
+            else:
+                label_list = self.splitter.split_image(label)
         else:
             image_list, label_list = [image], [label]
         
         return image_list, label_list
+
+    def tiles_num(self, width: int, height: int) -> int:
+        """Get the number of tiles of a diagram of size width x height
+
+        Raises:
+            ValueError: If the size is not divisible by the split size
+        """
+        if self.splitter:
+            return len(self.splitter.tile_boxes(width, height))
+        return 1
+
+    def tile_boxes(self, width: int, height: int) -> List[Tuple[int, int, int, int]]:
+        """Get the (top, bottom, left, right) boxes of the tiles of a diagram of size width x height (the whole diagram if splitting is not specified)
+
+        Raises:
+            ValueError: If the size is not divisible by the split size
+        """
+        if self.splitter:
+            return self.splitter.tile_boxes(width, height)
+        return [(0, height, 0, width)]
+
+    def split(self, array: np.ndarray) -> List[np.ndarray]:
+        """Split another per-pixel array of the diagram (e.g. a weight map) into the same tiles
+
+        Args:
+            array (np.ndarray): The array to be split
+
+        Returns:
+            List[np.ndarray]: A list of split arrays (a single-element list if splitting is not specified)
+        """
+        if self.splitter:
+            return self.splitter.split_image(array)
+        return [array]
@@ -0,0 +1,254 @@
+"""
+Classes related to grain adjacency graphs
+"""
+
+import io
+import numpy as np
+from typing import List, Tuple
+
+# Inset of the tiles, so that no facet edge lies on a tile side (vertices are multiples of 1/2^shift)
+BOX_EPSILON = 2.0 ** -20
+
+
+class GrainGraph:
+    """Grain adjacency graph of a tile
+
+    Coordinates are in pixels of the tile (the center of its top-left pixel
+    is (0, 0)), and grains are identified by the index of their facet in
+    the diagram, so the graphs of the tiles of a diagram can be joined.
+
+    Attributes:
+        grains (np.ndarray): int32 indices of the grains reaching the tile, of shape (G,)
+        areas (np.ndarray): float32 areas of the grains within the tile in pixels, of shape (G,)
+        centroids (np.ndarray): float32 (x, y) centroids of the grains within the tile, of shape (G, 2)
+        edges (np.ndarray): int32 index pairs (smaller first) of adjacent grains, of shape (E, 2)
+        lengths (np.ndarray): float32 lengths of the shared boundaries within the tile in pixels, of shape (E,)
+        junctions (np.ndarray): float32 (x, y) positions of the triple junctions within the tile, of shape (J, 2)
+    """
+
+    def __init__(self, grains: np.ndarray, areas: np.ndarray, centroids: np.ndarray,
+                 edges: np.ndarray, lengths: np.ndarray, junctions: np.ndarray):
+        self.grains = grains
+        self.areas = areas
+        self.centroids = centroids
+        self.edges = edges
+        self.lengths = lengths
+        self.junctions = junctions
+
+    def to_bytes(self) -> bytes:
+        """Encode the graph as the bytes of a compressed .npz file"""
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, grains=self.grains, areas=self.areas, centroids=self.centroids,
+                            edges=self.edges, lengths=self.lengths, junctions=self.junctions)
+        return buffer.getvalue()
+
+    def save(self, path: str) -> str:
+        """Save the graph as a compressed .npz file (the extension is appended if missing)
+
+        Returns:
+            str: Path of the saved file
+        """
+        if not path.endswith(".npz"):
+            path += ".npz"
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+        return path
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "GrainGraph":
+        """Decode a graph encoded with to_bytes"""
+        with np.load(io.BytesIO(data)) as npz:
+            return cls(npz["grains"], npz["areas"], npz["centroids"], npz["edges"], npz["lengths"], npz["junctions"])
+
+    @classmethod
+    def load(cls, path: str) -> "GrainGraph":
+        """Load a graph saved with save"""
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class GrainGraphBuilder:
+    """Class for computing the grain adjacency graphs of the tiles of a diagram from its facets
+
+    Edges shared by two facets (the Voronoi edges between neighbouring
+    seeds, drawn once by each facet) are matched on their exact fixed-point
+    vertices, and vertices shared by three or more facets are the triple
+    junctions. For each tile, the shared edges are clipped to the tile
+    (Liang-Barsky), and all facets are clipped to it at once by
+    Sutherland-Hodgman stages on the concatenated vertices (exact for the
+    slightly concave facets left by rounding vertices to pixels), which
+    gives the area and centroid of every grain within the tile. Wrapped
+    copies of the facets of periodic diagrams count for their grain.
+
+    Attributes:
+        width (int): Width of the diagram
+        height (int): Height of the diagram
+        periodic (bool): Whether facets wrap around the borders (periodic diagrams)
+        shift (int): Number of fractional bits of the facets
+    """
+
+    def __init__(self, width: int, height: int, periodic: bool = False, shift: int = 0):
+        self.width = width
+        self.height = height
+        self.periodic = periodic
+        self.shift = shift
+
+    def build(self, facets: List[np.ndarray], boxes: List[Tuple[int, int, int, int]]) -> List[GrainGraph]:
+        """Compute the graphs of tiles of a diagram
+
+        Args:
+            facets (List[np.ndarray]): Facets (fixed-point with shift fractional bits, see VoronoiCalculator)
+            boxes (List[Tuple[int, int, int, int]]): (left, top, right, bottom) pixel ranges of the tiles in the diagram (right and bottom excluded)
+
+        Returns:
+            List[GrainGraph]: Graph of each tile
+        """
+        vertices, lengths, grains = self._polygons(facets)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        polygon_ids = np.repeat(np.arange(len(lengths)), lengths)
+        following = np.arange(1, len(vertices) + 1)
+        if len(vertices):
+            following[starts + lengths - 1] = starts
+
+        # Shared edges, matched on their fixed-point vertices (each facet draws them in its own direction)
+        ends = vertices[following]
+        swap = (vertices[:, 0] > ends[:, 0]) | ((vertices[:, 0] == ends[:, 0]) & (vertices[:, 1] > ends[:, 1]))
+        keys = np.where(swap[:, np.newaxis], np.hstack([ends, vertices]), np.hstack([vertices, ends]))
+        _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        first = order[:-1][(inverse[order[:-1]] == inverse[order[1:]]) & (counts[inverse[order[:-1]]] == 2)]
+        second = order[1:][(inverse[order[:-1]] == inverse[order[1:]]) & (counts[inverse[order[:-1]]] == 2)]
+        pairs = np.sort(np.stack([grains[polygon_ids[first]], grains[polygon_ids[second]]], axis=1), axis=1)
+        distinct = (pairs[:, 0] != pairs[:, 1]) & np.any(vertices[first] != ends[first], axis=1)
+        shared, pairs = keys[first[distinct]] / (1 << self.shift), pairs[distinct]
+
+        # Triple junctions: vertices of three or more facets (a facet lists each vertex once)
+        unique_vertices, vertex_counts = np.unique(vertices, axis=0, return_counts=True)
+        junctions = unique_vertices[vertex_counts >= 3] / (1 << self.shift)
+
+        points = vertices / (1 << self.shift)
+        return [self._tile(points, polygon_ids, grains, shared, pairs, junctions, box) for box in boxes]
+
+    def _polygons(self, facets: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the vertices, lengths and grain indices of the facets (with their wrapped copies for periodic diagrams)"""
+        lengths = np.array([len(facet) for facet in facets], dtype=np.int64)
+        vertices = np.concatenate([np.asarray(facet).reshape(-1, 2) for facet in facets]).astype(np.int64) if len(facets) else np.empty((0, 2), dtype=np.int64)
+        grains = np.arange(len(facets))
+        if not self.periodic or len(facets) == 0:
+            return vertices, lengths, grains
+        # Keep the copies reaching the canvas (with a pixel of margin)
+        width, height = self.width << self.shift, self.height << self.shift
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        mins, maxs = np.minimum.reduceat(vertices, starts), np.maximum.reduceat(vertices, starts)
+        margin = 1 << self.shift
+        copies = []
+        for oy in (-height, 0, height):
+            for ox in (-width, 0, width):
+                reaching = ((maxs[:, 0] + ox >= -margin) & (mins[:, 0] + ox <= width + margin) &
+                            (maxs[:, 1] + oy >= -margin) & (mins[:, 1] + oy <= height + margin))
+                copies.append((vertices[np.repeat(reaching, lengths)] + (ox, oy), lengths[reaching], grains[reaching]))
+        return (np.concatenate([copy[0] for copy in copies]), np.concatenate([copy[1] for copy in copies]),
+                np.concatenate([copy[2] for copy in copies]))
+
+    @staticmethod
+    def _cross(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Row-wise cross products a x b"""
+        return a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+
+    @staticmethod
+    def _clip(starts: np.ndarray, directions: np.ndarray, box: Tuple[float, float, float, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Clip segments start + u * direction (u in [0, 1]) to a box (Liang-Barsky)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Parameters (u0, u1) of the clipped segments (empty when u0 >= u1)
+        """
+        left, top, right, bottom = box
+        u0, u1 = np.zeros(len(starts)), np.ones(len(starts))
+        for p, q in [(-directions[:, 0], starts[:, 0] - left), (directions[:, 0], right - starts[:, 0]),
+                     (-directions[:, 1], starts[:, 1] - top), (directions[:, 1], bottom - starts[:, 1])]:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = q / p
+            u0 = np.where(p < 0, np.maximum(u0, ratio), u0)
+            u1 = np.where(p > 0, np.minimum(u1, ratio), u1)
+            u0 = np.where((p == 0) & (q < 0), np.inf, u0)
+        return u0, u1
+
+    @staticmethod
+    def _following(owners: np.ndarray) -> np.ndarray:
+        """Get the index of the next vertex of each vertex of contiguous polygons, wrapping around within its polygon"""
+        following = np.arange(1, len(owners) + 1)
+        if len(owners):
+            ends = np.flatnonzero(np.r_[owners[1:] != owners[:-1], True])
+            following[ends] = np.r_[0, ends[:-1] + 1]
+        return following
+
+    def _clip_polygons(self, points: np.ndarray, owners: np.ndarray, axis: int, value: float,
+                       keep_greater: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Clip polygons to a half-plane, all at once (one Sutherland-Hodgman stage, also exact for concave polygons)
+
+        Each edge emits the intersection with the clipping line when it
+        crosses it, then its end vertex when that is inside, so the vertices
+        of each polygon stay contiguous and in order.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Vertices of the clipped polygons and the polygon of each vertex
+        """
+        following = self._following(owners)
+        ends = points[following]
+        inside = points[:, axis] >= value if keep_greater else points[:, axis] <= value
+        end_inside = inside[following]
+        crossing = inside != end_inside
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (value - points[:, axis]) / (ends[:, axis] - points[:, axis])
+        intersections = points + np.where(crossing, t, 0)[:, np.newaxis] * (ends - points)
+
+        counts = crossing.astype(np.int64) + end_inside
+        edges = np.repeat(np.arange(len(points)), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        slot = np.arange(len(edges)) - first
+        use_intersection = crossing[edges] & (slot == 0)
+        clipped = np.where(use_intersection[:, np.newaxis], intersections[edges], ends[edges])
+        return clipped, owners[edges]
+
+    def _tile(self, points: np.ndarray, polygon_ids: np.ndarray, grains: np.ndarray, shared: np.ndarray,
+              pairs: np.ndarray, junctions: np.ndarray, box: Tuple[int, int, int, int]) -> GrainGraph:
+        """Compute the graph of one tile"""
+        left, top, right, bottom = box
+        origin = np.array([left, top], dtype=np.float64)
+        # Pixel centers are at integer coordinates, so the tile covers [left - 0.5, right - 0.5]
+        x0, y0, x1, y1 = clip_box = (-0.5 + BOX_EPSILON, -0.5 + BOX_EPSILON,
+                                     right - left - 0.5 - BOX_EPSILON, bottom - top - 0.5 - BOX_EPSILON)
+
+        # Shared boundaries within the tile, summed per pair of grains (periodic copies may meet twice)
+        segment_starts = shared[:, :2] - origin
+        directions = shared[:, 2:] - shared[:, :2]
+        u0, u1 = self._clip(segment_starts, directions, clip_box)
+        inside = u1 > u0
+        clipped = (u1 - u0)[inside] * np.hypot(directions[inside, 0], directions[inside, 1])
+        edges, edge_inverse = np.unique(pairs[inside], axis=0, return_inverse=True)
+        edge_lengths = np.bincount(edge_inverse.ravel(), weights=clipped, minlength=len(edges))
+
+        # Facets clipped to the tile, then their areas and first moments (shoelace), summed per grain
+        local, owners = points - origin, polygon_ids
+        for axis, value, keep_greater in [(0, x0, True), (0, x1, False), (1, y0, True), (1, y1, False)]:
+            local, owners = self._clip_polygons(local, owners, axis, value, keep_greater)
+        following = self._following(owners)
+        cross = self._cross(local, local[following])
+        owners = grains[owners]
+        grains_num = int(grains.max()) + 1 if len(grains) else 0
+        double_areas = np.bincount(owners, weights=cross, minlength=grains_num)
+        moment_x = np.bincount(owners, weights=(local[:, 0] + local[following, 0]) * cross, minlength=grains_num)
+        moment_y = np.bincount(owners, weights=(local[:, 1] + local[following, 1]) * cross, minlength=grains_num)
+        present = np.flatnonzero(np.abs(double_areas) > 1e-9)
+        centroids = np.stack([moment_x[present], moment_y[present]], axis=1) / (3 * double_areas[present, np.newaxis])
+
+        # Triple junctions within the tile
+        local_junctions = junctions - origin
+        within = ((local_junctions[:, 0] > x0) & (local_junctions[:, 0] < x1) &
+                  (local_junctions[:, 1] > y0) & (local_junctions[:, 1] < y1))
+
+        return GrainGraph(
+            present.astype(np.int32), (np.abs(double_areas[present]) / 2).astype(np.float32), centroids.astype(np.float32),
+            edges.astype(np.int32).reshape(-1, 2), edge_lengths.astype(np.float32), local_junctions[within].astype(np.float32)
+        )
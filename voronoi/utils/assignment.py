@@ -0,0 +1,103 @@
+"""
+Classes related to assigning pixels (or voxels) to their nearest seed
+"""
+
+import itertools
+import numpy as np
+from typing import Iterator, Optional, Sequence, Tuple
+
+
+class NearestSeedAssigner:
+    """Chunked, vectorized nearest-seed labelling of 2D images and 3D volumes
+
+    The grid is processed block by block, so memory stays bounded regardless
+    of its size. For each block, only the seeds that can be nearest to some
+    cell of the block are considered: a seed whose distance to the block box
+    exceeds the smallest farthest-corner distance of any seed cannot win a
+    single cell. The test is applied to groups of blocks first, then to each
+    block of the group, so every seed is only tested against nearby blocks.
+    The result is exact (ties go to the seed with the lower index).
+
+    With weights, cells go to the seed of smallest power distance
+    |x - s|^2 - w (a power or Laguerre diagram, where w is the squared
+    radius of the seed), and the test compares power distances instead.
+
+    Attributes:
+        block_shape (Tuple[int, ...]): Shape of the blocks the grid is processed in
+        group_size (int): Number of blocks per group along each axis
+    """
+
+    def __init__(self, block_shape: Sequence[int] = (8, 16, 16), group_size: int = 4):
+        self.block_shape = tuple(block_shape)
+        self.group_size = group_size
+
+    def assign(self, seeds: np.ndarray, out: np.ndarray, offset: Sequence[int] = None,
+               weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """Write the index of the nearest seed of every cell into out
+
+        Args:
+            seeds (np.ndarray): Seed coordinates of shape (N, ndim), in the axis order of out
+            out (np.ndarray): Integer output array (e.g. a memory-mapped volume) of shape (D, H, W) or (H, W)
+            offset (Sequence[int]): Grid coordinates of out[0, ..., 0] (default: origin)
+            weights (Optional[np.ndarray]): Power weights of shape (N,) (default: ordinary Voronoi assignment)
+
+        Returns:
+            np.ndarray: out
+        """
+        ndim = out.ndim
+        if seeds.ndim != 2 or seeds.shape[1] != ndim:
+            raise ValueError(f"Seeds must have shape (N, {ndim}) for a {ndim}D grid")
+        if len(seeds) == 0:
+            raise ValueError("At least one seed is required")
+        offset = np.zeros(ndim, dtype=int) if offset is None else np.asarray(offset)
+        block_shape = self.block_shape[-ndim:]
+        group_shape = tuple(b * self.group_size for b in block_shape)
+        seeds = seeds.astype(np.float64)
+        weights = np.zeros(len(seeds)) if weights is None else np.asarray(weights, dtype=np.float64)
+        if weights.shape != (len(seeds),):
+            raise ValueError("Weights must have one value per seed")
+        all_seeds = np.arange(len(seeds))
+
+        for group_start, group_stop in self._blocks((0,) * ndim, out.shape, group_shape):
+            group_candidates = self._candidates(seeds, weights, all_seeds, offset + group_start, offset + group_stop)
+            for start, stop in self._blocks(group_start, group_stop, block_shape):
+                candidates = self._candidates(seeds, weights, group_candidates, offset + start, offset + stop)
+                region = tuple(slice(a, b) for a, b in zip(start, stop))
+                out[region] = self._nearest(seeds, weights, candidates, offset + start, offset + stop)
+        return out
+
+    def _blocks(self, start: Sequence[int], stop: Sequence[int],
+                step: Sequence[int]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Iterate over the (start, stop) corners of the blocks tiling a box"""
+        ranges = [range(a, b, s) for a, b, s in zip(start, stop, step)]
+        for corner in itertools.product(*ranges):
+            corner = np.array(corner)
+            yield corner, np.minimum(corner + step, stop)
+
+    def _candidates(self, seeds: np.ndarray, weights: np.ndarray, indices: np.ndarray,
+                    start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+        """Select the seeds among indices that can be nearest to a cell of a box"""
+        if len(indices) == 1:
+            return indices
+        points = seeds[indices]
+        low, high = start, stop - 1
+        near = np.sum(np.maximum(np.maximum(low - points, points - high), 0) ** 2, axis=1) - weights[indices]
+        far = np.sum(np.maximum(np.abs(points - low), np.abs(points - high)) ** 2, axis=1) - weights[indices]
+        return indices[near <= far.min()]
+
+    def _nearest(self, seeds: np.ndarray, weights: np.ndarray, candidates: np.ndarray,
+                 start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+        """Compute the nearest seeds of the cells of a block"""
+        shape = tuple(stop - start)
+        if len(candidates) == 1:
+            return np.full(shape, candidates[0])
+
+        # Squared distances summed axis by axis through broadcasting: (..., K)
+        points = seeds[candidates]
+        ndim = len(shape)
+        distances = -weights[candidates]
+        for axis in range(ndim):
+            coordinates = np.arange(start[axis], stop[axis], dtype=np.float64)
+            difference = (coordinates[:, np.newaxis] - points[:, axis]) ** 2
+            distances = distances + difference.reshape((1,) * axis + (shape[axis],) + (1,) * (ndim - axis - 1) + (-1,))
+        return candidates[np.argmin(distances, axis=-1)]
@@ -6,6 +6,21 @@ import numpy as np
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Tuple, List
 
+# Number of normal draws discarded at a time by skip_normal
+SKIP_CHUNK = 1 << 20
+
+
+def skip_normal(count: int):
+    """Advance the global random state past count normal draws, in chunks of bounded memory
+
+    Previews draw per-pixel noise at reduced resolution and skip the rest of
+    the full-resolution draws, so that the draws after the noise (e.g. mask
+    geometry) are the ones of the full run.
+    """
+    while count > 0:
+        np.random.standard_normal(min(count, SKIP_CHUNK))
+        count -= SKIP_CHUNK
+
 
 class PointGenerator(ABC):
     """Abstract base class for generating seed points"""
@@ -32,3 +47,30 @@ class ImageProcessor(ABC):
     def process(self, image: np.ndarray) -> np.ndarray:
         """Process the image"""
         pass
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Get the (width, height) of the processed image"""
+        return width, height
+
+    def process_preview(self, image: np.ndarray, scale: float, full_size: Tuple[int, int]) -> np.ndarray:
+        """Process a reduced-scale preview of the image
+
+        Processors that draw geometry override this to make the same random
+        draws as at full resolution (full_size is the (width, height) of the
+        full-resolution image) and render them scaled.
+        """
+        return self.process(image)
+
+
+class GrainTexture(ABC):
+    """Abstract base class for per-grain texture models
+
+    Textures add to the gray values of a rendered diagram through vectorized
+    per-grain parameter arrays (see GrainMap), so their cost does not depend
+    on the number of grains.
+    """
+
+    @abstractmethod
+    def apply(self, values: np.ndarray, grain_map: "GrainMap"):
+        """Add the texture to the float32 gray values of shape (H, W) in place"""
+        pass
@@ -2,21 +2,93 @@
 Classes related to Voronoi diagram computation
 """
 
+import math
 import cv2
 import numpy as np
 from typing import List
 
 
 class VoronoiCalculator:
-    """Class for computing Voronoi diagrams"""
-    
-    def __init__(self, width: int, height: int):
+    """Class for computing Voronoi diagrams
+
+    Attributes:
+        width (int): Width of the image
+        height (int): Height of the image
+        periodic (bool): Whether to compute the diagram on a torus (seamlessly tileable)
+        shift (int): Number of fractional bits of the facet coordinates (0: integer pixels)
+    """
+
+    def __init__(self, width: int, height: int, periodic: bool = False, shift: int = 0):
         self.width = width
         self.height = height
-    
+        self.periodic = periodic
+        self.shift = shift
+
     def calculate(self, points: np.ndarray) -> List[np.ndarray]:
+        if self.periodic:
+            return self.calculate_periodic(points)
         subdiv = cv2.Subdiv2D((0, 0, self.width, self.height))
         for y, x in points:
             subdiv.insert((x.astype(float), y.astype(float)))
         facets, _ = subdiv.getVoronoiFacetList([])
+        if self.shift > 0:
+            return self._fixed_point(facets)
         return [f.astype(int) for f in facets]
+
+    def calculate_periodic(self, points: np.ndarray) -> List[np.ndarray]:
+        """Compute the Voronoi diagram on a torus
+
+        Seeds near the borders are replicated across them, so the facet of each
+        seed is complete. Facets may extend beyond the image and are meant to be
+        drawn wrapped around (see ImageRenderer). The replicated band starts at a
+        few seed spacings and is widened until every facet vertex has its empty
+        circle inside the replicated region.
+        """
+        spacing = math.sqrt(self.width * self.height / max(len(points), 1))
+        margin = 3 * spacing
+        while True:
+            margin = min(margin, max(self.width, self.height))
+            facets = self._periodic_facets(points, margin)
+            if margin >= max(self.width, self.height) or self._is_complete(points, facets, margin):
+                break
+            margin *= 2
+        if self.shift > 0:
+            return self._fixed_point(facets)
+        # Floor (not truncate) so that wrapped copies stay exactly one period apart
+        return [np.floor(f).astype(int) for f in facets]
+
+    def _fixed_point(self, facets: List[np.ndarray]) -> List[np.ndarray]:
+        """Round facets to fixed-point coordinates with shift fractional bits (wrapped copies stay one period apart)"""
+        return [np.floor(f * (1 << self.shift) + 0.5).astype(int) for f in facets]
+
+    def _periodic_facets(self, points: np.ndarray, margin: float) -> List[np.ndarray]:
+        """Compute the facets of the seeds with copies within margin of the borders"""
+        w, h = self.width, self.height
+        subdiv = cv2.Subdiv2D((-w, -h, 3 * w, 3 * h))
+        ids = [subdiv.insert((float(x), float(y))) for y, x in points]
+
+        xy = points[:, ::-1].astype(float)
+        for oy in (-h, 0, h):
+            for ox in (-w, 0, w):
+                if oy == 0 and ox == 0:
+                    continue
+                copies = xy + (ox, oy)
+                inside = ((copies[:, 0] >= -margin) & (copies[:, 0] < w + margin) &
+                          (copies[:, 1] >= -margin) & (copies[:, 1] < h + margin))
+                if np.any(inside):
+                    subdiv.insert([tuple(p) for p in copies[inside]])
+
+        facets, _ = subdiv.getVoronoiFacetList(list(dict.fromkeys(ids)))
+        return facets
+
+    def _is_complete(self, points: np.ndarray, facets: List[np.ndarray], margin: float) -> bool:
+        """Check that the empty circle of every facet vertex lies within the replicated region"""
+        # Seeds in the order of their facets (duplicates share one facet)
+        _, first = np.unique(points, axis=0, return_index=True)
+        seeds = points[np.sort(first)][:, ::-1].astype(float)
+
+        lengths = [len(facet) for facet in facets]
+        vertices = np.concatenate(facets)
+        radius = np.hypot(*(vertices - np.repeat(seeds, lengths, axis=0)).T)
+        return bool(np.all(vertices - radius[:, np.newaxis] >= -margin) and
+                    np.all(vertices + radius[:, np.newaxis] <= np.array([self.width, self.height]) + margin))
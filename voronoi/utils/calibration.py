@@ -0,0 +1,152 @@
+"""
+Classes related to calibrating point generation parameters to target grain sizes
+"""
+
+import os
+import json
+import math
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from .point_generators import PointGeneratorFactory
+from .calculators import VoronoiCalculator
+from .statistics import GrainStatistics
+from .rng import seed_diagram
+
+# Statistics of the equivalent diameters that can be calibrated
+CALIBRATION_STATISTICS = ["mean_diameter", "median_diameter"]
+
+
+class GrainSizeCalibrator:
+    """Class for solving points_num or min_distance for target grain sizes
+
+    Each simulation generates seed points with the configured method and
+    measures the grains inside the measurement box from the facets (no
+    rendering), pooled over a few seeded trials. The grain size is close to
+    a power law of the parameter (diameter ~ points_num^-1/2 or
+    ~ min_distance), so a short log-spaced grid of simulations spanning the
+    targets is enough: targets are then solved by interpolating the grid in
+    log-log space. Simulations are cached in memory and optionally in a JSON
+    file, so repeated calibrations of the same geometry are immediate.
+
+    Attributes:
+        width (int): Width of the diagram
+        height (int): Height of the diagram
+        box (Tuple[int, int, int, int]): (left, top, right, bottom) measurement box (the center crop)
+        max_attempts (int): max_attempts of Poisson disk sampling
+        trials (int): Number of diagrams pooled per simulation
+        statistic (str): Calibrated statistic ('mean_diameter' or 'median_diameter')
+        seed (int): Seed of the simulated diagrams
+    """
+
+    def __init__(self, width: int, height: int, crop: Optional[Tuple[int, int]] = None,
+                 max_attempts: int = 100, trials: int = 3, statistic: str = "mean_diameter",
+                 seed: int = 0, cache_path: Optional[str] = None):
+        if statistic not in CALIBRATION_STATISTICS:
+            raise ValueError(f"Unknown statistic: {statistic}")
+        self.width = width
+        self.height = height
+        crop_width, crop_height = crop if crop is not None else (width, height)
+        left, top = (width - crop_width) // 2, (height - crop_height) // 2
+        self.box = (left, top, left + crop_width, top + crop_height)
+        self.max_attempts = max_attempts
+        self.trials = trials
+        self.statistic = statistic
+        self.seed = seed
+        self.cache_path = cache_path
+        self._calculator = VoronoiCalculator(width, height)
+        self._cache = {}
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self._cache = json.load(f)
+
+    @classmethod
+    def from_config(cls, voronoi_config: Dict[str, Any], **kwargs) -> "GrainSizeCalibrator":
+        """Create a calibrator for the size, center crop and max_attempts of a config"""
+        crop = None
+        for proc_config in voronoi_config.get("post_processors", []):
+            if proc_config["type"] == "crop":
+                crop = (proc_config["params"]["crop_width"], proc_config["params"]["crop_height"])
+        max_attempts = voronoi_config["point_generation"]["params"].get("max_attempts", 100)
+        return cls(voronoi_config["width"], voronoi_config["height"], crop, max_attempts, **kwargs)
+
+    def simulate(self, method: str, value: float) -> Dict[str, float]:
+        """Get the grain statistics for a points_num (random) or min_distance (poisson_disk) value
+
+        Returns:
+            Dict[str, float]: Summary of the pooled grain statistics (see GrainStatistics.summary)
+        """
+        key = f"{method}:{value}:{self.width}x{self.height}:{self.box}:{self.max_attempts}:{self.trials}:{self.seed}"
+        if key not in self._cache:
+            point_generator = PointGeneratorFactory().create_generator(method)
+            params = {"points_num": int(value)} if method == "random" else {"min_distance": value, "max_attempts": self.max_attempts}
+            statistics = GrainStatistics(np.empty(0))
+            state = np.random.get_state()
+            try:
+                for trial in range(self.trials):
+                    seed_diagram(self.seed, trial)
+                    points = point_generator.generate(self.width, self.height, **params)
+                    facets = self._calculator.calculate(points)
+                    statistics = statistics.merge(GrainStatistics.from_facets(facets, self.box))
+            finally:
+                np.random.set_state(state)
+            self._cache[key] = statistics.summary()
+        return self._cache[key]
+
+    def save_cache(self):
+        """Save the simulation cache to cache_path"""
+        if self.cache_path is not None:
+            with open(self.cache_path, "w") as f:
+                json.dump(self._cache, f, indent=2)
+
+    def initial_guess(self, method: str, target: float) -> float:
+        """Guess the parameter of a target diameter from the seed density (a grain per seed)"""
+        area = self.width * self.height
+        if method == "random":
+            return area / (math.pi / 4 * target ** 2)
+        # Dart throwing stops at roughly half of the hexagonal packing density
+        return target * math.sqrt(0.5 * math.pi / 4 / (math.sqrt(3) / 2))
+
+    def calibrate(self, method: str, targets: List[float], grid_size: int = 6) -> List[Tuple[float, float]]:
+        """Solve the parameters of target grain sizes
+
+        Args:
+            method (str): Point generation method ('random' solves points_num, 'poisson_disk' solves min_distance)
+            targets (List[float]): Target values of the statistic in pixels
+            grid_size (int): Number of simulations spanning the targets
+
+        Returns:
+            List[Tuple[float, float]]: Solved parameter and its predicted statistic for each target
+        """
+        if method not in ["random", "poisson_disk"]:
+            raise ValueError(f"Unknown point generation method: {method}")
+        guesses = [self.initial_guess(method, target) for target in targets]
+        # Widen the grid a little so that the targets fall inside it
+        low, high = min(guesses) / 1.3, max(guesses) * 1.3
+        grid = np.unique(np.round(np.geomspace(low, high, grid_size), 0 if method == "random" else 1))
+        if method == "random":
+            grid = grid[grid >= 2]
+
+        values, sizes = [], []
+        for value in grid:
+            size = self.simulate(method, float(value))[self.statistic]
+            if np.isfinite(size):
+                values.append(float(value))
+                sizes.append(size)
+        self.save_cache()
+        if len(values) < 2:
+            raise ValueError("Too few grains inside the crop to calibrate (is the crop smaller than the grains?)")
+
+        # Interpolate log(value) against log(size), extrapolating the outer power laws
+        order = np.argsort(sizes)
+        log_sizes = np.log(np.array(sizes)[order])
+        log_values = np.log(np.array(values)[order])
+        results = []
+        for target in targets:
+            log_target = math.log(target)
+            k = int(np.clip(np.searchsorted(log_sizes, log_target), 1, len(log_sizes) - 1))
+            slope = (log_values[k] - log_values[k - 1]) / (log_sizes[k] - log_sizes[k - 1])
+            log_value = log_values[k - 1] + slope * (log_target - log_sizes[k - 1])
+            value = round(math.exp(log_value)) if method == "random" else round(math.exp(log_value), 1)
+            predicted = math.exp(log_sizes[k - 1] + (math.log(value) - log_values[k - 1]) / slope)
+            results.append((value, predicted))
+        return results
@@ -0,0 +1,213 @@
+"""
+Classes related to anti-aliased (fractional coverage) boundary labels
+"""
+
+import math
+import numpy as np
+from typing import List, Tuple
+
+# Half of the diagonal of a pixel: a pixel can only overlap shapes within this distance of its center
+HALF_DIAGONAL = math.sqrt(0.5)
+
+# Number of segments walked, of pairs with pixels cut by strips and of pixels supersampled at once
+CHUNK_SEGMENTS = 1024
+CHUNK_PAIRS = 1 << 16
+CHUNK_PIXELS = 4096
+
+
+def polygon_segments(polygons: List[np.ndarray], shift: int = 0) -> np.ndarray:
+    """Get the distinct edges of closed polygons
+
+    Edges shared by two polygons (drawn in opposite directions) are kept once.
+
+    Args:
+        polygons (List[np.ndarray]): Polygons (fixed-point with shift fractional bits)
+        shift (int): Number of fractional bits of the polygons
+
+    Returns:
+        np.ndarray: (x0, y0, x1, y1) rows in pixels
+    """
+    if len(polygons) == 0:
+        return np.empty((0, 4))
+    lengths = np.array([len(polygon) for polygon in polygons])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    vertices = np.concatenate([np.asarray(polygon).reshape(-1, 2) for polygon in polygons]).astype(np.int64)
+    following = np.arange(1, len(vertices) + 1)
+    following[starts + lengths - 1] = starts
+    edges = np.hstack([vertices, vertices[following]])
+    swap = (edges[:, 0] > edges[:, 2]) | ((edges[:, 0] == edges[:, 2]) & (edges[:, 1] > edges[:, 3]))
+    edges[swap] = edges[swap][:, [2, 3, 0, 1]]
+    return np.unique(edges, axis=0) / (1 << shift)
+
+
+class CapsuleCoverage:
+    """Fraction of pixels covered by the union of capsules around line segments
+
+    A line of width w drawn along a segment covers the points within w / 2
+    of it (a capsule, as cv2 draws thick lines). The pixels each segment can
+    reach are enumerated column by column (or row by row for steep segments)
+    along it, so only pixels within a band around the segments are ever
+    visited. A pixel reached by a single segment, away from its ends, is cut
+    by a straight strip, and its coverage is computed exactly with the area
+    of a square below a line. The other pixels (near vertices, where
+    segments meet) are supersampled on a samples x samples grid. Cost thus
+    scales with the number of boundary pixels rather than with the canvas
+    area.
+
+    Attributes:
+        radius (float): Half of the line width in pixels
+        samples (int): Number of subsamples per pixel side for pixels near vertices
+    """
+
+    def __init__(self, radius: float, samples: int = 8):
+        self.radius = radius
+        self.samples = samples
+
+    def compute(self, segments: np.ndarray, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute the coverage of the pixels of a canvas reached by segments
+
+        Args:
+            segments (np.ndarray): (x0, y0, x1, y1) rows in pixels (pixel centers at integer coordinates)
+            height (int): Height of the canvas
+            width (int): Width of the canvas
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Flat indices of the reached pixels and their coverage in [0, 1]
+        """
+        if len(segments) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        segments = segments.astype(np.float32)  # Exact enough (below 1e-3 pixels) for canvases up to 2^12 pixels
+        pairs = [self._corridor_pairs(segments, first, min(first + CHUNK_SEGMENTS, len(segments)), height, width)
+                 for first in range(0, len(segments), CHUNK_SEGMENTS)]
+        pixels, near = np.concatenate([pair[0] for pair in pairs]), np.concatenate([pair[1] for pair in pairs])
+        single = self._single_pairs(pixels, height * width)
+
+        # Strip coverage of the pixels reached by a single segment away from its ends
+        indices, coverage, rest = [], [], []
+        for first in range(0, len(pixels), CHUNK_PAIRS):
+            chunk = slice(first, first + CHUNK_PAIRS)
+            straight, strip_coverage = self._strip_coverage(pixels[chunk], segments[near[chunk]], single[chunk], width)
+            indices.append(pixels[chunk][straight])
+            coverage.append(strip_coverage)
+            rest.append(np.flatnonzero(~straight) + first)
+
+        # Supersample the other pixels (all of their segments), in chunks of whole pixels
+        rest = np.concatenate(rest)
+        rest = rest[np.argsort(pixels[rest], kind="stable")]
+        rest_starts = np.flatnonzero(np.r_[True, pixels[rest][1:] != pixels[rest][:-1]]) if len(rest) else rest
+        for first in range(0, len(rest_starts), CHUNK_PIXELS):
+            begin = rest_starts[first]
+            end = rest_starts[first + CHUNK_PIXELS] if first + CHUNK_PIXELS < len(rest_starts) else len(rest)
+            chunk_coverage, chunk_pixels = self._supersample(pixels[rest[begin:end]], width, segments[near[rest[begin:end]]])
+            indices.append(chunk_pixels)
+            coverage.append(chunk_coverage)
+        return np.concatenate(indices), np.clip(np.concatenate(coverage), 0, 1)
+
+    @staticmethod
+    def _single_pairs(pixels: np.ndarray, size: int) -> np.ndarray:
+        """Get whether each pair is the only one of its pixel (without sorting the pairs)"""
+        pair_ids = np.arange(len(pixels), dtype=np.int32)
+        owner = np.empty(size, dtype=np.int32)  # Only the reached pixels are ever touched
+        owner[pixels] = pair_ids
+        shared = np.zeros(size, dtype=bool)
+        shared[pixels[owner[pixels] != pair_ids]] = True
+        return ~shared[pixels]
+
+    def _strip_coverage(self, pixels: np.ndarray, segments: np.ndarray, single: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get which pairs are cut by a straight strip and the coverage of their pixels"""
+        x0, y0, x1, y1 = segments.T
+        dx, dy = x1 - x0, y1 - y0
+        length = np.hypot(dx, dy)
+        safe_length = np.maximum(length, np.float32(1e-12))
+        px, py = (pixels % width).astype(np.float32) - x0, (pixels // width).astype(np.float32) - y0
+        along = (px * dx + py * dy) / safe_length       # Position of the pixel center along the segment
+        across = (py * dx - px * dy) / safe_length      # Signed distance of the pixel center from the line
+
+        # The pixel square projects inside the segment
+        half_extent = (np.abs(dx) + np.abs(dy)) / (2 * safe_length)
+        straight = single & (along >= half_extent) & (along <= length - half_extent) & (length > 0)
+        nx, ny = np.abs(dy[straight]) / length[straight], np.abs(dx[straight]) / length[straight]
+        u = across[straight]
+        return straight, self._square_cdf(self.radius - u, nx, ny) - self._square_cdf(-self.radius - u, nx, ny)
+
+    def _corridor_pairs(self, segments: np.ndarray, begin: int, end: int, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the (flat pixel index, segment) pairs within reach of the segments from begin to end
+
+        Coordinates are swapped for steep segments, so that each segment is
+        walked along its major axis. On each step, the pixels within reach lie
+        within reach * length / |major extent| of the line across it.
+        """
+        reach = self.radius + HALF_DIAGONAL
+        segments = segments[begin:end]
+        steep = np.abs(segments[:, 3] - segments[:, 1]) > np.abs(segments[:, 2] - segments[:, 0])
+        a0, a1 = np.where(steep, segments[:, 1], segments[:, 0]), np.where(steep, segments[:, 3], segments[:, 2])
+        b0, b1 = np.where(steep, segments[:, 0], segments[:, 1]), np.where(steep, segments[:, 2], segments[:, 3])
+        da, db = a1 - a0, b1 - b0
+        flat = da == 0  # Degenerate (point) segments
+        slope = np.where(flat, 0, db / np.where(flat, 1, da))
+        half = np.where(flat, reach, reach * np.hypot(da, db) / np.where(flat, 1, np.abs(da)))
+        a_size = np.where(steep, height, width)
+        b_size = np.where(steep, width, height)
+
+        # Steps along the major axis
+        first = np.maximum(np.ceil(np.minimum(a0, a1) - reach), 0).astype(np.int64)
+        last = np.minimum(np.floor(np.maximum(a0, a1) + reach), a_size - 1).astype(np.int64)
+        steps = np.maximum(last - first + 1, 0)
+        step_segments = np.repeat(np.arange(len(segments)), steps)
+        a = first[step_segments] + np.arange(len(step_segments)) - np.repeat(np.cumsum(steps) - steps, steps)
+
+        # Pixels across the line on each step
+        center = b0[step_segments] + (a - a0[step_segments]) * slope[step_segments]
+        low = np.maximum(np.ceil(center - half[step_segments]), 0).astype(np.int64)
+        high = np.minimum(np.floor(center + half[step_segments]), b_size[step_segments] - 1).astype(np.int64)
+        spans = np.maximum(high - low + 1, 0)
+        near = np.repeat(step_segments, spans)
+        a = np.repeat(a, spans)
+        b = np.repeat(low, spans) + np.arange(len(near)) - np.repeat(np.cumsum(spans) - spans, spans)
+        xs, ys = np.where(steep[near], b, a), np.where(steep[near], a, b)
+
+        within = self._distance(segments[near], xs.astype(np.float32), ys.astype(np.float32)) <= reach
+        return (ys * width + xs)[within], near[within] + begin
+
+    @staticmethod
+    def _distance(segments: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Get the distances from points to segments (row by row)"""
+        x0, y0, x1, y1 = segments.T
+        dx, dy = x1 - x0, y1 - y0
+        t = np.clip(((x - x0) * dx + (y - y0) * dy) / np.maximum(dx * dx + dy * dy, 1e-12), 0, 1)
+        return np.hypot(x - x0 - t * dx, y - y0 - t * dy)
+
+    @staticmethod
+    def _square_cdf(s: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Area of the pixel square (centered at the origin) where n . q <= s, for a unit normal with |n_x| = a and |n_y| = b
+
+        n . q is the sum of two uniform variables of widths a and b, so the
+        area is the integral of a trapezoid.
+        """
+        p, q = np.minimum(a, b), np.maximum(a, b)
+        low, high = (q - p) / 2, (q + p) / 2
+        wedge = 2 * np.maximum(p, 1e-12) * q
+        return np.where(s <= -high, 0.0,
+               np.where(s <= -low, (s + high) ** 2 / wedge,
+               np.where(s < low, p / (2 * q) + (s + low) / q,
+               np.where(s < high, 1 - (high - s) ** 2 / wedge, 1.0))))
+
+    def _supersample(self, pixels: np.ndarray, width: int, segments: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the coverage of pixels on a subsample grid from their (pixel-sorted) pairs with segments"""
+        offsets = (np.arange(self.samples) + 0.5) / self.samples - 0.5
+        ox, oy = [o.ravel().astype(np.float32) for o in np.meshgrid(offsets, offsets)]
+        starts = np.flatnonzero(np.r_[True, pixels[1:] != pixels[:-1]])
+
+        # Subsample points relative to the first vertex of each segment
+        x0, y0, x1, y1 = segments.T
+        dx, dy = (x1 - x0)[:, np.newaxis], (y1 - y0)[:, np.newaxis]
+        px = ((pixels % width).astype(np.float32) - x0)[:, np.newaxis] + ox
+        py = ((pixels // width).astype(np.float32) - y0)[:, np.newaxis] + oy
+        t = np.clip((px * dx + py * dy) / np.maximum(dx * dx + dy * dy, np.float32(1e-12)), 0, 1)
+        inside = (px - t * dx) ** 2 + (py - t * dy) ** 2 <= np.float32(self.radius ** 2)
+
+        # Union over the segments of each pixel on bit-packed subsamples (one row of bytes per pair)
+        packed = np.packbits(inside, axis=1)
+        union = np.bitwise_or.reduceat(packed, starts, axis=0)
+        covered = np.unpackbits(union, axis=1, count=inside.shape[1]).sum(axis=1)
+        return (covered / np.float32(inside.shape[1])).astype(np.float32), pixels[starts]
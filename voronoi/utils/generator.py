@@ -3,12 +3,20 @@ Main class for generating Voronoi diagrams
 """
 
 import numpy as np
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from .base import GrayValueGenerator
 from .point_generators import PointGeneratorFactory
 from .gray_generators import GrayValueFactory
 from .calculators import VoronoiCalculator
-from .renderers import ImageRenderer
+from .renderers import ImageRenderer, PREVIEW_SHIFT, SUBPIXEL_SHIFT
 from .processors import ImagePipeline
+from .incremental import IncrementalVoronoi
+from .textures import TextureFactory
+from .parallel import BandExecutor
+from .weights import UNetWeightMap
+from .laguerre import LaguerreTessellator
+from .vectors import VectorDiagram
+from .adjacency import GrainGraph, GrainGraphBuilder
 
 
 class VoronoiGenerator:
@@ -17,12 +25,21 @@ class VoronoiGenerator:
     Attributes:
         width (int): Width of the image
         height (int): Height of the image
+        periodic (bool): Whether the diagram is periodic (seamlessly tileable)
         point_generator (PointGenerator): Seed point generator
-        label_info (Dict): Label rendering settings
+        label_info (Dict): Label rendering settings (color, thickness)
+        label_mode (str): 'binary' (aliased outlines) or 'coverage' (anti-aliased fractional coverage)
+        label_samples (int): Number of subsamples per pixel side of coverage labels near vertices
+        shift (int): Number of fractional bits of the facets (sub-pixel facets for coverage labels)
         gray_generator (GrayValueGenerator): Grayscale value generator
+        textures (List[GrainTexture]): Per-grain textures (image_info.texture)
         voronoi_calculator (VoronoiCalculator): Voronoi diagram calculator
+        tessellator (Optional[LaguerreTessellator]): Power diagram of seeds with radii, used instead of the Voronoi diagram (config "laguerre")
         image_renderer (ImageRenderer): Image renderer
         image_pipeline (ImagePipeline): Image post-processing pipeline
+        executor (Optional[BandExecutor]): Thread pool processing horizontal bands of each diagram (config "parallel")
+        weight_map (Optional[UNetWeightMap]): Loss weight map computed from the labels (config "output.weight_map")
+        graph_builder (Optional[GrainGraphBuilder]): Grain adjacency graphs of the tiles (config "output.grain_graph")
     """
     
     def __init__(self, config: Dict[str, Any]):
@@ -37,7 +54,11 @@ class VoronoiGenerator:
         )
         
         # Label rendering configuration
-        self.label_info = config.get("label_info", {})
+        label_info = dict(config.get("label_info", {}))
+        self.label_mode = label_info.pop("mode", "binary")
+        self.label_samples = label_info.pop("samples", 8)
+        self.label_info = label_info
+        self.shift = SUBPIXEL_SHIFT if self.label_mode == "coverage" else 0
         
         # Initialize grayscale value generator
         image_info = config["image_info"]
@@ -45,11 +66,40 @@ class VoronoiGenerator:
             image_info["method"],
             **image_info.get("params", {})
         )
+        self.textures = TextureFactory().create_textures(image_info.get("texture", []))
 
         # Initialize other components
-        self.voronoi_calculator = VoronoiCalculator(self.width, self.height)
-        self.image_renderer = ImageRenderer(self.width, self.height)
-        self.image_pipeline = ImagePipeline(config)
+        self.periodic = config.get("periodic", False)
+        self.executor = None
+        if "parallel" in config:
+            self.executor = BandExecutor(config["parallel"].get("threads"), config["parallel"].get("band_rows", 256))
+        self.voronoi_calculator = VoronoiCalculator(self.width, self.height, self.periodic, self.shift)
+        self.tessellator = None
+        if "laguerre" in config:
+            laguerre = config["laguerre"]
+            self.tessellator = LaguerreTessellator(
+                self.width, self.height, laguerre.get("method", "lognormal"), laguerre.get("params"), laguerre.get("block", (64, 64))
+            )
+        self.image_renderer = ImageRenderer(self.width, self.height, self.periodic, self.executor)
+        self.image_pipeline = ImagePipeline(config, self.executor)
+        self.weight_map = None
+        weight_config = config.get("output", {}).get("weight_map")
+        if weight_config is not None:
+            self.weight_map = UNetWeightMap(periodic=self.periodic, **weight_config)
+        self.graph_builder = None
+        if config.get("output", {}).get("grain_graph", False):
+            self.graph_builder = GrainGraphBuilder(self.width, self.height, self.periodic, self.shift)
+    
+    def close(self):
+        """Stop the threads of the band executor (config "parallel")"""
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self) -> "VoronoiGenerator":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
     
     def generate(self, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
         """Generate a Voronoi diagram
@@ -64,15 +114,179 @@ class VoronoiGenerator:
         """
         # Generate seed points
         points = self.point_generator.generate(self.width, self.height, **kwargs)
+        if self.tessellator is not None:
+            voronoi_image, voronoi_label = self._render_laguerre(points, self.image_renderer, 1.0, self.label_info)
+            return self.image_pipeline.process(voronoi_image, voronoi_label)
         
-        # Compute Voronoi diagram
+        # Compute Voronoi diagram, then render and post-process it
+        return self.rasterize(self._vectorize(points))
+
+    def generate_vector(self, **kwargs) -> VectorDiagram:
+        """Generate a Voronoi diagram as polygons, without rendering it
+
+        The random draws are the same as in generate, so the global random
+        state afterwards is the one generate would leave, and rasterizing
+        the diagram gives the image and label generate would return.
+
+        Args:
+            **kwargs: Dynamic parameters for seed point generation (see generate)
+
+        Returns:
+            VectorDiagram: Facets, gray values and random state of the diagram
+        """
+        if self.tessellator is not None:
+            raise ValueError("Vector output is not supported for Laguerre diagrams")
+        points = self.point_generator.generate(self.width, self.height, **kwargs)
+        return self._vectorize(points)
+
+    def _vectorize(self, points: np.ndarray) -> VectorDiagram:
+        """Compute the facets of seed points and draw their gray values (in the order the renderers draw them)"""
         facets = self.voronoi_calculator.calculate(points)
-        
-        # Render image and label
-        voronoi_label = self.image_renderer.render_voronoi_label(facets, **self.label_info)
-        voronoi_image = self.image_renderer.render_voronoi_image(facets, self.gray_generator)
+        grays = np.array([self.gray_generator.generate() for _ in facets], dtype=np.uint8)
+        return VectorDiagram(self.width, self.height, self.shift, facets, grays, np.random.get_state())
+
+    def rasterize(self, diagram: VectorDiagram, scale: float = 1.0,
+                  thickness: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Render and post-process a vector diagram
+
+        The global random state is set to the one stored with the diagram
+        before textures and post-processors draw from it, so at full scale
+        the image and label are exactly those of generate. At other scales
+        the diagram is rendered as in preview.
+
+        Args:
+            diagram (VectorDiagram): Diagram from generate_vector (or VectorDiagram.load)
+            scale (float): Scale of the rendering (e.g. 0.25 for 1/4 resolution)
+            thickness (Optional[float]): Label line thickness in full-resolution pixels (default: label_info.thickness)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label)
+        """
+        if (diagram.width, diagram.height, diagram.shift) != (self.width, self.height, self.shift):
+            raise ValueError(
+                f"The diagram ({diagram.width}x{diagram.height}, shift {diagram.shift}) does not match the generator "
+                f"({self.width}x{self.height}, shift {self.shift})"
+            )
+        label_info = dict(self.label_info)
+        if thickness is not None:
+            label_info["thickness"] = thickness
+        if scale != 1.0:
+            label_info["thickness"] = label_info.get("thickness", 2) * scale
+        if self.label_mode != "coverage" and "thickness" in label_info:
+            label_info["thickness"] = max(1, round(label_info["thickness"]))  # Aliased outlines have whole-pixel widths
+        diagram.restore_rng()
+        gray_generator = diagram.gray_generator()
+        if scale == 1.0:
+            return self._render(diagram.facets, self.image_renderer, gray_generator, self.shift, label_info, scale)
+        renderer = ImageRenderer(max(1, round(self.width * scale)), max(1, round(self.height * scale)), self.periodic)
+        scaled_facets = renderer.scale_facets(diagram.facets, scale / (1 << self.shift))
+        pad = self.image_renderer.canvas_pad(diagram.facets, self.shift)
+        full_pixels = (self.width + 2 * pad) * (self.height + 2 * pad) # Per-pixel texture draws of the full-resolution canvas
+        return self._render(scaled_facets, renderer, gray_generator, PREVIEW_SHIFT, label_info, scale, full_pixels)
+
+    def _render(self, facets: List[np.ndarray], renderer: ImageRenderer, gray_generator: GrayValueGenerator,
+                shift: int, label_info: Dict[str, Any], scale: float, full_pixels: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Render the label and image of facets and post-process them (at full or reduced scale)"""
+        if self.label_mode == "coverage":
+            voronoi_label = renderer.render_coverage_label(facets, shift=shift, samples=self.label_samples, **label_info)
+        else:
+            voronoi_label = renderer.render_voronoi_label(facets, shift=shift, **label_info)
+        if self.textures:
+            voronoi_image = renderer.render_textured_image(facets, gray_generator, self.textures, shift=shift, scale=scale, full_pixels=full_pixels)
+        else:
+            voronoi_image = renderer.render_voronoi_image(facets, gray_generator, shift=shift)
         
         # Post-processing
-        voronoi_image, voronoi_label = self.image_pipeline.process(voronoi_image, voronoi_label)
-        
+        if scale == 1.0:
+            return self.image_pipeline.process(voronoi_image, voronoi_label)
+        return self.image_pipeline.process_preview(voronoi_image, voronoi_label, scale, (self.width, self.height))
+
+    def generate_weights(self, label: np.ndarray) -> Optional[np.ndarray]:
+        """Compute the loss weight map of a generated label (before splitting)
+
+        Args:
+            label (np.ndarray): Full label returned by generate
+
+        Returns:
+            Optional[np.ndarray]: float16 weight map of shape (H, W, 1) (None if output.weight_map is not configured)
+        """
+        if self.weight_map is None:
+            return None
+        return self.weight_map.compute(label)
+
+    def grain_graphs(self, diagram: VectorDiagram, tile_boxes: List[Tuple[int, int, int, int]]) -> List[GrainGraph]:
+        """Compute the grain adjacency graphs of the tiles of a diagram
+
+        Args:
+            diagram (VectorDiagram): Diagram from generate_vector
+            tile_boxes (List[Tuple[int, int, int, int]]): (top, bottom, left, right) boxes of the tiles in the processed label (see VoronoiSplitter.tile_boxes)
+
+        Returns:
+            List[GrainGraph]: Graph of each tile, in tile coordinates (crops are accounted for)
+        """
+        builder = self.graph_builder or GrainGraphBuilder(self.width, self.height, self.periodic, self.shift)
+        left, top = self.image_pipeline.label_offset(self.width, self.height)
+        boxes = [(left + l, top + t, left + r, top + b) for t, b, l, r in tile_boxes]
+        return builder.build(diagram.facets, boxes)
+
+    def preview(self, scale: float = 0.25, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
+        """Generate a reduced-scale preview of a Voronoi diagram
+
+        Seed points, facets, gray values and mask geometry are drawn exactly as
+        in generate (at full resolution) and rendered scaled, so restoring the
+        random state and calling generate produces the full-resolution version
+        of the previewed diagram. Noise processors and textures draw their
+        noise at the preview resolution and skip the rest of the draws of the
+        full-resolution noise, so the random state advances as in generate.
+
+        Args:
+            scale (float): Scale of the preview (e.g. 0.25 for 1/4 resolution)
+            **kwargs: Dynamic parameters for seed point generation (see generate)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label) at reduced scale
+        """
+        points = self.point_generator.generate(self.width, self.height, **kwargs)
+        renderer = ImageRenderer(max(1, round(self.width * scale)), max(1, round(self.height * scale)), self.periodic)
+        if self.tessellator is not None:
+            label_info = dict(self.label_info, thickness=max(1, round(self.label_info.get("thickness", 2) * scale)))
+            voronoi_image, voronoi_label = self._render_laguerre(points, renderer, scale, label_info)
+            return self.image_pipeline.process_preview(voronoi_image, voronoi_label, scale, (self.width, self.height))
+        return self.rasterize(self._vectorize(points), scale)
+
+    def _render_laguerre(self, points: np.ndarray, renderer: ImageRenderer, scale: float,
+                         label_info: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """Render the image and label of the power diagram of seed points (radii and gray values are drawn per seed)"""
+        radii = self.tessellator.sample_radii(len(points))
+        instances = self.tessellator.tessellate(points, radii, scale)
+        grays = np.array([self.gray_generator.generate() for _ in range(len(points))], dtype=np.uint8)
+        voronoi_label = renderer.render_boundary_label(instances, **label_info)
+        voronoi_image = grays[instances][:, :, np.newaxis]
         return voronoi_image, voronoi_label
+
+    def incremental(self, tile_size: int = 64, **kwargs) -> IncrementalVoronoi:
+        """Start an editable diagram for sequences of related frames (e.g. grain growth)
+
+        The seed points and gray values are drawn as in generate, so the first
+        frame equals the diagram generate would produce before post-processing
+        (unless two seeds coincide, as every seed then draws a gray value).
+        Post-processing can be applied to each frame with image_pipeline.
+
+        Args:
+            tile_size (int): Size of the tiles dirty regions are tracked in
+            **kwargs: Dynamic parameters for seed point generation (see generate)
+
+        Returns:
+            IncrementalVoronoi: The editable diagram, rendered
+        """
+        if self.periodic:
+            raise ValueError("Incremental editing is not supported for periodic diagrams")
+        if self.tessellator is not None:
+            raise ValueError("Incremental editing is not supported for Laguerre diagrams")
+        if self.label_mode == "coverage":
+            raise ValueError("Incremental editing is not supported with coverage labels")
+        points = self.point_generator.generate(self.width, self.height, **kwargs)
+        diagram = IncrementalVoronoi(self.width, self.height, self.gray_generator, self.label_info, tile_size)
+        diagram.add_seeds(points)
+        diagram.update()
+        return diagram
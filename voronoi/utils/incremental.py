@@ -0,0 +1,186 @@
+"""
+Classes related to incremental editing of Voronoi diagrams
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+from .base import GrayValueGenerator
+from .renderers import ImageRenderer
+from .vectors import ReplayGrayGenerator
+
+
+class IncrementalVoronoi:
+    """Voronoi diagram whose seeds can be added, removed and moved between frames
+
+    Each seed keeps an id and a grayscale value for its lifetime. On update,
+    the facets are recomputed (as VoronoiCalculator does, in seed order) and
+    compared with the previous ones; only the tiles covered by changed cells
+    are re-rendered. Facets overlapping a dirty region are redrawn in order on
+    full-size scratch buffers (cv2 rasterizes clipped edges differently, so
+    drawing on a smaller canvas would not be exact), which makes every frame
+    identical to a from-scratch render (see render_full).
+
+    Attributes:
+        width (int): Width of the image
+        height (int): Height of the image
+        gray_generator (GrayValueGenerator): Grayscale value generator for new seeds
+        color (Tuple[int, int, int]): Color of the boundary lines
+        thickness (int): Thickness of the boundary lines
+        tile_size (int): Size of the tiles dirty regions are tracked in
+        image (np.ndarray): Current image
+        label (np.ndarray): Current label
+    """
+
+    def __init__(self, width: int, height: int, gray_generator: GrayValueGenerator,
+                 label_info: Dict = None, tile_size: int = 64):
+        label_info = label_info or {}
+        self.width = width
+        self.height = height
+        self.gray_generator = gray_generator
+        self.color = tuple(label_info.get("color", (255, 255, 255)))
+        self.thickness = label_info.get("thickness", 2)
+        self.tile_size = tile_size
+        self.image_renderer = ImageRenderer(width, height)
+
+        self._seeds = {}  # Seed id -> (y, x), in seed order
+        self._grays = {}  # Seed id -> grayscale value
+        self._next_id = 0
+        self._facets = None  # Seed id -> facet (as bytes) of the last update (None before the first one)
+        self._boxes = {}  # Seed id -> facet bounding box (x_min, y_min, x_max, y_max) of the last update
+
+        self.image = self.image_renderer.create_initial_image()
+        self.label = self.image_renderer.create_initial_image()
+        self._image_buffer = np.zeros_like(self.image)
+        self._label_buffer = np.zeros_like(self.label)
+
+    @property
+    def seed_ids(self) -> List[int]:
+        """Ids of the current seeds in seed order"""
+        return list(self._seeds)
+
+    @property
+    def points(self) -> np.ndarray:
+        """Current seed points of shape (N, 2) in (y, x) order"""
+        return np.array(list(self._seeds.values()), dtype=int).reshape(-1, 2)
+
+    def add_seeds(self, points: np.ndarray) -> List[int]:
+        """Add seeds (after the existing ones) and draw their grayscale values
+
+        Returns:
+            List[int]: Ids of the new seeds
+        """
+        ids = []
+        for y, x in points:
+            self._seeds[self._next_id] = (int(y), int(x))
+            self._grays[self._next_id] = self.gray_generator.generate()
+            ids.append(self._next_id)
+            self._next_id += 1
+        return ids
+
+    def remove_seeds(self, ids: Sequence[int]):
+        """Remove seeds"""
+        for seed_id in ids:
+            del self._seeds[seed_id]
+            del self._grays[seed_id]
+
+    def move_seeds(self, ids: Sequence[int], points: np.ndarray):
+        """Move seeds (they keep their place in the seed order)"""
+        for seed_id, (y, x) in zip(ids, points):
+            if seed_id not in self._seeds:
+                raise KeyError(f"Unknown seed id: {seed_id}")
+            self._seeds[seed_id] = (int(y), int(x))
+
+    def _tessellate(self) -> Tuple[List[np.ndarray], List[int]]:
+        """Compute the facets of the current seeds and the id of the seed owning each facet"""
+        seed_ids = self.seed_ids
+        if not seed_ids:
+            return [], []
+        subdiv = cv2.Subdiv2D((0, 0, self.width, self.height))
+        vertices = [subdiv.insert((float(x), float(y))) for y, x in self._seeds.values()]
+
+        # Duplicate seeds share the facet of the first one
+        owners = {}
+        for seed_id, vertex in zip(seed_ids, vertices):
+            owners.setdefault(vertex, seed_id)
+        facets, _ = subdiv.getVoronoiFacetList(list(owners))
+        return [f.astype(int) for f in facets], list(owners.values())
+
+    def update(self) -> List[Tuple[int, int, int, int]]:
+        """Apply the edits since the last update to the image and label
+
+        Returns:
+            List[Tuple[int, int, int, int]]: Re-rendered regions as (left, top, right, bottom)
+        """
+        facets, owners = self._tessellate()
+        margin = self.thickness + 2
+        mins, maxs = self._bounding_boxes(facets)
+        keys = {seed_id: facet.tobytes() for seed_id, facet in zip(owners, facets)}
+        boxes = {seed_id: (*low, *high) for seed_id, low, high in zip(owners, mins.tolist(), maxs.tolist())}
+
+        if self._facets is None:
+            regions = [(0, 0, self.width, self.height)]
+        else:
+            # Cells whose facet appeared, disappeared or changed shape (old and new extents)
+            dirty = [self._boxes[seed_id] for seed_id, key in self._facets.items() if keys.get(seed_id) != key]
+            dirty += [boxes[seed_id] for seed_id, key in keys.items() if self._facets.get(seed_id) != key]
+            regions = self._dirty_regions(dirty, margin)
+
+        grays = [self._grays[seed_id] for seed_id in owners]
+        for left, top, right, bottom in regions:
+            overlapping = np.flatnonzero(
+                (maxs[:, 0] + margin >= left) & (mins[:, 0] - margin < right) &
+                (maxs[:, 1] + margin >= top) & (mins[:, 1] - margin < bottom)
+            )
+            self._image_buffer[top:bottom, left:right] = 0
+            self._label_buffer[top:bottom, left:right] = 0
+            for k in overlapping:
+                cv2.fillConvexPoly(self._image_buffer, facets[k], (grays[k]))
+            cv2.polylines(self._label_buffer, [facets[k] for k in overlapping], isClosed=True,
+                          color=self.color, thickness=self.thickness)
+            self.image[top:bottom, left:right] = self._image_buffer[top:bottom, left:right]
+            self.label[top:bottom, left:right] = self._label_buffer[top:bottom, left:right]
+
+        self._facets = keys
+        self._boxes = boxes
+        return regions
+
+    def _bounding_boxes(self, facets: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the (x, y) minimum and maximum corners of all facets"""
+        if not facets:
+            return np.empty((0, 2), dtype=int), np.empty((0, 2), dtype=int)
+        starts = np.cumsum([0] + [len(facet) for facet in facets[:-1]])
+        vertices = np.concatenate(facets)
+        return np.minimum.reduceat(vertices, starts), np.maximum.reduceat(vertices, starts)
+
+    def _dirty_regions(self, boxes: List[Tuple[int, int, int, int]], margin: int) -> List[Tuple[int, int, int, int]]:
+        """Merge bounding boxes into regions made of runs of dirty tiles"""
+        tile = self.tile_size
+        rows, columns = -(-self.height // tile), -(-self.width // tile)
+        dirty = np.zeros((rows, columns), dtype=bool)
+        for x_min, y_min, x_max, y_max in boxes:
+            left, top = max(x_min - margin, 0), max(y_min - margin, 0)
+            right, bottom = min(x_max + margin, self.width - 1), min(y_max + margin, self.height - 1)
+            if left <= right and top <= bottom:
+                dirty[top // tile:bottom // tile + 1, left // tile:right // tile + 1] = True
+
+        regions = []
+        for row in range(rows):
+            # Runs of consecutive dirty tiles in this row
+            edges = np.flatnonzero(np.diff(np.concatenate([[0], dirty[row].astype(np.int8), [0]])))
+            for start, stop in zip(edges[::2], edges[1::2]):
+                regions.append((start * tile, row * tile,
+                                min(stop * tile, self.width), min((row + 1) * tile, self.height)))
+        return regions
+
+    def render_full(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Render the current seeds from scratch (as VoronoiGenerator does, with the seeds' grayscale values)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label)
+        """
+        facets, owners = self._tessellate()
+        voronoi_label = self.image_renderer.render_voronoi_label(facets, self.color, self.thickness)
+        gray_generator = ReplayGrayGenerator([self._grays[seed_id] for seed_id in owners])
+        voronoi_image = self.image_renderer.render_voronoi_image(facets, gray_generator)
+        return voronoi_image, voronoi_label
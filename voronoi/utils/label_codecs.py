@@ -0,0 +1,182 @@
+"""
+Classes related to compact storage of binary boundary labels
+"""
+
+import io
+import os
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+LABEL_FORMATS = ["png", "packed", "rle"]
+
+# Unpacked bits of every byte value: (256, 8)
+_UNPACK_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1)
+
+
+class PackedLabel:
+    """Binary label bit-packed along rows (8 pixels per byte)
+
+    Attributes:
+        bits (np.ndarray): Packed rows of shape (H, ceil(W / 8))
+        width (int): Width of the label in pixels
+        value (int): Value of the boundary pixels (the label color)
+    """
+
+    def __init__(self, bits: np.ndarray, width: int, value: int = 255):
+        self.bits = bits
+        self.width = width
+        self.value = value
+
+    @classmethod
+    def from_label(cls, label: np.ndarray) -> "PackedLabel":
+        """Pack a binary label of shape (H, W, 1) or (H, W)
+
+        Raises:
+            ValueError: If the label has more than one non-zero value
+        """
+        label = label.reshape(label.shape[:2])
+        value = int(label.max()) if label.size else 255
+        if value == 0:
+            value = 255
+        elif np.any((label != 0) & (label != value)):
+            raise ValueError("Only binary labels (0 and one label value) can be packed")
+        return cls(np.packbits(label != 0, axis=1), label.shape[1], value)
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        """Shape of the unpacked label"""
+        return self.bits.shape[0], self.width, 1
+
+    def unpack(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Unpack the label, optionally into a caller-provided uint8 buffer of shape (H, W, 1) or (H, W)
+
+        Rows are expanded through a lookup table, so no intermediate bit array
+        is created; when the width is a multiple of 8 and out is contiguous,
+        the table is gathered straight into out.
+        """
+        table = _UNPACK_TABLE * np.uint8(self.value)
+        height, width = self.bits.shape[0], self.width
+        if out is None:
+            out = np.empty((height, width, 1), dtype=np.uint8)
+        plane = _plane(out, (height, width))
+        if width % 8 == 0 and out.flags.c_contiguous:
+            np.take(table, self.bits, axis=0, out=out.reshape(height, width // 8, 8))
+        else:
+            plane[:] = np.take(table, self.bits, axis=0).reshape(height, -1)[:, :width]
+        return out
+
+    def crop(self, top: int, bottom: int, left: int, right: int) -> "PackedLabel":
+        """Crop the label, slicing the packed rows when the columns are byte-aligned"""
+        if left % 8 == 0 and (right % 8 == 0 or right == self.width):
+            return PackedLabel(self.bits[top:bottom, left // 8:-(-right // 8)], right - left, self.value)
+        rows = PackedLabel(self.bits[top:bottom], self.width, self.value).unpack()
+        return PackedLabel.from_label(rows[:, left:right])
+
+
+def rle_encode(label: np.ndarray) -> np.ndarray:
+    """Run-length encode a binary label in row-major order
+
+    Returns:
+        np.ndarray: Lengths of alternating runs, starting with a (possibly empty) background run
+    """
+    flat = label.reshape(-1) != 0
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate([[0], changes, [flat.size]])
+    runs = np.diff(bounds)
+    if flat.size and flat[0]:
+        runs = np.concatenate([[0], runs])
+    return runs.astype(np.uint32)
+
+
+def rle_decode(runs: np.ndarray, shape: Tuple[int, int], value: int = 255,
+               out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Decode run lengths (see rle_encode), optionally into a caller-provided uint8 buffer of shape (H, W, 1) or (H, W)"""
+    if out is None:
+        out = np.empty((*shape, 1), dtype=np.uint8)
+    if int(runs.sum()) != shape[0] * shape[1]:
+        raise ValueError("Run lengths do not match the label size")
+    values = np.zeros(len(runs), dtype=np.uint8)
+    values[1::2] = value
+    _plane(out, shape)[:] = np.repeat(values, runs).reshape(shape)
+    return out
+
+
+def _plane(out: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """Get the (H, W) view of a caller-provided uint8 buffer of shape (H, W, 1) or (H, W)"""
+    if out.shape[:2] != tuple(shape) or out.dtype != np.uint8:
+        raise ValueError(f"Buffer must be uint8 of size {shape[1]}x{shape[0]}")
+    return out[:, :, 0] if out.ndim == 3 else out
+
+
+def encode_label(label, label_format: str) -> Tuple[str, bytes]:
+    """Encode a label (array or PackedLabel) in the given format
+
+    Returns:
+        Tuple[str, bytes]: File extension (without dot) and encoded bytes
+    """
+    if label_format == "png":
+        if isinstance(label, PackedLabel):
+            label = label.unpack()
+        return "png", cv2.imencode(".png", label)[1].tobytes()
+    buffer = io.BytesIO()
+    if label_format == "packed":
+        packed = label if isinstance(label, PackedLabel) else PackedLabel.from_label(label)
+        np.savez(buffer, bits=packed.bits, width=packed.width, value=packed.value)
+    elif label_format == "rle":
+        if isinstance(label, PackedLabel):
+            value, label = label.value, label.unpack()
+        else:
+            value = int(label.max()) or 255
+        np.savez(buffer, runs=rle_encode(label), shape=label.shape[:2], value=value)
+    else:
+        raise ValueError(f"Unknown label format: {label_format}")
+    return "npz", buffer.getvalue()
+
+
+def decode_label(data: bytes, extension: str, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Decode a label encoded by encode_label, optionally into a caller-provided uint8 buffer of shape (H, W, 1)"""
+    if extension == "png":
+        label = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if out is None:
+            return label[:, :, np.newaxis]
+        _plane(out, label.shape)[:] = label
+        return out
+    with np.load(io.BytesIO(data)) as npz:
+        return _decode_npz(npz, out)
+
+
+def _decode_npz(data, out: Optional[np.ndarray]) -> np.ndarray:
+    """Decode the arrays of a packed or run-length encoded label"""
+    if "bits" in data:
+        return PackedLabel(data["bits"], int(data["width"]), int(data["value"])).unpack(out)
+    return rle_decode(data["runs"], tuple(data["shape"].tolist()), int(data["value"]), out)
+
+
+def save_label(path: str, label, label_format: str) -> str:
+    """Save a label (array or PackedLabel) without extension in the given format
+
+    Returns:
+        str: Path of the written file
+    """
+    if label_format == "png" and not isinstance(label, PackedLabel):
+        cv2.imwrite(f"{path}.png", label)
+        return f"{path}.png"
+    extension, data = encode_label(label, label_format)
+    with open(f"{path}.{extension}", "wb") as f:
+        f.write(data)
+    return f"{path}.{extension}"
+
+
+def load_label(path: str, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Load a label saved in any format, optionally into a caller-provided uint8 buffer of shape (H, W, 1)"""
+    if os.path.splitext(path)[1] == ".png":
+        label = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if label is None:
+            raise FileNotFoundError(f"File not found: {path}")
+        if out is None:
+            return label[:, :, np.newaxis]
+        _plane(out, label.shape)[:] = label
+        return out
+    with np.load(path) as data:
+        return _decode_npz(data, out)
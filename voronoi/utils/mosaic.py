@@ -0,0 +1,78 @@
+"""
+Classes related to cutting large canvases out of periodic Voronoi diagrams
+"""
+
+import numpy as np
+from typing import List, Tuple
+
+
+def wrap_crop(image: np.ndarray, top: int, left: int, height: int, width: int) -> np.ndarray:
+    """Crop a region of the periodic plane tiled with the image
+
+    The region may start anywhere and be larger than the image, in which
+    case the image is repeated.
+
+    Args:
+        image (np.ndarray): Periodic image of shape (H, W, ...)
+        top (int): Top coordinate of the region
+        left (int): Left coordinate of the region
+        height (int): Height of the region
+        width (int): Width of the region
+
+    Returns:
+        np.ndarray: The cropped region of shape (height, width, ...)
+    """
+    rows = np.arange(top, top + height) % image.shape[0]
+    columns = np.arange(left, left + width) % image.shape[1]
+    return image[rows[:, np.newaxis], columns]
+
+
+class PeriodicTiler:
+    """Class for sampling canvases of any size from a handful of periodic diagrams
+
+    Each canvas is cut out of the plane tiled with one of the diagrams, at a
+    random offset. Since the diagrams are periodic, every crop is a valid
+    Voronoi image and label without seams.
+
+    Attributes:
+        images (List[np.ndarray]): Periodic images
+        labels (List[np.ndarray]): Periodic labels
+    """
+
+    def __init__(self):
+        self.images = []
+        self.labels = []
+
+    def add(self, image: np.ndarray, label: np.ndarray):
+        """Add a periodic diagram (generated with periodic: true)"""
+        if image.shape[:2] != label.shape[:2]:
+            raise ValueError("Image and label must have the same size")
+        self.images.append(image)
+        self.labels.append(label)
+
+    def crop(self, index: int, top: int, left: int, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Crop a region of the plane tiled with the index-th diagram"""
+        return (wrap_crop(self.images[index], top, left, height, width),
+                wrap_crop(self.labels[index], top, left, height, width))
+
+    def sample(self, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Sample a canvas from a random diagram at a random offset
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label)
+        """
+        if not self.images:
+            raise ValueError("No diagrams have been added")
+        index = np.random.randint(len(self.images))
+        diagram_height, diagram_width = self.images[index].shape[:2]
+        top, left = np.random.randint(diagram_height), np.random.randint(diagram_width)
+        return self.crop(index, top, left, height, width)
+
+    def sample_many(self, height: int, width: int, num: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Sample several canvases (see sample)"""
+        image_list, label_list = [], []
+        for _ in range(num):
+            image, label = self.sample(height, width)
+            image_list.append(image)
+            label_list.append(label)
+        return image_list, label_list
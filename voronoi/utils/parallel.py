@@ -0,0 +1,55 @@
+"""
+Classes related to running the work of one diagram on several threads
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class BandExecutor:
+    """Thread pool running per-band work on horizontal bands of a canvas
+
+    cv2 drawing and NumPy ufuncs release the GIL, so bands of one image are
+    processed concurrently. Results are merged in band order, and random
+    numbers are drawn from generators seeded per band (see band_rng) over
+    bands of a fixed height, so the output does not depend on the number of
+    threads or on their scheduling.
+
+    Attributes:
+        threads (int): Number of threads
+        band_rows (int): Height of the bands random numbers are drawn for
+    """
+
+    def __init__(self, threads: Optional[int] = None, band_rows: int = 256):
+        self.threads = threads or os.cpu_count() or 1
+        self.band_rows = band_rows
+        self._pool = ThreadPoolExecutor(self.threads)
+
+    def bands(self, height: int, band_rows: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Get the (top, bottom) rows of the bands of a canvas (band_rows high by default)"""
+        band_rows = band_rows or self.band_rows
+        return [(top, min(top + band_rows, height)) for top in range(0, height, band_rows)]
+
+    def thread_bands(self, height: int) -> List[Tuple[int, int]]:
+        """Get one band per thread (for work whose result does not depend on the partition)"""
+        return self.bands(height, max(1, -(-height // self.threads)))
+
+    def map(self, function: Callable[[int, int, int], Any], bands: List[Tuple[int, int]]) -> List[Any]:
+        """Call function(index, top, bottom) for every band and return the results in band order"""
+        futures = [self._pool.submit(function, index, top, bottom) for index, (top, bottom) in enumerate(bands)]
+        return [future.result() for future in futures]
+
+    def draw_seed(self) -> int:
+        """Draw the seed of the band generators of one image from the global random state"""
+        return int(np.random.randint(0, 2 ** 31 - 1))
+
+    @staticmethod
+    def band_rng(seed: int, index: int) -> np.random.Generator:
+        """Get the random number generator of a band"""
+        return np.random.default_rng([seed, index])
+
+    def shutdown(self):
+        """Stop the threads"""
+        self._pool.shutdown()
@@ -0,0 +1,238 @@
+"""
+Classes related to the precomputed Poisson disk point-set bank
+"""
+
+import os
+import math
+import numpy as np
+from typing import List, Optional
+from .base import PointGenerator
+
+
+def toroidal_poisson_disk(width: int, height: int, min_distance: float, max_attempts: int,
+                          rng: np.random.RandomState) -> np.ndarray:
+    """Poisson disk sampling on a periodic (toroidal) domain
+
+    Uses the same dart throwing rule as PoissonDiskPointGenerator (stop after
+    max_attempts consecutive rejections), but measures distances across the
+    borders and looks up neighbours in a background grid.
+
+    Args:
+        width (int): Width of the domain
+        height (int): Height of the domain
+        min_distance (float): Minimum toroidal distance between points
+        max_attempts (int): Number of consecutive rejections before stopping
+        rng (np.random.RandomState): Random number generator
+
+    Returns:
+        np.ndarray: Integer points of shape (N, 2) in (y, x) order
+    """
+    # Grid cells tile the domain exactly and are small enough to hold at most one point
+    grid_h = max(1, math.ceil(height * math.sqrt(2) / min_distance))
+    grid_w = max(1, math.ceil(width * math.sqrt(2) / min_distance))
+    cell_h, cell_w = height / grid_h, width / grid_w
+    reach_y = min(math.ceil(min_distance / cell_h), grid_h // 2)
+    reach_x = min(math.ceil(min_distance / cell_w), grid_w // 2)
+    offset_y, offset_x = np.meshgrid(np.arange(-reach_y, reach_y + 1), np.arange(-reach_x, reach_x + 1), indexing="ij")
+    offset_y, offset_x = offset_y.ravel(), offset_x.ravel()
+
+    grid = np.full((grid_h, grid_w), -1, dtype=np.int64)
+    points = np.empty((grid_h * grid_w, 2), dtype=int)
+    points_num = 0
+    attempts = 0
+    min_distance_squared = min_distance ** 2
+
+    while attempts < max_attempts:
+        y, x = rng.randint(0, [height, width], 2)
+        cy, cx = int(y / cell_h), int(x / cell_w)
+        neighbors = grid[(cy + offset_y) % grid_h, (cx + offset_x) % grid_w]
+        neighbors = neighbors[neighbors >= 0]
+        if len(neighbors) > 0:
+            others = points[neighbors]
+            dy = np.abs(others[:, 0] - y)
+            dx = np.abs(others[:, 1] - x)
+            dy = np.minimum(dy, height - dy)
+            dx = np.minimum(dx, width - dx)
+            if np.any(dy ** 2 + dx ** 2 < min_distance_squared):
+                attempts += 1
+                continue
+        grid[cy, cx] = points_num
+        points[points_num] = (y, x)
+        points_num += 1
+        attempts = 0
+
+    return points[:points_num].copy()
+
+
+def bank_path(path: str, width: int, height: int, max_attempts: int) -> str:
+    """Get the file of the bank of one domain size and max_attempts (e.g. bank.npz -> bank_3072x2048_100.npz)"""
+    root, extension = os.path.splitext(path)
+    return f"{root}_{width}x{height}_{max_attempts}{extension or '.npz'}"
+
+
+class PoissonDiskBank:
+    """Bank of precomputed toroidal Poisson disk point sets
+
+    Holds `size` point sets per min_distance for one domain size. Each set is
+    a pure function of (seed, min_distance, slot, generation), so the bank can
+    be rebuilt or extended lazily by any process with the same result. The
+    file is written when sets are built; refreshed sets are only kept in
+    memory, so processes sharing the file never overwrite each other's
+    refreshes.
+
+    Attributes:
+        width (int): Width of the domain
+        height (int): Height of the domain
+        size (int): Number of point sets per min_distance
+        max_attempts (int): Dart throwing attempts used to build the sets
+        seed (int): Seed of the bank
+        path (Optional[str]): npz file the bank is persisted to (None keeps it in memory)
+        sets (Dict[float, List[np.ndarray]]): Point sets per min_distance
+        generations (Dict[float, np.ndarray]): Number of times each slot has been refreshed
+    """
+
+    def __init__(self, width: int, height: int, size: int, max_attempts: int,
+                 seed: int = 0, path: Optional[str] = None):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.max_attempts = max_attempts
+        self.seed = seed
+        self.path = path
+        self.sets = {}
+        self.generations = {}
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def _sample(self, min_distance: float, slot: int, generation: int) -> np.ndarray:
+        """Sample the point set of one slot"""
+        key = int(round(min_distance * 1000))
+        rng = np.random.RandomState(np.random.SeedSequence([self.seed, key, slot, generation]).generate_state(1)[0])
+        return toroidal_poisson_disk(self.width, self.height, min_distance, self.max_attempts, rng)
+
+    def get_sets(self, min_distance: float) -> List[np.ndarray]:
+        """Get the point sets of a min_distance, building them if they are missing"""
+        min_distance = float(min_distance)
+        if min_distance not in self.sets:
+            self.generations[min_distance] = np.zeros(self.size, dtype=np.int64)
+            self.sets[min_distance] = [self._sample(min_distance, slot, 0) for slot in range(self.size)]
+            self.save()
+        return self.sets[min_distance]
+
+    def refresh(self, min_distance: float, slot: int):
+        """Replace the point set of one slot with a newly sampled one (in memory only)"""
+        min_distance = float(min_distance)
+        self.generations[min_distance][slot] += 1
+        generation = int(self.generations[min_distance][slot])
+        self.sets[min_distance][slot] = self._sample(min_distance, slot, generation)
+
+    def save(self):
+        """Save the bank as a compact npz file (uint16 coordinates)"""
+        if self.path is None:
+            return
+        min_distances = sorted(self.sets)
+        point_sets = [s for d in min_distances for s in self.sets[d]]
+        lengths = np.array([len(s) for s in point_sets], dtype=np.int64)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file first so that concurrent readers never see a partial bank
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                shape=np.array([self.height, self.width, self.size, self.max_attempts, self.seed], dtype=np.int64),
+                min_distances=np.array(min_distances, dtype=np.float64),
+                generations=np.concatenate([self.generations[d] for d in min_distances]) if min_distances else np.empty(0, dtype=np.int64),
+                lengths=lengths,
+                points=np.concatenate(point_sets).astype(np.uint16) if point_sets else np.empty((0, 2), dtype=np.uint16),
+            )
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """Load the bank from the npz file
+
+        Raises:
+            ValueError: If the file was built with other settings
+        """
+        with np.load(self.path) as data:
+            stored = [int(value) for value in data["shape"]]
+            expected = [self.height, self.width, self.size, self.max_attempts, self.seed]
+            if stored != expected:
+                raise ValueError(
+                    f"The point-set bank {self.path} was built with (height, width, size, max_attempts, seed) = {tuple(stored)}, "
+                    f"not {tuple(expected)} (use another bank.path or delete the file)"
+                )
+            points = data["points"].astype(int)
+            offsets = np.concatenate([[0], np.cumsum(data["lengths"])])
+            for i, min_distance in enumerate(data["min_distances"]):
+                slots = range(i * self.size, (i + 1) * self.size)
+                self.sets[float(min_distance)] = [points[offsets[j]:offsets[j + 1]] for j in slots]
+                self.generations[float(min_distance)] = data["generations"][i * self.size:(i + 1) * self.size].copy()
+
+
+class PoissonDiskBankPointGenerator(PointGenerator):
+    """Generator that serves Poisson disk point sets from a precomputed bank
+
+    Each call picks a random set of the bank and applies a random toroidal
+    shift, flips and (for square domains) a transpose. These transforms are
+    isometries of the torus, so the min_distance guarantee is preserved.
+
+    Attributes:
+        size (int): Number of point sets per min_distance
+        path (Optional[str]): npz file the banks are persisted to (one file per bank, see bank_path)
+        max_uses (Optional[int]): Number of times a set is served before it is resampled (None: never)
+        seed (int): Seed of the bank
+        banks (Dict[Tuple[int, int, int], PoissonDiskBank]): Banks per (width, height, max_attempts)
+        uses (Dict[Tuple, int]): Number of times each set has been served
+    """
+
+    def __init__(self, size: int = 32, path: Optional[str] = None,
+                 max_uses: Optional[int] = None, seed: int = 0):
+        self.size = size
+        self.path = path
+        self.max_uses = max_uses
+        self.seed = seed
+        self.banks = {}
+        self.uses = {}
+
+    def get_bank(self, width: int, height: int, max_attempts: int) -> PoissonDiskBank:
+        """Get the bank of a domain size, loading or creating it on first use"""
+        key = (width, height, max_attempts)
+        if key not in self.banks:
+            path = bank_path(self.path, width, height, max_attempts) if self.path is not None else None
+            self.banks[key] = PoissonDiskBank(width, height, self.size, max_attempts, self.seed, path)
+        return self.banks[key]
+
+    def generate(self, width: int, height: int, **kwargs) -> np.ndarray:
+        if "min_distance" not in kwargs:
+            raise ValueError("min_distance is required for PoissonDiskBankPointGenerator")
+        if "max_attempts" not in kwargs:
+            raise ValueError("max_attempts is required for PoissonDiskBankPointGenerator")
+
+        min_distance = kwargs["min_distance"]
+        bank = self.get_bank(width, height, kwargs["max_attempts"])
+        point_sets = bank.get_sets(min_distance)
+
+        # Pick a set and a random isometry of the torus
+        slot = np.random.randint(self.size)
+        shift = np.random.randint(0, [height, width])
+        flip = np.random.randint(0, 2, 2)
+        transpose = width == height and np.random.randint(0, 2) == 1
+
+        points = point_sets[slot].copy()
+        points[:, flip == 1] *= -1
+        if transpose:
+            points = points[:, ::-1]
+        points = (points + shift) % [height, width]
+
+        # Refresh the set once it has been served max_uses times
+        if self.max_uses is not None:
+            use_key = (width, height, kwargs["max_attempts"], float(min_distance), slot)
+            self.uses[use_key] = self.uses.get(use_key, 0) + 1
+            if self.uses[use_key] >= self.max_uses:
+                bank.refresh(min_distance, slot)
+                self.uses[use_key] = 0
+
+        return points
@@ -2,8 +2,10 @@
 Classes related to seed point generation
 """
 
+import math
 import numpy as np
 from .base import PointGenerator
+from .point_banks import PoissonDiskBankPointGenerator
 
 
 class RandomPointGenerator(PointGenerator):
@@ -28,25 +30,34 @@ class PoissonDiskPointGenerator(PointGenerator):
         min_distance = kwargs["min_distance"]
         max_attempts = kwargs["max_attempts"]
         
-        points = np.empty((0, 2), dtype=int)
+        # Neighbours are looked up in a background grid whose cells hold at most one point
+        cell = min_distance / math.sqrt(2)
+        grid_h, grid_w = math.ceil(height / cell), math.ceil(width / cell)
+        reach = math.ceil(min_distance / cell)
+        offset_y, offset_x = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1), indexing="ij")
+        offset_y, offset_x = offset_y.ravel(), offset_x.ravel()
+        
+        # The grid is padded by reach cells so that lookups need no bounds checks
+        grid = np.full((grid_h + 2 * reach, grid_w + 2 * reach), -1, dtype=np.int64)
+        points = np.empty((grid_h * grid_w, 2), dtype=int)
+        points_num = 0
         attempts = 0
         min_distance_squared = min_distance ** 2
         
         while attempts < max_attempts:
             new_point = np.random.randint(0, [height, width], 2)
-            
-            if len(points) == 0:  # Add the first point unconditionally
-                points = np.vstack([points, new_point])
+            cy, cx = int(new_point[0] / cell) + reach, int(new_point[1] / cell) + reach
+            neighbors = grid[cy + offset_y, cx + offset_x]
+            neighbors = neighbors[neighbors >= 0]
+            if len(neighbors) == 0 or np.all(np.sum((points[neighbors] - new_point) ** 2, axis=1) >= min_distance_squared):
+                grid[cy, cx] = points_num
+                points[points_num] = new_point
+                points_num += 1
                 attempts = 0
             else:
-                distances_squared = np.sum((points - new_point) ** 2, axis=1)
-                if np.all(distances_squared >= min_distance_squared):
-                    points = np.vstack([points, new_point])
-                    attempts = 0
-                else:
-                    attempts += 1
+                attempts += 1
         
-        return points
+        return points[:points_num].copy()
 
 
 class PointGeneratorFactory:
@@ -57,6 +68,8 @@ class PointGeneratorFactory:
         if method == "random":
             return RandomPointGenerator()
         elif method == "poisson_disk":
+            if "bank" in params:
+                return PoissonDiskBankPointGenerator(**params["bank"])
             return PoissonDiskPointGenerator()
         else:
             raise ValueError(f"Unknown point generation method: {method}")
@@ -3,10 +3,19 @@ Classes related to image processing
 """
 
 import cv2
+import math
 import numpy as np
-from typing import Dict, Any, Tuple
+from abc import abstractmethod
+from typing import Dict, Any, List, Optional, Tuple, Union
 from perlin_numpy import generate_perlin_noise_2d
-from .base import ImageProcessor
+from .base import ImageProcessor, skip_normal
+from .renderers import PREVIEW_SHIFT
+from .parallel import BandExecutor
+
+# Largest separable kernel (in pixels) convolved in the spatial domain; larger kernels use the FFT
+MAX_SEPARABLE_KERNEL = 63
+# Largest non-separable kernel (in pixels) convolved in the spatial domain; larger kernels use the FFT
+MAX_DIRECT_KERNEL = 11
 
 
 class CropProcessor(ImageProcessor):
@@ -23,51 +32,169 @@ class CropProcessor(ImageProcessor):
         if self.crop_width > image_width or self.crop_height > image_height:
             raise ValueError("Crop size exceeds image dimensions")
 
-        top = (image_height - self.crop_height) // 2
-        left = (image_width - self.crop_width) // 2
+        left, top = self.offset(image_width, image_height)
 
         return image[top:top + self.crop_height, left:left + self.crop_width]
 
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        return self.crop_width, self.crop_height
+
+    def offset(self, width: int, height: int) -> Tuple[int, int]:
+        """Get the (left, top) position of the crop in an image of size width x height"""
+        return (width - self.crop_width) // 2, (height - self.crop_height) // 2
+
+    def process_preview(self, image: np.ndarray, scale: float, full_size: Tuple[int, int]) -> np.ndarray:
+        """Crop the center region of a reduced-scale image"""
+        image_height, image_width = image.shape[:2]
+        crop_width = min(max(1, round(self.crop_width * scale)), image_width)
+        crop_height = min(max(1, round(self.crop_height * scale)), image_height)
+
+        top = (image_height - crop_height) // 2
+        left = (image_width - crop_width) // 2
+
+        return image[top:top + crop_height, left:left + crop_width]
+
 
 class EllipticalMaskProcessor(ImageProcessor):
-    """Processor for adding elliptical mask defects"""
+    """Processor for adding elliptical mask defects
+
+    With an executor, the masks are drawn band by band. The random draws
+    and the masked pixels are the same as single-threaded.
+    """
     
     def __init__(self, min_num: int = 0, max_num: int = 10,
                  min_size: int = 10, max_size: int = 40,
-                 color: Tuple[int, int, int] = (0, 0, 0)):
+                 color: Tuple[int, int, int] = (0, 0, 0),
+                 periodic: bool = False, executor: Optional[BandExecutor] = None):
         self.min_num = min_num
         self.max_num = max_num
         self.min_size = min_size
         self.max_size = max_size
         self.color = color
+        self.periodic = periodic
+        self.executor = executor
 
     def process(self, image: np.ndarray) -> np.ndarray:
         """Add random elliptical masks to the image"""
         h, w = image.shape[:2]
+        masks = [
+            (wrapped_center, size)
+            for center, size in self._draw_masks(w, h)
+            for wrapped_center in self._wrap_center(center, size, w, h)
+        ]
+        if self.executor is not None:
+            return self._process_bands(image, masks)
+
         image_masked = image.copy()
+        for center, size in masks:
+            cv2.ellipse(image_masked, center, size, 0, 0, 360, self.color, -1)
+
+        return image_masked
+
+    def _process_bands(self, image: np.ndarray, masks: List[Tuple[Tuple[int, int], Tuple[int, int]]]) -> np.ndarray:
+        """Draw the masks band by band on the executor
+
+        All masks have the same color, so their order does not matter: each
+        band draws the masks reaching it on a full-size mask canvas (edges are
+        rasterized as on the whole image) and paints its own rows.
+        """
+        h, w = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        fill = np.array(self.color[:channels] if channels > 1 else self.color[0], dtype=image.dtype)
+        image_masked = np.empty_like(image)
+
+        def band(index: int, top: int, bottom: int):
+            image_masked[top:bottom] = image[top:bottom]
+            selected = [(center, size) for center, size in masks if center[1] + size[1] >= top - 1 and center[1] - size[1] <= bottom]
+            if not selected:
+                return
+            canvas = np.zeros((h, w), dtype=np.uint8)
+            for center, size in selected:
+                cv2.ellipse(canvas, center, size, 0, 0, 360, 255, -1)
+            image_masked[top:bottom][canvas[top:bottom] > 0] = fill
+
+        self.executor.map(band, self.executor.thread_bands(h))
+        return image_masked
+
+    def process_preview(self, image: np.ndarray, scale: float, full_size: Tuple[int, int]) -> np.ndarray:
+        """Add the masks of the full-resolution image, scaled down, to a preview"""
+        image_masked = image.copy()
+        factor = scale * (1 << PREVIEW_SHIFT)
+
+        for center, size in self._draw_masks(*full_size):
+            for wrapped_center in self._wrap_center(center, size, *full_size):
+                wrapped_center = (round(wrapped_center[0] * factor), round(wrapped_center[1] * factor))
+                scaled_size = (round(size[0] * factor), round(size[1] * factor))
+                cv2.ellipse(image_masked, wrapped_center, scaled_size, 0, 0, 360, self.color, -1, shift=PREVIEW_SHIFT)
+
+        return image_masked
+
+    def _wrap_center(self, center: Tuple[int, int], size: Tuple[int, int], w: int, h: int) -> List[Tuple[int, int]]:
+        """Get the centers of the copies of a mask that overlap the image (only the mask itself without periodic)"""
+        if not self.periodic:
+            return [center]
+        return [
+            (center[0] + ox, center[1] + oy)
+            for oy in (-h, 0, h) if -size[1] <= center[1] + oy < h + size[1]
+            for ox in (-w, 0, w) if -size[0] <= center[0] + ox < w + size[0]
+        ]
+
+    def _draw_masks(self, w: int, h: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Draw the random centers and sizes of the masks for an image of size (w, h)"""
+        masks = []
         num_masks = np.random.randint(self.min_num, self.max_num + 1)
 
         for _ in range(num_masks):
             center = (np.random.randint(0, w), np.random.randint(0, h))
             size = (np.random.randint(self.min_size, self.max_size),
                     np.random.randint(self.min_size, self.max_size))
-            cv2.ellipse(image_masked, center, size, 0, 0, 360, self.color, -1)
+            masks.append((center, size))
 
-        return image_masked
+        return masks
 
 
 class GaussianNoiseProcessor(ImageProcessor):
-    """Processor for adding Gaussian noise"""
+    """Processor for adding Gaussian noise
 
-    def __init__(self, mean: float = 0, std: float = 20):
+    With an executor, the noise of each band is drawn from a generator
+    seeded per band (one draw from the global random state per image), so
+    it differs from single-threaded noise but not between thread counts.
+    """
+
+    def __init__(self, mean: float = 0, std: float = 20, executor: Optional[BandExecutor] = None):
         self.mean = mean
         self.std = std
+        self.executor = executor
 
     def process(self, image: np.ndarray) -> np.ndarray:
         """Add Gaussian noise to the image"""
+        if self.executor is not None:
+            return self._process_bands(image)
         noise = np.random.normal(self.mean, self.std, image.shape)
         return self._apply_noise(image, noise)
 
+    def process_preview(self, image: np.ndarray, scale: float, full_size: Tuple[int, int]) -> np.ndarray:
+        """Add Gaussian noise to a preview, advancing the global random state as at full resolution"""
+        if self.executor is not None:
+            noise = self.executor.band_rng(self.executor.draw_seed(), 0).normal(self.mean, self.std, image.shape)
+        else:
+            noise = np.random.normal(self.mean, self.std, image.shape)
+            skip_normal(full_size[0] * full_size[1] * int(np.prod(image.shape[2:])) - noise.size)
+        return self._apply_noise(image, noise)
+
+    def _process_bands(self, image: np.ndarray) -> np.ndarray:
+        """Add noise band by band on the executor"""
+        seed = self.executor.draw_seed()
+        noised_image = np.empty_like(image)
+
+        def band(index: int, top: int, bottom: int):
+            rng = self.executor.band_rng(seed, index)
+            noise = rng.normal(self.mean, self.std, (bottom - top,) + image.shape[1:])
+            noised_image[top:bottom] = self._apply_noise(image[top:bottom], noise)
+
+        self.executor.map(band, self.executor.bands(image.shape[0]))
+        return noised_image
+
     def _apply_noise(self, image: np.ndarray, noise: np.ndarray) -> np.ndarray:
         """Apply noise to the image and clip values"""
         noised_image = image.astype(np.float64) + noise
@@ -77,14 +204,83 @@ class GaussianNoiseProcessor(ImageProcessor):
 class PerlinNoiseProcessor(ImageProcessor):
     """Processor for adding Perlin noise"""
 
-    def __init__(self, res: Tuple[int, int] = (32, 32), noise_range: float = 20):
+    def __init__(self, res: Tuple[int, int] = (32, 32), noise_range: float = 20,
+                 periodic: bool = False, executor: Optional[BandExecutor] = None):
         self.res = res
         self.noise_range = noise_range
+        self.periodic = periodic
+        self.executor = executor
 
     def process(self, image: np.ndarray) -> np.ndarray:
         """Add Perlin noise to the image"""
         height, width = image.shape[:2]
-        perlin_noise = generate_perlin_noise_2d((height, width), self.res)
+        if self.executor is not None:
+            return self._process_bands(image)
+        perlin_noise = generate_perlin_noise_2d((height, width), self.res, tileable=(self.periodic, self.periodic))
+        return self._apply_perlin_noise(image, perlin_noise)
+
+    def process_preview(self, image: np.ndarray, scale: float, full_size: Tuple[int, int]) -> np.ndarray:
+        """Add Perlin noise with the same number of periods to a preview"""
+        height, width = image.shape[:2]
+        # The noise shape must be a multiple of res, so generate a slightly larger field and cut it
+        shape = (-(-height // self.res[0]) * self.res[0], -(-width // self.res[1]) * self.res[1])
+        perlin_noise = generate_perlin_noise_2d(shape, self.res, tileable=(self.periodic, self.periodic))[:height, :width]
+        return self._apply_perlin_noise(image, perlin_noise)
+
+    def _process_bands(self, image: np.ndarray) -> np.ndarray:
+        """Add Perlin noise band by band on the executor
+
+        The gradients are drawn as in generate_perlin_noise_2d and every band
+        evaluates the same expressions on its rows, so the noise is identical
+        to the single-threaded one.
+        """
+        height, width = image.shape[:2]
+        if height % self.res[0] != 0 or width % self.res[1] != 0:
+            raise ValueError(f"Image size ({width}x{height}) must be a multiple of the Perlin noise res {self.res}")
+        delta = (self.res[0] / height, self.res[1] / width)
+        cells = (height // self.res[0], width // self.res[1])
+
+        # Gradients at the lattice points (same draws as generate_perlin_noise_2d)
+        angles = 2 * np.pi * np.random.uniform(size=(self.res[0] + 1, self.res[1] + 1))
+        gradients = np.dstack((np.cos(angles), np.sin(angles)))
+        if self.periodic:
+            gradients[-1, :] = gradients[0, :]
+            gradients[:, -1] = gradients[:, 0]
+        columns = (np.arange(width, dtype=np.float64) * delta[1]) % 1
+        column_cells = np.arange(width) // cells[1]
+        t_columns = columns * columns * columns * (columns * (columns * 6 - 15) + 10)
+        # Gradients of the left and right lattice points of every column, per lattice row
+        left = np.ascontiguousarray(gradients[:, column_cells].transpose(2, 0, 1))
+        right = np.ascontiguousarray(gradients[:, column_cells + 1].transpose(2, 0, 1))
+
+        def noise_rows(index: int, top: int, bottom: int) -> np.ndarray:
+            rows = ((np.arange(top, bottom, dtype=np.float64) * delta[0]) % 1)[:, np.newaxis]
+            row_cells = np.arange(top, bottom) // cells[0]
+            n00 = rows * left[0][row_cells] + columns * left[1][row_cells]
+            n10 = (rows - 1) * left[0][row_cells + 1] + columns * left[1][row_cells + 1]
+            n01 = rows * right[0][row_cells] + (columns - 1) * right[1][row_cells]
+            n11 = (rows - 1) * right[0][row_cells + 1] + (columns - 1) * right[1][row_cells + 1]
+            t_rows = rows * rows * rows * (rows * (rows * 6 - 15) + 10)
+            n0 = n00 * (1 - t_rows) + t_rows * n10
+            n1 = n01 * (1 - t_rows) + t_rows * n11
+            return np.sqrt(2) * ((1 - t_columns) * n0 + t_columns * n1)
+
+        # The noise is scaled by its range over the whole image, so bands are applied once all are evaluated
+        bands = self.executor.bands(height)
+        band_noises = self.executor.map(noise_rows, bands)
+        noise_min = min(perlin_noise.min() for perlin_noise in band_noises)
+        noise_max = max(perlin_noise.max() for perlin_noise in band_noises)
+        noised_image = np.empty_like(image)
+
+        def band(index: int, top: int, bottom: int):
+            perlin_noise = np.interp(band_noises[index], (noise_min, noise_max), (-self.noise_range, self.noise_range))
+            noised_image[top:bottom] = self._apply_noise(image[top:bottom], perlin_noise[..., np.newaxis])
+
+        self.executor.map(band, bands)
+        return noised_image
+
+    def _apply_perlin_noise(self, image: np.ndarray, perlin_noise: np.ndarray) -> np.ndarray:
+        """Scale the Perlin noise to the noise range and apply it"""
         perlin_noise = np.interp(
             perlin_noise,
             (perlin_noise.min(), perlin_noise.max()),
@@ -99,6 +295,218 @@ class PerlinNoiseProcessor(ImageProcessor):
         return np.clip(noised_image, 0, 255).astype(np.uint8)
 
 
+class ConvolutionProcessor(ImageProcessor):
+    """Base class for processors that convolve the image with a kernel
+
+    The convolution runs in float32 on a single copy of the image. Separable
+    kernels up to MAX_SEPARABLE_KERNEL pixels and other kernels up to
+    MAX_DIRECT_KERNEL pixels are applied in the spatial domain; larger ones
+    are multiplied in the frequency domain, with the kernel spectrum cached
+    per image size. Borders are reflected, or wrapped for periodic diagrams.
+
+    Attributes:
+        periodic (bool): Whether the convolution wraps around the borders
+    """
+
+    def __init__(self, periodic: bool = False):
+        self.periodic = periodic
+        self._spectra = {}
+
+    @abstractmethod
+    def kernel(self, scale: float = 1.0) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """Get the kernel at the given scale, as a 2D array or a (vertical, horizontal) pair of 1D kernels if separable"""
+        pass
+
+    def process(self, image: np.ndarray) -> np.ndarray:
+        """Convolve the image with the kernel"""
+        return self._convolve(image, self.kernel(), 1.0)
+
+    def process_preview(self, image: np.ndarray, scale: float, full_size: Tuple[int, int]) -> np.ndarray:
+        """Convolve a preview with the kernel scaled down"""
+        return self._convolve(image, self.kernel(scale), scale)
+
+    def _convolve(self, image: np.ndarray, kernel, scale: float) -> np.ndarray:
+        """Convolve a single-channel image, choosing the spatial or frequency domain from the kernel size"""
+        values = image.astype(np.float32)
+        plane = values.reshape(image.shape[:2])
+        height, width = plane.shape
+
+        if isinstance(kernel, tuple):
+            kernel_y, kernel_x = kernel
+            if max(len(kernel_y), len(kernel_x)) <= MAX_SEPARABLE_KERNEL and self._fits(plane, len(kernel_y), len(kernel_x)):
+                # cv2 filters correlate, so kernels are flipped for a convolution
+                self._filter(plane, len(kernel_y), len(kernel_x),
+                             lambda src: cv2.sepFilter2D(src, -1, kernel_x[::-1], kernel_y[::-1], dst=src, borderType=cv2.BORDER_REFLECT_101))
+            else:
+                self._convolve_fft(plane, np.outer(kernel_y, kernel_x), scale)
+        elif max(kernel.shape) <= MAX_DIRECT_KERNEL and self._fits(plane, *kernel.shape):
+            self._filter(plane, *kernel.shape,
+                         lambda src: cv2.filter2D(src, -1, kernel[::-1, ::-1], dst=src, borderType=cv2.BORDER_REFLECT_101))
+        else:
+            self._convolve_fft(plane, kernel, scale)
+
+        np.clip(plane, 0, 255, out=plane)
+        return np.rint(values).astype(np.uint8)
+
+    def _fits(self, plane: np.ndarray, kernel_height: int, kernel_width: int) -> bool:
+        """Check whether a periodic border of the kernel radius can be cut from the image"""
+        return not self.periodic or (kernel_height // 2 <= plane.shape[0] and kernel_width // 2 <= plane.shape[1])
+
+    def _filter(self, plane: np.ndarray, kernel_height: int, kernel_width: int, apply):
+        """Apply a spatial filter in place, on a wrapped copy for periodic diagrams"""
+        if not self.periodic:
+            apply(plane)
+            return
+        radius_y, radius_x = kernel_height // 2, kernel_width // 2
+        padded = cv2.copyMakeBorder(plane, radius_y, radius_y, radius_x, radius_x, cv2.BORDER_WRAP)
+        apply(padded)
+        plane[:] = padded[radius_y:radius_y + plane.shape[0], radius_x:radius_x + plane.shape[1]]
+
+    def _convolve_fft(self, plane: np.ndarray, kernel: np.ndarray, scale: float):
+        """Convolve in place in the frequency domain
+
+        Periodic images are convolved circularly at their own size. Others are
+        reflected by the kernel radius and padded to a fast DFT size, which
+        keeps the wrap-around of the circular convolution out of the image.
+        """
+        height, width = plane.shape
+        radius_y, radius_x = kernel.shape[0] // 2, kernel.shape[1] // 2
+        if self.periodic:
+            shape = (height, width)
+            padded = plane
+        else:
+            shape = (cv2.getOptimalDFTSize(height + 2 * radius_y), cv2.getOptimalDFTSize(width + 2 * radius_x))
+            padded = cv2.copyMakeBorder(plane, radius_y, shape[0] - height - radius_y,
+                                        radius_x, shape[1] - width - radius_x, cv2.BORDER_REFLECT_101)
+
+        spectrum = self._spectrum(kernel, shape, scale)
+        cv2.dft(padded, dst=padded)
+        cv2.mulSpectrums(padded, spectrum, 0, padded)
+        cv2.dft(padded, dst=padded, flags=cv2.DFT_INVERSE | cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+        if not self.periodic:
+            plane[:] = padded[radius_y:radius_y + height, radius_x:radius_x + width]
+
+    def _spectrum(self, kernel: np.ndarray, shape: Tuple[int, int], scale: float) -> np.ndarray:
+        """Get the packed spectrum of the kernel centred on the origin (cached per size and scale)"""
+        key = (shape, scale)
+        if key not in self._spectra:
+            field = np.zeros(shape, dtype=np.float32)
+            # Kernels larger than a periodic image fold onto it
+            rows = (np.arange(kernel.shape[0]) - kernel.shape[0] // 2) % shape[0]
+            columns = (np.arange(kernel.shape[1]) - kernel.shape[1] // 2) % shape[1]
+            np.add.at(field, np.ix_(rows, columns), kernel.astype(np.float32))
+            self._spectra[key] = cv2.dft(field)
+        return self._spectra[key]
+
+
+class GaussianBlurProcessor(ConvolutionProcessor):
+    """Processor for Gaussian blur, optionally anisotropic and rotated (beam shape and astigmatism)
+
+    Kernels are truncated at 4 sigma. Axis-aligned blurs are separable.
+    """
+
+    def __init__(self, sigma: float = 1.0, sigma_y: Optional[float] = None, angle: float = 0.0,
+                 periodic: bool = False):
+        super().__init__(periodic)
+        self.sigma = sigma
+        self.sigma_y = sigma if sigma_y is None else sigma_y
+        self.angle = angle
+
+    def kernel(self, scale: float = 1.0) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        sigma_x, sigma_y = self.sigma * scale, self.sigma_y * scale
+        if self.angle % 90 == 0:
+            if self.angle % 180 != 0:
+                sigma_x, sigma_y = sigma_y, sigma_x
+            return self._gaussian(sigma_y), self._gaussian(sigma_x)
+
+        radius = math.ceil(4 * max(sigma_x, sigma_y))
+        y, x = np.mgrid[-radius:radius + 1, -radius:radius + 1].astype(np.float32)
+        theta = np.deg2rad(self.angle)
+        u = x * np.cos(theta) + y * np.sin(theta)
+        v = -x * np.sin(theta) + y * np.cos(theta)
+        kernel = np.exp(-0.5 * ((u / max(sigma_x, 1e-6)) ** 2 + (v / max(sigma_y, 1e-6)) ** 2))
+        return (kernel / kernel.sum()).astype(np.float32)
+
+    def _gaussian(self, sigma: float) -> np.ndarray:
+        """Get a normalized 1D Gaussian kernel (a unit impulse for a vanishing sigma)"""
+        radius = math.ceil(4 * sigma)
+        if radius == 0:
+            return np.ones(1, dtype=np.float32)
+        kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1, dtype=np.float32) / sigma) ** 2)
+        return (kernel / kernel.sum()).astype(np.float32)
+
+
+class PSFProcessor(ConvolutionProcessor):
+    """Processor for convolving the image with a custom point spread function
+
+    The kernel is given inline or as a .npy file and normalized to a unit sum
+    by default. Even-sized kernels are padded to odd sizes (centred on the
+    lower-right of their middle), and rank-1 kernels are applied separably.
+    """
+
+    def __init__(self, kernel: Optional[List[List[float]]] = None, path: Optional[str] = None,
+                 normalize: bool = True, periodic: bool = False):
+        super().__init__(periodic)
+        if (kernel is None) == (path is None):
+            raise ValueError("Exactly one of 'kernel' and 'path' is required for the PSF")
+        psf = np.asarray(kernel if path is None else np.load(path), dtype=np.float64)
+        if psf.ndim != 2 or psf.size == 0:
+            raise ValueError("The PSF kernel must be a non-empty 2D array")
+        if normalize:
+            if psf.sum() == 0:
+                raise ValueError("The PSF kernel cannot be normalized (zero sum)")
+            psf = psf / psf.sum()
+        self.psf = psf
+        self._kernels = {}
+
+    def kernel(self, scale: float = 1.0) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        if scale not in self._kernels:
+            psf = self.psf
+            if scale != 1.0:
+                # Resample the PSF to the preview pixel size, keeping its sum
+                size = (max(1, round(psf.shape[1] * scale)), max(1, round(psf.shape[0] * scale)))
+                resized = cv2.resize(psf, size, interpolation=cv2.INTER_AREA)
+                psf = resized * (psf.sum() / resized.sum()) if resized.sum() != 0 else resized
+            psf = np.pad(psf, ((0, 1 - psf.shape[0] % 2), (0, 1 - psf.shape[1] % 2)))
+
+            u, s, vt = np.linalg.svd(psf)
+            if len(s) == 1 or s[1] <= 1e-6 * s[0]:
+                kernel = ((u[:, 0] * np.sqrt(s[0])).astype(np.float32), (vt[0] * np.sqrt(s[0])).astype(np.float32))
+            else:
+                kernel = psf.astype(np.float32)
+            self._kernels[scale] = kernel
+        return self._kernels[scale]
+
+
+class BrightnessGradientProcessor(ImageProcessor):
+    """Processor for adding a low-frequency brightness gradient (charging and uneven detector response)
+
+    A linear ramp with a random direction spans -amplitude to +amplitude
+    gray levels across the image, with the amplitude drawn per image. The
+    ramp is defined in relative coordinates, so previews match.
+    """
+
+    def __init__(self, min_amplitude: float = 0.0, max_amplitude: float = 20.0):
+        self.min_amplitude = min_amplitude
+        self.max_amplitude = max_amplitude
+
+    def process(self, image: np.ndarray) -> np.ndarray:
+        """Add a random brightness gradient to the image"""
+        height, width = image.shape[:2]
+        angle = np.random.uniform(0, 2 * np.pi)
+        amplitude = np.random.uniform(self.min_amplitude, self.max_amplitude)
+
+        # Normalize so that the ramp reaches +-amplitude at the far corners
+        slope_x, slope_y = np.cos(angle), np.sin(angle)
+        norm = amplitude / max(abs(slope_x) + abs(slope_y), 1e-12)
+        values = image.astype(np.float32)
+        plane = values.reshape(height, width)
+        plane += (np.linspace(-1, 1, width, dtype=np.float32) * np.float32(slope_x * norm))[np.newaxis, :]
+        plane += (np.linspace(-1, 1, height, dtype=np.float32) * np.float32(slope_y * norm))[:, np.newaxis]
+        np.clip(plane, 0, 255, out=plane)
+        return np.rint(values).astype(np.uint8)
+
+
 class ProcessorFactory:
     """Factory class for creating image processors"""
 
@@ -108,6 +516,9 @@ class ProcessorFactory:
             "elliptical_mask": EllipticalMaskProcessor,
             "gaussian_noise": GaussianNoiseProcessor,
             "perlin_noise": PerlinNoiseProcessor,
+            "gaussian_blur": GaussianBlurProcessor,
+            "psf": PSFProcessor,
+            "brightness_gradient": BrightnessGradientProcessor,
         }
 
     def create_processor(self, processor_type: str, **params) -> ImageProcessor:
@@ -120,16 +531,26 @@ class ProcessorFactory:
 class ImagePipeline:
     """Image processing pipeline"""
 
-    def __init__(self, config: Dict[str, Any]):
+    # Processors that wrap their output around the borders for periodic diagrams
+    periodic_types = ["elliptical_mask", "perlin_noise", "gaussian_blur", "psf"]
+    # Processors that process horizontal bands on a thread pool when one is given
+    parallel_types = ["elliptical_mask", "gaussian_noise", "perlin_noise"]
+
+    def __init__(self, config: Dict[str, Any], executor: Optional[BandExecutor] = None):
         self.factory = ProcessorFactory()
         self.image_processors = []  # Applied only to image
         self.both_processors = []   # Applied to both image and label
 
         # Build processors from configuration
         for proc_config in config.get("post_processors", []):
+            params = dict(proc_config.get("params", {}))
+            if config.get("periodic", False) and proc_config["type"] in self.periodic_types:
+                params["periodic"] = True
+            if executor is not None and proc_config["type"] in self.parallel_types:
+                params["executor"] = executor
             processor = self.factory.create_processor(
                 proc_config["type"],
-                **proc_config.get("params", {})
+                **params
             )
 
             # Classify based on apply_to parameter
@@ -151,3 +572,44 @@ class ImagePipeline:
             image = processor.process(image)
 
         return image, label
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Get the (width, height) of the processed image"""
+        for processor in self.both_processors + self.image_processors:
+            width, height = processor.output_size(width, height)
+        return width, height
+
+    def label_offset(self, width: int, height: int) -> Tuple[int, int]:
+        """Get the (left, top) position of the processed label in the diagram (moved by crops)"""
+        left = top = 0
+        for processor in self.both_processors:
+            if isinstance(processor, CropProcessor):
+                offset = processor.offset(width, height)
+                left, top = left + offset[0], top + offset[1]
+            width, height = processor.output_size(width, height)
+        return left, top
+
+    def process_preview(self, image: np.ndarray, label: np.ndarray,
+                        scale: float, full_size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Apply processors to a reduced-scale preview, in the same order as process
+
+        Args:
+            image (np.ndarray): The preview image
+            label (np.ndarray): The preview label
+            scale (float): Scale of the preview relative to the full-resolution image
+            full_size (Tuple[int, int]): (width, height) of the full-resolution image
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label)
+        """
+        size = full_size
+        for processor in self.both_processors:
+            image = processor.process_preview(image, scale, size)
+            label = processor.process_preview(label, scale, size)
+            size = processor.output_size(*size)
+
+        for processor in self.image_processors:
+            image = processor.process_preview(image, scale, size)
+            size = processor.output_size(*size)
+
+        return image, label
@@ -2,43 +2,306 @@
 Classes related to image rendering
 """
 
+import math
 import cv2
 import numpy as np
-from typing import List, Tuple
-from .base import GrayValueGenerator
+from typing import Callable, List, Optional, Tuple
+from .base import GrayValueGenerator, GrainTexture
+from .textures import GrainMap
+from .parallel import BandExecutor
+from .coverage import CapsuleCoverage, polygon_segments
+
+# Fractional bits of the fixed-point coordinates used for reduced-scale rendering
+PREVIEW_SHIFT = 4
+# Fractional bits of the fixed-point facets of diagrams with coverage labels
+SUBPIXEL_SHIFT = 4
 
 
 class ImageRenderer:
-    """Class for rendering images"""
+    """Class for rendering images
+
+    Attributes:
+        width (int): Width of the image
+        height (int): Height of the image
+        periodic (bool): Whether facets are wrapped around the borders (for periodic diagrams)
+        executor (Optional[BandExecutor]): Thread pool rendering horizontal bands concurrently (None: single thread)
+    """
     
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, periodic: bool = False, executor: Optional[BandExecutor] = None):
         self.width = width
         self.height = height
+        self.periodic = periodic
+        self.executor = executor
     
     def create_initial_image(self, grayscale_value: int = 0) -> np.ndarray:
         """Create an initial image"""
         return np.full((self.height, self.width, 1), grayscale_value, dtype=np.uint8)
     
+    def scale_facets(self, facets: List[np.ndarray], scale: float) -> List[np.ndarray]:
+        """Scale facets to fixed-point coordinates with PREVIEW_SHIFT fractional bits"""
+        if len(facets) == 0:
+            return []
+        lengths = [len(facet) for facet in facets]
+        vertices = np.rint(np.concatenate(facets) * (scale * (1 << PREVIEW_SHIFT))).astype(np.int32)
+        return np.split(vertices, np.cumsum(lengths)[:-1])
+    
+    def _wrap_offsets(self, x_min: int, y_min: int, x_max: int, y_max: int, shift: int) -> List[Tuple[int, int]]:
+        """Get the period offsets that move a bounding box onto the image"""
+        width, height = self.width << shift, self.height << shift
+        return [
+            (ox, oy)
+            for oy in (-height, 0, height) if y_max + oy >= 0 and y_min + oy < height
+            for ox in (-width, 0, width) if x_max + ox >= 0 and x_min + ox < width
+        ]
+    
+    def wrap_facets(self, facets: List[np.ndarray], shift: int = 0, margin: int = 0) -> Tuple[List[List[np.ndarray]], int]:
+        """Get the wrapped copies of each facet on a canvas padded by a border
+
+        cv2 rasterizes edges that cross the canvas border slightly differently
+        from unclipped ones, so periodic diagrams are drawn on a canvas padded
+        by more than the largest facet. No edge that reaches the image is then
+        clipped, and wrapped copies match pixel for pixel across the seams.
+
+        Args:
+            facets (List[np.ndarray]): Facets (fixed-point with shift fractional bits)
+            shift (int): Number of fractional bits of the facets
+            margin (int): Extra padding in pixels (e.g. for the line thickness)
+
+        Returns:
+            Tuple[List[List[np.ndarray]], int]: Copies of each facet in padded canvas coordinates, and the padding
+        """
+        if not self.periodic:
+            return [[facet] for facet in facets], 0
+        if len(facets) == 0:
+            return [], 0
+        
+        mins, maxs = self._facet_bounds(facets)
+        pad = self._pad(mins, maxs, shift, margin)
+        offset = pad << shift
+        
+        wrapped_facets = []
+        for facet, (x_min, y_min), (x_max, y_max) in zip(facets, mins, maxs):
+            offsets = self._wrap_offsets(x_min, y_min, x_max, y_max, shift)
+            wrapped_facets.append([facet + np.array((ox + offset, oy + offset), dtype=facet.dtype) for ox, oy in offsets])
+        return wrapped_facets, pad
+    
+    def canvas_pad(self, facets: List[np.ndarray], shift: int = 0, margin: int = 0) -> int:
+        """Get the padding of the canvas wrap_facets draws facets on (0 if not periodic)"""
+        if not self.periodic or len(facets) == 0:
+            return 0
+        return self._pad(*self._facet_bounds(facets), shift, margin)
+
+    @staticmethod
+    def _facet_bounds(facets: List[np.ndarray]) -> Tuple[List[List[int]], List[List[int]]]:
+        """Get the (x, y) minimum and maximum of every facet (bounding boxes of all facets at once)"""
+        starts = np.cumsum([0] + [len(facet) for facet in facets[:-1]])
+        vertices = np.concatenate(facets)
+        return np.minimum.reduceat(vertices, starts).tolist(), np.maximum.reduceat(vertices, starts).tolist()
+
+    @staticmethod
+    def _pad(mins: List[List[int]], maxs: List[List[int]], shift: int, margin: int) -> int:
+        """Get the padding of a canvas by more than the largest facet"""
+        extent = max(max(x1 - x0, y1 - y0) for (x0, y0), (x1, y1) in zip(mins, maxs))
+        return (int(extent) >> shift) + margin + 2
+
+    def _create_canvas(self, pad: int) -> np.ndarray:
+        """Create an initial image padded by pad pixels on each side"""
+        return np.zeros((self.height + 2 * pad, self.width + 2 * pad, 1), dtype=np.uint8)
+    
+    def _crop_canvas(self, canvas: np.ndarray, pad: int) -> np.ndarray:
+        """Cut the image out of a padded canvas"""
+        if pad == 0:
+            return canvas
+        return np.ascontiguousarray(canvas[pad:pad + self.height, pad:pad + self.width])
+    
+    def _draw_bands(
+        self, polygons: List[np.ndarray], draw: Callable[[np.ndarray, np.ndarray], None],
+        pad: int, shift: int, margin: int
+    ) -> np.ndarray:
+        """Draw polygons on a (padded) canvas band by band on the executor
+        
+        cv2 rasterizes edges slightly differently when they are clipped, so
+        each band draws the polygons reaching it, in their original order, on
+        a full-size canvas and keeps its own rows. The result is identical to
+        drawing all polygons on one canvas.
+        
+        Args:
+            polygons (List[np.ndarray]): Polygons in drawing order
+            draw (Callable[[np.ndarray, np.ndarray], None]): Draws the polygons of the given indices on a canvas
+            pad (int): Padding of the canvas (see wrap_facets)
+            shift (int): Number of fractional bits of the polygons
+            margin (int): Rows a polygon may be drawn beyond its vertices (e.g. the line thickness)
+        """
+        canvas = self._create_canvas(pad)
+        if len(polygons) == 0:
+            return canvas
+        starts = np.cumsum([0] + [len(polygon) for polygon in polygons[:-1]])
+        rows = np.concatenate(polygons).reshape(-1, 2)[:, 1].astype(np.int64) >> shift
+        y_min = np.minimum.reduceat(rows, starts) - margin
+        y_max = np.maximum.reduceat(rows, starts) + margin
+        
+        def band(index: int, top: int, bottom: int):
+            band_canvas = self._create_canvas(pad)
+            draw(band_canvas, np.flatnonzero((y_max >= top) & (y_min < bottom)))
+            canvas[top:bottom] = band_canvas[top:bottom]
+        
+        self.executor.map(band, self.executor.thread_bands(canvas.shape[0]))
+        return canvas
+    
     def render_voronoi_image(
-        self, facets: List[np.ndarray], gray_generator: GrayValueGenerator
+        self, facets: List[np.ndarray], gray_generator: GrayValueGenerator,
+        shift: int = 0
     ) -> np.ndarray:
-        """Render an image with Voronoi regions filled using grayscale values"""
-        voronoi_image = self.create_initial_image()
+        """Render an image with Voronoi regions filled using grayscale values
+
+        shift is the number of fractional bits of fixed-point facets (see scale_facets).
+        """
+        if self.executor is not None:
+            wrapped_facets, pad = self.wrap_facets(facets, shift)
+            polygons, grays = [], []
+            for copies in wrapped_facets:
+                random_gray = gray_generator.generate()
+                polygons.extend(copies)
+                grays.extend([random_gray] * len(copies))
+            
+            def fill(canvas: np.ndarray, selected: np.ndarray):
+                for k in selected:
+                    cv2.fillConvexPoly(canvas, polygons[k], (grays[k]), shift=shift)
+            
+            return self._crop_canvas(self._draw_bands(polygons, fill, pad, shift, 1), pad)
         
-        for facet in facets:
+        if not self.periodic:
+            voronoi_image = self.create_initial_image()
+            
+            for facet in facets:
+                random_gray = gray_generator.generate()
+                cv2.fillConvexPoly(voronoi_image, facet, (random_gray), shift=shift)
+            
+            return voronoi_image
+        
+        wrapped_facets, pad = self.wrap_facets(facets, shift)
+        voronoi_image = self._create_canvas(pad)
+        for polygons in wrapped_facets:
             random_gray = gray_generator.generate()
-            cv2.fillConvexPoly(voronoi_image, facet, (random_gray))
+            for polygon in polygons:
+                cv2.fillConvexPoly(voronoi_image, polygon, (random_gray), shift=shift)
+        return self._crop_canvas(voronoi_image, pad)
+    
+    def render_textured_image(
+        self, facets: List[np.ndarray], gray_generator: GrayValueGenerator,
+        textures: List[GrainTexture], shift: int = 0, scale: float = 1.0, full_pixels: Optional[int] = None
+    ) -> np.ndarray:
+        """Render an image with per-grain textures on top of the grayscale values
+
+        Facets are filled in the same order as render_voronoi_image, but with
+        their piece index on an int32 grain map; gray values and texture
+        parameters are then spread to the pixels by indexing. Without
+        textures, the result equals render_voronoi_image.
+
+        Args:
+            facets (List[np.ndarray]): Facets (fixed-point with shift fractional bits)
+            gray_generator (GrayValueGenerator): Grayscale value generator
+            textures (List[GrainTexture]): Textures applied in order
+            shift (int): Number of fractional bits of the facets
+            scale (float): Scale of the image relative to full resolution (textures are defined in full-resolution pixels)
+            full_pixels (Optional[int]): Number of pixels of the full-resolution canvas, for previews (see GrainMap)
+        """
+        wrapped_facets, pad = self.wrap_facets(facets, shift)
+        pieces_num = sum(len(polygons) for polygons in wrapped_facets)
+        pieces = np.full((self.height + 2 * pad, self.width + 2 * pad), pieces_num, dtype=np.int32)
+        piece_grains = np.empty(pieces_num + 1, dtype=np.int64)
+        piece_grains[-1] = len(wrapped_facets)  # Background
+        
+        grays = np.empty(len(wrapped_facets), dtype=np.float32)
+        piece = 0
+        for grain, polygons in enumerate(wrapped_facets):
+            grays[grain] = gray_generator.generate()
+            for polygon in polygons:
+                cv2.fillConvexPoly(pieces, polygon, (piece), shift=shift)
+                piece_grains[piece] = grain
+                piece += 1
         
-        return voronoi_image
+        grain_map = GrainMap(pieces, piece_grains, len(wrapped_facets), scale, full_pixels)
+        values = grain_map.per_pixel(grays)
+        for texture in textures:
+            texture.apply(values, grain_map)
+        voronoi_image = np.clip(np.rint(values), 0, 255).astype(np.uint8)[:, :, np.newaxis]
+        return self._crop_canvas(voronoi_image, pad)
     
     def render_voronoi_label(
         self, facets: List[np.ndarray],
         color: Tuple[int, int, int] = (255, 255, 255),
-        thickness: int = 2
+        thickness: int = 2,
+        shift: int = 0
     ) -> np.ndarray:
         """Render a label image by outlining the Voronoi regions"""
+        if self.executor is not None:
+            wrapped_facets, pad = self.wrap_facets(facets, shift, thickness)
+            polygons = [polygon for copies in wrapped_facets for polygon in copies]
+            
+            def outline(canvas: np.ndarray, selected: np.ndarray):
+                cv2.polylines(canvas, [polygons[k] for k in selected], isClosed=True, color=color, thickness=thickness, shift=shift)
+            
+            return self._crop_canvas(self._draw_bands(polygons, outline, pad, shift, thickness + 1), pad)
+        
+        if not self.periodic:
+            voronoi_label = self.create_initial_image()
+            cv2.polylines(voronoi_label, facets, isClosed=True, color=color, thickness=thickness, shift=shift)
+            return voronoi_label
+        
+        wrapped_facets, pad = self.wrap_facets(facets, shift, thickness)
+        voronoi_label = self._create_canvas(pad)
+        polygons = [polygon for copies in wrapped_facets for polygon in copies]
+        cv2.polylines(voronoi_label, polygons, isClosed=True, color=color, thickness=thickness, shift=shift)
+        return self._crop_canvas(voronoi_label, pad)
+    
+    def render_coverage_label(
+        self, facets: List[np.ndarray],
+        color: Tuple[int, int, int] = (255, 255, 255),
+        thickness: float = 2,
+        shift: int = 0,
+        samples: int = 8
+    ) -> np.ndarray:
+        """Render an anti-aliased label with the fraction of each pixel covered by the outlines
+
+        Outlines of width thickness (which may be fractional) are placed at
+        the sub-pixel position of fixed-point facets. Only the pixels they can
+        reach get their coverage computed (see CapsuleCoverage), so no
+        supersampled canvas is allocated.
+
+        Args:
+            facets (List[np.ndarray]): Facets (fixed-point with shift fractional bits)
+            color (Tuple[int, int, int]): Label value of fully covered pixels
+            thickness (float): Width of the outlines in pixels
+            shift (int): Number of fractional bits of the facets
+            samples (int): Number of subsamples per pixel side near vertices
+        """
+        wrapped_facets, pad = self.wrap_facets(facets, shift, math.ceil(thickness) + 1)
+        polygons = [polygon for copies in wrapped_facets for polygon in copies]
+        voronoi_label = self._create_canvas(pad)
+        
+        height, width = voronoi_label.shape[:2]
+        indices, coverage = CapsuleCoverage(thickness / 2, samples).compute(polygon_segments(polygons, shift), height, width)
+        voronoi_label.reshape(-1)[indices] = np.rint(coverage * color[0])
+        return self._crop_canvas(voronoi_label, pad)
+    
+    def render_boundary_label(
+        self, regions: np.ndarray,
+        color: Tuple[int, int, int] = (255, 255, 255),
+        thickness: int = 2
+    ) -> np.ndarray:
+        """Render a label image by outlining the regions of a region map (e.g. a volume section)
+
+        Pixels whose right or lower neighbour belongs to another region form a
+        1-pixel boundary, which is widened to the line thickness.
+        """
+        boundary = np.zeros(regions.shape[:2], dtype=np.uint8)
+        boundary[:, :-1] |= regions[:, :-1] != regions[:, 1:]
+        boundary[:-1, :] |= regions[:-1, :] != regions[1:, :]
+        if thickness > 1:
+            boundary = cv2.dilate(boundary, np.ones((thickness, thickness), dtype=np.uint8))
         voronoi_label = self.create_initial_image()
-        cv2.polylines(voronoi_label, facets, isClosed=True, color=color, thickness=thickness)
+        voronoi_label[boundary.astype(bool)] = color[0]
         return voronoi_label
     
     def draw_points(
@@ -0,0 +1,28 @@
+"""
+Helpers for seeding the random number generator per diagram
+"""
+
+import numpy as np
+
+
+def diagram_seed(seed: int, index: int) -> int:
+    """Derive a 32-bit seed for one diagram from the datatype seed and the diagram index
+
+    Args:
+        seed (int): Seed of the datatype (datatype_info.<datatype>.seed)
+        index (int): Index of the diagram within the datatype
+
+    Returns:
+        int: Seed that can be passed to np.random.seed
+    """
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+
+def seed_diagram(seed: int, index: int):
+    """Seed the global random number generator for one diagram
+
+    Unlike seeding once per datatype, the state of each diagram does not
+    depend on the diagrams generated before it, so diagrams can be
+    generated in any order or in different processes.
+    """
+    np.random.seed(diagram_seed(seed, index))
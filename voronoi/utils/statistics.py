@@ -0,0 +1,105 @@
+"""
+Classes related to grain size statistics
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+
+class GrainStatistics:
+    """Grain areas of a diagram, and the size distributions derived from them
+
+    Statistics are computed directly from the facets or from an instance
+    map, without rendering or image I/O. Grains cut by the measurement box
+    are excluded, as in measurements on cropped micrographs.
+
+    Attributes:
+        areas (np.ndarray): Areas of the grains in pixels
+    """
+
+    def __init__(self, areas: np.ndarray):
+        self.areas = np.asarray(areas, dtype=np.float64)
+
+    @classmethod
+    def from_facets(cls, facets: List[np.ndarray], box: Optional[Tuple[int, int, int, int]] = None) -> "GrainStatistics":
+        """Compute the areas of the facets lying inside a box (shoelace formula over all facets at once)
+
+        Args:
+            facets (List[np.ndarray]): Voronoi facets (vertices in (x, y) order)
+            box (Optional[Tuple[int, int, int, int]]): (left, top, right, bottom) measurement box (None: keep all facets)
+        """
+        if len(facets) == 0:
+            return cls(np.empty(0))
+        lengths = np.array([len(facet) for facet in facets])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        vertices = np.concatenate([np.asarray(facet).reshape(-1, 2) for facet in facets]).astype(np.float64)
+
+        # Next vertex of each vertex, wrapping around within its facet
+        following = np.arange(1, len(vertices) + 1)
+        following[starts + lengths - 1] = starts
+        x, y = vertices[:, 0], vertices[:, 1]
+        cross = x * y[following] - x[following] * y
+        areas = 0.5 * np.abs(np.add.reduceat(cross, starts))
+
+        if box is not None:
+            left, top, right, bottom = box
+            mins = np.minimum.reduceat(vertices, starts)
+            maxs = np.maximum.reduceat(vertices, starts)
+            inside = (mins[:, 0] >= left) & (mins[:, 1] >= top) & (maxs[:, 0] <= right) & (maxs[:, 1] <= bottom)
+            areas = areas[inside]
+        return cls(areas)
+
+    @classmethod
+    def from_instances(cls, instances: np.ndarray, exclude_border: bool = True,
+                       background: Optional[int] = None) -> "GrainStatistics":
+        """Compute the pixel areas of the grains of an instance map (non-negative grain index per pixel)
+
+        Args:
+            instances (np.ndarray): Instance map of shape (H, W)
+            exclude_border (bool): Whether to exclude grains touching the border of the map
+            background (Optional[int]): Index of background pixels to ignore
+        """
+        instances = instances.reshape(instances.shape[:2])
+        counts = np.bincount(instances.ravel())
+        keep = counts > 0
+        if exclude_border:
+            border = np.concatenate([instances[0], instances[-1], instances[:, 0], instances[:, -1]])
+            keep[border] = False
+        if background is not None and background < len(keep):
+            keep[background] = False
+        return cls(counts[keep])
+
+    @property
+    def count(self) -> int:
+        """Number of grains"""
+        return len(self.areas)
+
+    @property
+    def diameters(self) -> np.ndarray:
+        """Equivalent circle diameters of the grains in pixels"""
+        return np.sqrt(4 * self.areas / np.pi)
+
+    def merge(self, other: "GrainStatistics") -> "GrainStatistics":
+        """Pool the grains of two diagrams"""
+        return GrainStatistics(np.concatenate([self.areas, other.areas]))
+
+    def histogram(self, bins) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the histogram of the equivalent diameters (see np.histogram for bins)"""
+        return np.histogram(self.diameters, bins=bins)
+
+    def summary(self) -> Dict[str, float]:
+        """Get the count, mean area and the mean, standard deviation and quartiles of the equivalent diameters"""
+        if self.count == 0:
+            return {"count": 0, "mean_area": float("nan"), "mean_diameter": float("nan"), "std_diameter": float("nan"),
+                    "q1_diameter": float("nan"), "median_diameter": float("nan"), "q3_diameter": float("nan")}
+        diameters = self.diameters
+        q1, median, q3 = np.percentile(diameters, [25, 50, 75])
+        return {
+            "count": self.count,
+            "mean_area": float(self.areas.mean()),
+            "mean_diameter": float(diameters.mean()),
+            "std_diameter": float(diameters.std()),
+            "q1_diameter": float(q1),
+            "median_diameter": float(median),
+            "q3_diameter": float(q3),
+        }
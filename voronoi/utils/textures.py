@@ -0,0 +1,150 @@
+"""
+Classes related to per-grain texture and intensity models
+"""
+
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from .base import GrainTexture, skip_normal
+
+
+class GrainMap:
+    """Per-pixel grain index of a rendered diagram, and the coordinates textures are evaluated on
+
+    Pixels are indexed by piece: a facet, or one of its wrapped copies in a
+    periodic diagram. Pieces map to grains, so per-grain parameters are
+    shared by all copies while positions (e.g. centroids) stay per copy.
+
+    Attributes:
+        pieces (np.ndarray): Piece index of every pixel, of shape (H, W) (background pixels are len(piece_grains) - 1)
+        piece_grains (np.ndarray): Grain index of every piece (grains_num for the background)
+        grains_num (int): Number of grains
+        y (np.ndarray): Row coordinates of shape (H, 1) in full-resolution pixels
+        x (np.ndarray): Column coordinates of shape (1, W) in full-resolution pixels
+        full_pixels (int): Number of pixels of the full-resolution grain map (per-pixel draws of previews are advanced to it)
+    """
+
+    def __init__(self, pieces: np.ndarray, piece_grains: np.ndarray, grains_num: int, scale: float = 1.0,
+                 full_pixels: Optional[int] = None):
+        self.pieces = pieces
+        self.piece_grains = piece_grains
+        self.grains_num = grains_num
+        self.full_pixels = pieces.size if full_pixels is None else full_pixels
+        height, width = pieces.shape
+        self.y = (np.arange(height, dtype=np.float32) / scale)[:, np.newaxis]
+        self.x = (np.arange(width, dtype=np.float32) / scale)[np.newaxis, :]
+        self._centroids = None
+
+    def piece_table(self, values: np.ndarray) -> np.ndarray:
+        """Spread per-grain values of shape (grains_num,) to the pieces (0 for the background)"""
+        return np.append(np.asarray(values, dtype=np.float32), np.float32(0))[self.piece_grains]
+
+    def gather(self, table: np.ndarray) -> np.ndarray:
+        """Spread per-piece values to the pixels"""
+        return table[self.pieces]
+
+    def per_pixel(self, values: np.ndarray) -> np.ndarray:
+        """Spread per-grain values of shape (grains_num,) to the pixels (0 on the background)"""
+        return self.gather(self.piece_table(values))
+
+    def centroids(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the (y, x) centroids of the pieces in full-resolution pixels
+
+        Sums are taken over the runs of equal pieces along the rows rather
+        than over single pixels.
+        """
+        if self._centroids is None:
+            height, width = self.pieces.shape
+            flat = self.pieces.ravel()
+            change = np.empty(flat.size, dtype=bool)
+            change[0] = True
+            np.not_equal(flat[1:], flat[:-1], out=change[1:])
+            change[::width] = True
+            starts = np.flatnonzero(change)
+            lengths = np.diff(np.append(starts, flat.size)).astype(np.float64)
+            rows, columns = np.divmod(starts, width)
+
+            pieces, pieces_num = flat[starts], len(self.piece_grains)
+            counts = np.maximum(np.bincount(pieces, weights=lengths, minlength=pieces_num), 1)
+            row_sums = np.bincount(pieces, weights=lengths * rows, minlength=pieces_num)
+            column_sums = np.bincount(pieces, weights=lengths * columns + lengths * (lengths - 1) / 2, minlength=pieces_num)
+            scale = float(self.x[0, 1]) if width > 1 else 1.0
+            self._centroids = ((row_sums / counts * scale).astype(np.float32),
+                               (column_sums / counts * scale).astype(np.float32))
+        return self._centroids
+
+
+class GradientTexture(GrainTexture):
+    """Linear intensity gradient across each grain (random direction and slope, zero at the centroid)"""
+
+    def __init__(self, min_slope: float = 0.0, max_slope: float = 0.1):
+        self.min_slope = min_slope
+        self.max_slope = max_slope
+
+    def apply(self, values: np.ndarray, grain_map: GrainMap):
+        angle = np.random.uniform(0, 2 * np.pi, grain_map.grains_num)
+        slope = np.random.uniform(self.min_slope, self.max_slope, grain_map.grains_num)
+        slope_x = grain_map.piece_table(slope * np.cos(angle))
+        slope_y = grain_map.piece_table(slope * np.sin(angle))
+        center_y, center_x = grain_map.centroids()
+        values += grain_map.gather(slope_x) * grain_map.x
+        values += grain_map.gather(slope_y) * grain_map.y
+        values -= grain_map.gather(slope_x * center_x + slope_y * center_y)
+
+
+class StripeTexture(GrainTexture):
+    """Orientation-dependent contrast: sinusoidal stripes with a random orientation, period and amplitude per grain"""
+
+    def __init__(self, min_amplitude: float = 0.0, max_amplitude: float = 10.0,
+                 min_period: float = 8.0, max_period: float = 32.0):
+        self.min_amplitude = min_amplitude
+        self.max_amplitude = max_amplitude
+        self.min_period = min_period
+        self.max_period = max_period
+
+    def apply(self, values: np.ndarray, grain_map: GrainMap):
+        orientation = np.random.uniform(0, np.pi, grain_map.grains_num)
+        amplitude = np.random.uniform(self.min_amplitude, self.max_amplitude, grain_map.grains_num)
+        frequency = 2 * np.pi / np.random.uniform(self.min_period, self.max_period, grain_map.grains_num)
+        phase = np.random.uniform(0, 2 * np.pi, grain_map.grains_num)
+        frequency_x = grain_map.piece_table(frequency * np.cos(orientation))
+        frequency_y = grain_map.piece_table(frequency * np.sin(orientation))
+        center_y, center_x = grain_map.centroids()
+        angle = grain_map.gather(frequency_x) * grain_map.x
+        angle += grain_map.gather(frequency_y) * grain_map.y
+        angle += grain_map.gather(grain_map.piece_table(phase) - frequency_x * center_x - frequency_y * center_y)
+        values += grain_map.per_pixel(amplitude) * np.sin(angle)
+
+
+class NoiseTexture(GrainTexture):
+    """Gaussian noise whose standard deviation is drawn per grain"""
+
+    def __init__(self, min_std: float = 0.0, max_std: float = 10.0):
+        self.min_std = min_std
+        self.max_std = max_std
+
+    def apply(self, values: np.ndarray, grain_map: GrainMap):
+        std = np.random.uniform(self.min_std, self.max_std, grain_map.grains_num)
+        noise = np.random.standard_normal(values.shape).astype(np.float32)
+        skip_normal(grain_map.full_pixels - values.size)  # Draws of the full-resolution pixels a preview leaves out
+        values += grain_map.per_pixel(std) * noise
+
+
+class TextureFactory:
+    """Factory class for creating grain textures"""
+
+    def __init__(self):
+        self._textures = {
+            "gradient": GradientTexture,
+            "stripes": StripeTexture,
+            "noise": NoiseTexture,
+        }
+
+    def create_texture(self, texture_type: str, **params) -> GrainTexture:
+        """Dynamically create a grain texture"""
+        if texture_type not in self._textures:
+            raise ValueError(f"Unknown texture: {texture_type}")
+        return self._textures[texture_type](**params)
+
+    def create_textures(self, texture_configs: List[Dict[str, Any]]) -> List[GrainTexture]:
+        """Create the textures of an image_info.texture list"""
+        return [self.create_texture(t["type"], **t.get("params", {})) for t in texture_configs]
@@ -0,0 +1,104 @@
+"""
+Classes related to vector (polygon) storage of Voronoi diagrams
+"""
+
+import io
+import numpy as np
+from typing import List, Sequence, Tuple
+from .base import GrayValueGenerator
+
+
+class ReplayGrayGenerator(GrayValueGenerator):
+    """Grayscale value generator returning stored values in order (the gray values of a vector diagram)"""
+
+    def __init__(self, grays: Sequence[int]):
+        self.grays = grays
+        self._next = 0
+
+    def generate(self) -> int:
+        if self._next >= len(self.grays):
+            raise ValueError("All stored gray values have been used")
+        gray = int(self.grays[self._next])
+        self._next += 1
+        return gray
+
+
+class VectorDiagram:
+    """Geometry and random draws of a diagram, from which its image and label can be rasterized
+
+    A diagram is fully described by its facets, the gray value of each
+    facet and the state of the global random generator after the gray
+    values were drawn (textures and post-processors draw from it). Vertices
+    are stored as differences of consecutive fixed-point vertices, which
+    compress to a few bytes each, so a diagram takes tens of KB instead of
+    the megabytes of its rasterized tiles.
+
+    Attributes:
+        width (int): Width of the diagram
+        height (int): Height of the diagram
+        shift (int): Number of fractional bits of the facets
+        facets (List[np.ndarray]): Facets (fixed-point with shift fractional bits, see VoronoiCalculator)
+        grays (np.ndarray): uint8 gray value of each facet
+        rng_state (Tuple): Legacy global random state (np.random.get_state) after the gray values were drawn
+    """
+
+    def __init__(self, width: int, height: int, shift: int, facets: List[np.ndarray], grays: np.ndarray, rng_state: Tuple):
+        self.width = width
+        self.height = height
+        self.shift = shift
+        self.facets = facets
+        self.grays = grays
+        self.rng_state = rng_state
+
+    def gray_generator(self) -> ReplayGrayGenerator:
+        """Get a generator replaying the gray values in facet order"""
+        return ReplayGrayGenerator(self.grays)
+
+    def save(self, path: str) -> str:
+        """Save the diagram as a compressed .npz file (the extension is appended if missing)
+
+        Returns:
+            str: Path of the saved file
+        """
+        if not path.endswith(".npz"):
+            path += ".npz"
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+        return path
+
+    def to_bytes(self) -> bytes:
+        """Encode the diagram as the bytes of a compressed .npz file"""
+        lengths = np.array([len(facet) for facet in self.facets], dtype=np.int32)
+        vertices = np.concatenate(self.facets).reshape(-1, 2).astype(np.int32) if len(self.facets) else np.empty((0, 2), dtype=np.int32)
+        deltas = np.diff(vertices, axis=0, prepend=np.zeros((1, 2), dtype=np.int32))
+        _, keys, position, has_gauss, cached_gaussian = self.rng_state
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer, size=np.array([self.width, self.height, self.shift], dtype=np.int32),
+            lengths=lengths, deltas=deltas, grays=self.grays.astype(np.uint8),
+            rng_keys=np.asarray(keys, dtype=np.uint32),
+            rng_position=np.array([position, has_gauss], dtype=np.int32), rng_gauss=np.array(cached_gaussian, dtype=np.float64)
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def load(cls, path: str) -> "VectorDiagram":
+        """Load a diagram saved with save"""
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "VectorDiagram":
+        """Decode a diagram encoded with to_bytes"""
+        with np.load(io.BytesIO(data)) as npz:
+            width, height, shift = (int(value) for value in npz["size"])
+            lengths = npz["lengths"]
+            vertices = np.cumsum(npz["deltas"], axis=0, dtype=np.int32)
+            facets = np.split(vertices, np.cumsum(lengths)[:-1]) if len(lengths) else []
+            position, has_gauss = (int(value) for value in npz["rng_position"])
+            rng_state = ("MT19937", npz["rng_keys"], position, has_gauss, float(npz["rng_gauss"]))
+            return cls(width, height, shift, facets, npz["grays"], rng_state)
+
+    def restore_rng(self):
+        """Set the global random state to the one stored with the diagram (textures and post-processors draw from it)"""
+        np.random.set_state(self.rng_state)
@@ -0,0 +1,244 @@
+"""
+Classes related to 3D Voronoi volumes and their planar sections
+"""
+
+import math
+import itertools
+import numpy as np
+from typing import Dict, Any, Iterator, Optional, Sequence, Tuple
+from .gray_generators import GrayValueFactory
+from .renderers import ImageRenderer
+from .processors import ImagePipeline
+from .assignment import NearestSeedAssigner
+from .weights import UNetWeightMap
+
+
+def random_points_3d(depth: int, height: int, width: int, points_num: int) -> np.ndarray:
+    """Uniformly random integer seed points of shape (N, 3) in (z, y, x) order"""
+    return np.random.randint(0, [depth, height, width], (points_num, 3))
+
+
+def poisson_disk_points_3d(depth: int, height: int, width: int, min_distance: float, max_attempts: int) -> np.ndarray:
+    """Poisson disk sampling in a box
+
+    Uses the same dart throwing rule as PoissonDiskPointGenerator (stop after
+    max_attempts consecutive rejections), with neighbours looked up in a
+    background grid whose cells hold at most one point.
+
+    Returns:
+        np.ndarray: Integer points of shape (N, 3) in (z, y, x) order
+    """
+    shape = np.array([depth, height, width])
+    cell = min_distance / math.sqrt(3)
+    grid_shape = np.ceil(shape / cell).astype(int)
+    reach = math.ceil(min_distance / cell)
+    offsets = np.array(list(itertools.product(range(-reach, reach + 1), repeat=3)))
+
+    # The grid is padded by reach cells so that neighbour lookups need no bounds checks
+    grid = np.full(grid_shape + 2 * reach, -1, dtype=np.int64)
+    points = np.empty((int(np.prod(grid_shape)), 3), dtype=int)
+    points_num = 0
+    attempts = 0
+    min_distance_squared = min_distance ** 2
+
+    while attempts < max_attempts:
+        new_point = np.random.randint(0, shape, 3)
+        cells = (new_point / cell).astype(int) + reach + offsets
+        neighbors = grid[cells[:, 0], cells[:, 1], cells[:, 2]]
+        neighbors = neighbors[neighbors >= 0]
+        if len(neighbors) > 0 and np.any(np.sum((points[neighbors] - new_point) ** 2, axis=1) < min_distance_squared):
+            attempts += 1
+            continue
+        grid[tuple((new_point / cell).astype(int) + reach)] = points_num
+        points[points_num] = new_point
+        points_num += 1
+        attempts = 0
+
+    return points[:points_num].copy()
+
+
+class VoronoiVolume:
+    """A 3D Voronoi volume labelled with the index of the nearest seed of every voxel
+
+    Attributes:
+        labels (np.ndarray): Seed index of every voxel, of shape (D, H, W) (usually memory-mapped)
+        seeds (np.ndarray): Seed points of shape (N, 3) in (z, y, x) order
+        grays (np.ndarray): Grayscale value of every grain, of shape (N,)
+    """
+
+    def __init__(self, labels: np.ndarray, seeds: np.ndarray, grays: np.ndarray):
+        self.labels = labels
+        self.seeds = seeds
+        self.grays = grays
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.labels.shape
+
+    def z_section(self, z: int) -> np.ndarray:
+        """Get the grain map of the horizontal section at depth z"""
+        return np.asarray(self.labels[z])
+
+    def section(self, center: Sequence[float], normal: Sequence[float], chunk_rows: int = 256) -> np.ndarray:
+        """Get the grain map of an oblique planar section
+
+        The section has the height and width of the volume. Its columns follow
+        the projection of the x axis on the plane, and each pixel takes the
+        label of the nearest voxel (clamped to the volume faces).
+
+        Args:
+            center (Sequence[float]): Center of the section (z, y, x)
+            normal (Sequence[float]): Normal of the plane (z, y, x)
+            chunk_rows (int): Number of rows gathered at once (bounds the memory of the index arrays)
+
+        Returns:
+            np.ndarray: Grain map of shape (H, W)
+        """
+        depth, height, width = self.shape
+        normal = np.asarray(normal, dtype=np.float64)
+        normal /= np.linalg.norm(normal)
+        column_axis = np.array([0.0, 0.0, 1.0]) - normal[2] * normal
+        if np.linalg.norm(column_axis) < 1e-9:
+            column_axis = np.array([0.0, 1.0, 0.0]) - normal[1] * normal
+        column_axis /= np.linalg.norm(column_axis)
+        row_axis = np.cross(normal, column_axis)
+        if row_axis[1] < 0:
+            row_axis = -row_axis
+
+        section = np.empty((height, width), dtype=self.labels.dtype)
+        columns = np.arange(width) - (width - 1) / 2
+        for top in range(0, height, chunk_rows):
+            rows = np.arange(top, min(top + chunk_rows, height)) - (height - 1) / 2
+            coordinates = (np.asarray(center)[:, np.newaxis, np.newaxis]
+                           + rows[np.newaxis, :, np.newaxis] * row_axis[:, np.newaxis, np.newaxis]
+                           + columns[np.newaxis, np.newaxis, :] * column_axis[:, np.newaxis, np.newaxis])
+            indices = [np.clip(np.rint(c), 0, size - 1).astype(np.intp) for c, size in zip(coordinates, self.shape)]
+            section[top:top + len(rows)] = self.labels[indices[0], indices[1], indices[2]]
+        return section
+
+
+class VoronoiVolumeGenerator:
+    """Class for generating 3D Voronoi volumes and streaming 2D sections through them
+
+    A volume is labelled once (slab by slab into a memory-mapped array) and
+    yields many sections, which are rendered and post-processed like 2D
+    diagrams. Every grain keeps one grayscale value across all sections.
+
+    Attributes:
+        width (int): Width of the volume (and of the sections)
+        height (int): Height of the volume (and of the sections)
+        depth (int): Depth of the volume
+        max_tilt (float): Maximum tilt of the sections from the horizontal, in degrees (0 for z-sections only)
+        method (str): Seed point generation method ('random' or 'poisson_disk')
+        label_info (Dict): Label rendering settings
+        gray_generator (GrayValueGenerator): Grayscale value generator
+        assigner (NearestSeedAssigner): Chunked nearest-seed labelling
+        image_renderer (ImageRenderer): Image renderer
+        image_pipeline (ImagePipeline): Image post-processing pipeline
+        weight_map (Optional[UNetWeightMap]): Loss weight map computed from the labels (config "output.weight_map")
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.width = config["width"]
+        self.height = config["height"]
+        volume_config = config["volume"]
+        self.depth = volume_config["depth"]
+        self.max_tilt = volume_config.get("max_tilt", 0)
+        self.method = config["point_generation"]["method"]
+
+        # Sections are labelled from voxel regions, which have no sub-pixel outlines
+        self.label_info = {k: v for k, v in config.get("label_info", {}).items() if k not in ["mode", "samples"]}
+        image_info = config["image_info"]
+        self.gray_generator = GrayValueFactory().create_generator(
+            image_info["method"],
+            **image_info.get("params", {})
+        )
+
+        self.assigner = NearestSeedAssigner(volume_config.get("block", (8, 16, 16)))
+        self.image_renderer = ImageRenderer(self.width, self.height)
+        self.image_pipeline = ImagePipeline(config)
+        weight_config = config.get("output", {}).get("weight_map")
+        self.weight_map = UNetWeightMap(**weight_config) if weight_config is not None else None
+
+    def generate_seeds(self, **kwargs) -> np.ndarray:
+        """Generate 3D seed points
+
+        Args:
+            **kwargs: Dynamic parameters for seed point generation
+                - For random generation: points_num (seeds in the volume)
+                - For Poisson disk sampling: min_distance, max_attempts (in 3D)
+        """
+        if self.method == "random":
+            return random_points_3d(self.depth, self.height, self.width, kwargs["points_num"])
+        return poisson_disk_points_3d(self.depth, self.height, self.width, kwargs["min_distance"], kwargs["max_attempts"])
+
+    def generate_volume(self, path: Optional[str] = None, **kwargs) -> VoronoiVolume:
+        """Generate a labelled 3D Voronoi volume
+
+        Args:
+            path (Optional[str]): .npy file the labels are memory-mapped to (None keeps them in memory)
+            **kwargs: Dynamic parameters for seed point generation (see generate_seeds)
+
+        Returns:
+            VoronoiVolume: The volume
+        """
+        seeds = self.generate_seeds(**kwargs)
+        grays = np.array([self.gray_generator.generate() for _ in range(len(seeds))], dtype=np.uint8)
+
+        shape = (self.depth, self.height, self.width)
+        dtype = np.uint16 if len(seeds) <= np.iinfo(np.uint16).max + 1 else np.uint32
+        if path is None:
+            labels = np.empty(shape, dtype=dtype)
+        else:
+            labels = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        self.assigner.assign(seeds, labels)
+        if path is not None:
+            labels.flush()
+        return VoronoiVolume(labels, seeds, grays)
+
+    def sample_section(self, volume: VoronoiVolume) -> np.ndarray:
+        """Get the grain map of a random section (z-section, or oblique up to max_tilt)"""
+        depth = volume.shape[0]
+        if self.max_tilt == 0:
+            return volume.z_section(np.random.randint(depth))
+
+        tilt = math.radians(np.random.uniform(0, self.max_tilt))
+        azimuth = np.random.uniform(0, 2 * math.pi)
+        normal = (math.cos(tilt), math.sin(tilt) * math.sin(azimuth), math.sin(tilt) * math.cos(azimuth))
+
+        # Keep the plane inside the volume when it fits (it spans at most this far in z)
+        extent = math.sin(tilt) * math.hypot(self.height - 1, self.width - 1) / 2
+        if 2 * extent <= depth - 1:
+            z = np.random.uniform(extent, depth - 1 - extent)
+        else:
+            z = (depth - 1) / 2
+        return volume.section((z, (self.height - 1) / 2, (self.width - 1) / 2), normal)
+
+    def render_section(self, volume: VoronoiVolume, regions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Render and post-process a section given its grain map
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label)
+        """
+        voronoi_label = self.image_renderer.render_boundary_label(regions, **self.label_info)
+        voronoi_image = volume.grays[regions][:, :, np.newaxis]
+        return self.image_pipeline.process(voronoi_image, voronoi_label)
+
+    def generate_sections(self, volume: VoronoiVolume, num: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Stream random sections of a volume
+
+        Args:
+            volume (VoronoiVolume): The volume
+            num (int): Number of sections
+
+        Yields:
+            Tuple[np.ndarray, np.ndarray]: A tuple of (image, label) per section
+        """
+        for _ in range(num):
+            yield self.render_section(volume, self.sample_section(volume))
+
+    def generate_weights(self, label: np.ndarray) -> Optional[np.ndarray]:
+        """Compute the loss weight map of a section label (None if output.weight_map is not configured)"""
+        if self.weight_map is None:
+            return None
+        return self.weight_map.compute(label)
@@ -0,0 +1,129 @@
+"""
+Classes related to U-Net loss weight maps
+"""
+
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+
+class UNetWeightMap:
+    """Class-balanced, distance-based weight map of a boundary label (Ronneberger et al., 2015)
+
+    w(x) = w_c(x) + w0 * exp(-(d1(x) + d2(x))^2 / (2 * sigma^2))
+
+    where w_c balances the boundary and grain classes, and d1 and d2 are the
+    distances to the nearest and second nearest grains. Grains are the
+    4-connected regions between boundaries, or the given instance map.
+    Distances are computed with cv2.distanceTransform on a window around
+    each grain, cut off where the border term has vanished (d > 4 sigma).
+    Weight maps should be computed on the full canvas before splitting, so
+    that tiles do not get spurious weights along their edges.
+
+    Attributes:
+        w0 (float): Weight of the border term
+        sigma (float): Width of the border term in pixels
+        class_balance (bool): Whether to balance the class frequencies (otherwise w_c = 1)
+        periodic (bool): Whether labels are periodic (distances wrap around the edges)
+    """
+
+    def __init__(self, w0: float = 10.0, sigma: float = 5.0, class_balance: bool = True, periodic: bool = False):
+        self.w0 = w0
+        self.sigma = sigma
+        self.class_balance = class_balance
+        self.periodic = periodic
+
+    def compute(self, label: np.ndarray, instances: Optional[np.ndarray] = None) -> np.ndarray:
+        """Compute the weight map of a label
+
+        Args:
+            label (np.ndarray): Boundary label of shape (H, W, 1) or (H, W) (non-zero on boundaries)
+            instances (Optional[np.ndarray]): Grain index of every pixel of shape (H, W) (negative on boundaries)
+
+        Returns:
+            np.ndarray: float16 weight map of shape (H, W, 1)
+        """
+        boundary = label.reshape(label.shape[:2]) != 0
+        weights = self._class_weights(boundary)
+        if self.w0 != 0:
+            if self.periodic:
+                # Measure distances on a wrapped canvas and cut the original back out
+                pad = int(np.ceil(4 * self.sigma)) + 1
+                wrap = lambda array: cv2.copyMakeBorder(array, pad, pad, pad, pad, cv2.BORDER_WRAP)
+                padded = None if instances is None else wrap(instances.astype(np.int32))
+                border = self._border_term(wrap(boundary.view(np.uint8)).view(bool), padded)[pad:-pad, pad:-pad]
+            else:
+                border = self._border_term(boundary, instances)
+            weights += np.float32(self.w0) * border
+        return weights.astype(np.float16)[:, :, np.newaxis]
+
+    def _border_term(self, boundary: np.ndarray, instances: Optional[np.ndarray]) -> np.ndarray:
+        """Get exp(-(d1 + d2)^2 / (2 * sigma^2)) for every pixel"""
+        if instances is None:
+            _, instances, stats, _ = cv2.connectedComponentsWithStats((~boundary).view(np.uint8), connectivity=4)
+            boxes = [(x, y, x + w, y + h) for x, y, w, h in stats[1:, :4].tolist()]
+            first = 1  # Component 0 is the boundary
+        else:
+            instances = np.where(boundary, -1, instances).astype(np.int32)
+            boxes = self._bounding_boxes(instances)
+            first = 0
+        if len(boxes) < 2:
+            return np.zeros(boundary.shape, dtype=np.float32)
+        nearest, second = self._grain_distances(instances, boxes, first)
+        return np.exp(-(nearest + second) ** 2 / np.float32(2 * self.sigma ** 2))
+
+    def _class_weights(self, boundary: np.ndarray) -> np.ndarray:
+        """Get the class weights (each class gets half of the total weight)"""
+        weights = np.ones(boundary.shape, dtype=np.float32)
+        if self.class_balance:
+            fraction = boundary.mean()
+            if 0 < fraction < 1:
+                weights[boundary] = 0.5 / fraction
+                weights[~boundary] = 0.5 / (1 - fraction)
+        return weights
+
+    def _grain_distances(self, instances: np.ndarray, boxes, first: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the distances to the nearest and second nearest grains, cut off at 4 sigma"""
+        height, width = instances.shape
+        cutoff = np.float32(4 * self.sigma)
+        reach = int(np.ceil(cutoff))
+        nearest = np.full(instances.shape, cutoff, dtype=np.float32)
+        second = np.full(instances.shape, cutoff, dtype=np.float32)
+
+        for grain, (x0, y0, x1, y1) in enumerate(boxes, first):
+            top, bottom = max(y0 - reach, 0), min(y1 + reach, height)
+            left, right = max(x0 - reach, 0), min(x1 + reach, width)
+            outside = (instances[top:bottom, left:right] != grain).view(np.uint8)
+            distance = cv2.distanceTransform(outside, cv2.DIST_L2, cv2.DIST_MASK_5)
+
+            # Insert the distance to this grain into the two smallest distances so far
+            nearest_window = nearest[top:bottom, left:right]
+            second_window = second[top:bottom, left:right]
+            closer = distance < nearest_window
+            np.copyto(second_window, np.where(closer, nearest_window, np.minimum(second_window, distance)))
+            np.minimum(nearest_window, distance, out=nearest_window)
+        return nearest, second
+
+    def _bounding_boxes(self, instances: np.ndarray):
+        """Get the (left, top, right, bottom) box of every grain index from 0 to the maximum (from the runs along the rows)"""
+        height, width = instances.shape
+        flat = instances.ravel()
+        change = np.empty(flat.size, dtype=bool)
+        change[0] = True
+        np.not_equal(flat[1:], flat[:-1], out=change[1:])
+        change[::width] = True
+        starts = np.flatnonzero(change)
+        ends = np.append(starts[1:], flat.size)
+        values = flat[starts]
+        valid = values >= 0
+        starts, ends, values = starts[valid], ends[valid], values[valid]
+        rows, columns = np.divmod(starts, width)
+
+        grains_num = int(values.max()) + 1 if len(values) else 0
+        boxes = np.zeros((grains_num, 4), dtype=np.int64)
+        boxes[:, 0], boxes[:, 1] = width, height
+        np.minimum.at(boxes[:, 0], values, columns)
+        np.minimum.at(boxes[:, 1], values, rows)
+        np.maximum.at(boxes[:, 2], values, columns + (ends - starts))
+        np.maximum.at(boxes[:, 3], values, rows + 1)
+        return [tuple(box) for box in boxes.tolist()]
@@ -1,7 +1,9 @@
 import yaml
 import os
+import math
 from typing import Dict, Any, List, Union
 import sys
+from utils.label_codecs import LABEL_FORMATS
 
 class VoronoiConfigValidator:
     """Class for validating Voronoi diagram generation configuration files"""
@@ -26,9 +28,21 @@ class VoronoiConfigValidator:
         self._validate_basic_settings(voronoi_config)
         self._validate_point_generation(voronoi_config)
         self._validate_image_info(voronoi_config)
+        if "label_info" in voronoi_config:
+            self._validate_label_info(voronoi_config)
         self._validate_post_processors(voronoi_config)
         self._validate_datatype_info(voronoi_config)
         self._validate_split_settings(voronoi_config)
+        if "volume" in voronoi_config:
+            self._validate_volume_settings(voronoi_config)
+        if "output" in voronoi_config:
+            self._validate_output_settings(voronoi_config)
+        if "parallel" in voronoi_config:
+            self._validate_parallel_settings(voronoi_config)
+        if "qa" in voronoi_config:
+            self._validate_qa_settings(voronoi_config)
+        if "laguerre" in voronoi_config:
+            self._validate_laguerre_settings(voronoi_config)
         
         return len(self.errors) == 0
     
@@ -51,6 +65,19 @@ class VoronoiConfigValidator:
             self.errors.append("'output_dir' is required")
         elif not isinstance(config["output_dir"], str):
             self.errors.append("'output_dir' must be a string")
+        
+        # seeding (optional)
+        if "seeding" in config and config["seeding"] not in ["sequential", "per_diagram"]:
+            self.errors.append("'seeding' must be 'sequential' or 'per_diagram'")
+        
+        # periodic (optional)
+        if "periodic" in config:
+            if not isinstance(config["periodic"], bool):
+                self.errors.append("'periodic' must be a boolean")
+            elif config["periodic"]:
+                for processor_type in ["crop", "brightness_gradient"]:
+                    if any(p.get("type") == processor_type for p in config.get("post_processors", []) if isinstance(p, dict)):
+                        self.warnings.append(f"'{processor_type}' removes the periodicity of periodic diagrams")
     
     def _validate_point_generation(self, config: Dict[str, Any]):
         """Validate point generation settings"""
@@ -92,7 +119,36 @@ class VoronoiConfigValidator:
                 if "max_attempts" in params:
                     if not isinstance(params["max_attempts"], int) or params["max_attempts"] <= 0:
                         self.errors.append("'max_attempts' must be a positive integer")
+                
+                if "bank" in params:
+                    self._validate_point_bank(params["bank"])
+        
+    def _validate_point_bank(self, bank: Dict[str, Any]):
+        """Validate Poisson disk point-set bank settings"""
+        if not isinstance(bank, dict):
+            self.errors.append("'bank' must be a dictionary")
+            return
         
+        if "size" in bank:
+            if not isinstance(bank["size"], int) or bank["size"] <= 0:
+                self.errors.append("'bank.size' must be a positive integer")
+        
+        if "path" in bank:
+            if bank["path"] is not None and not isinstance(bank["path"], str):
+                self.errors.append("'bank.path' must be a string")
+        
+        if "max_uses" in bank:
+            if bank["max_uses"] is not None and (not isinstance(bank["max_uses"], int) or bank["max_uses"] <= 0):
+                self.errors.append("'bank.max_uses' must be a positive integer or null")
+        
+        if "seed" in bank:
+            if not isinstance(bank["seed"], int):
+                self.errors.append("'bank.seed' must be an integer")
+        
+        unknown = set(bank) - {"size", "path", "max_uses", "seed"}
+        if unknown:
+            self.errors.append(f"Unknown 'bank' settings: {sorted(unknown)}")
+    
     def _validate_image_info(self, config: Dict[str, Any]):
         """Validate image information"""
         if "image_info" not in config:
@@ -122,6 +178,90 @@ class VoronoiConfigValidator:
                     self.errors.append("'std' is required for 'gaussian' method")
                 elif not isinstance(params["std"], (int, float)) or params["std"] <= 0:
                     self.errors.append("'std' must be a positive number")
+        
+        # texture (optional)
+        if "texture" in image_config:
+            self._validate_textures(image_config["texture"])
+    
+    def _validate_textures(self, textures: Any):
+        """Validate per-grain textures"""
+        if not isinstance(textures, list):
+            self.errors.append("'image_info.texture' must be a list")
+            return
+        
+        valid_params = {
+            "gradient": [("min_slope", "max_slope")],
+            "stripes": [("min_amplitude", "max_amplitude"), ("min_period", "max_period")],
+            "noise": [("min_std", "max_std")],
+        }
+        for i, texture in enumerate(textures):
+            if not isinstance(texture, dict):
+                self.errors.append(f"image_info.texture[{i}] must be a dictionary")
+                continue
+            if "type" not in texture:
+                self.errors.append(f"image_info.texture[{i}].type is required")
+                continue
+            if texture["type"] not in valid_params:
+                self.errors.append(f"image_info.texture[{i}].type must be one of {list(valid_params)}")
+                continue
+            
+            params = texture.get("params", {})
+            if not isinstance(params, dict):
+                self.errors.append(f"image_info.texture[{i}].params must be a dictionary")
+                continue
+            names = [name for pair in valid_params[texture["type"]] for name in pair]
+            for key in params:
+                if key not in names:
+                    self.errors.append(f"image_info.texture[{i}].params.{key} is not a valid parameter for '{texture['type']}'")
+            for name in names:
+                if name in params and (not isinstance(params[name], (int, float)) or params[name] < 0):
+                    self.errors.append(f"image_info.texture[{i}].params.{name} must be a non-negative number")
+            for low, high in valid_params[texture["type"]]:
+                if isinstance(params.get(low), (int, float)) and isinstance(params.get(high), (int, float)) and params[low] > params[high]:
+                    self.errors.append(f"image_info.texture[{i}].params.{low} must be less than or equal to {high}")
+            if texture["type"] == "stripes" and any(isinstance(params.get(name), (int, float)) and params[name] == 0 for name in ("min_period", "max_period")):
+                self.errors.append(f"image_info.texture[{i}].params.min_period and max_period must be positive")
+    
+    def _validate_label_info(self, config: Dict[str, Any]):
+        """Validate label rendering settings"""
+        label_config = config["label_info"]
+        if not isinstance(label_config, dict):
+            self.errors.append("'label_info' must be a dictionary")
+            return
+        
+        mode = label_config.get("mode", "binary")
+        if mode not in ["binary", "coverage"]:
+            self.errors.append("'label_info.mode' must be 'binary' or 'coverage'")
+        
+        if "color" in label_config:
+            color = label_config["color"]
+            if not isinstance(color, (list, tuple)) or len(color) != 3 or not all(isinstance(c, int) and 0 <= c <= 255 for c in color):
+                self.errors.append("'label_info.color' must be a list of 3 integers between 0-255")
+        
+        if "thickness" in label_config:
+            thickness = label_config["thickness"]
+            if mode == "coverage":
+                if not isinstance(thickness, (int, float)) or thickness <= 0:
+                    self.errors.append("'label_info.thickness' must be a positive number")
+            elif not isinstance(thickness, int) or thickness <= 0:
+                self.errors.append("'label_info.thickness' must be a positive integer ('binary' mode)")
+        
+        if "samples" in label_config:
+            if not isinstance(label_config["samples"], int) or not (1 <= label_config["samples"] <= 32):
+                self.errors.append("'label_info.samples' must be an integer between 1-32")
+            elif mode != "coverage":
+                self.warnings.append("'label_info.samples' is only used with 'label_info.mode: coverage'")
+        
+        if mode == "coverage":
+            output_config = config.get("output", {})
+            if isinstance(output_config, dict) and output_config.get("label_format", "png") != "png":
+                self.errors.append("'label_info.mode: coverage' requires 'output.label_format: png' (packed formats keep one bit per pixel)")
+            if "volume" in config:
+                self.warnings.append("Sections of volumes are labelled from voxel regions and ignore 'label_info.mode: coverage'")
+        
+        unknown = set(label_config) - {"color", "thickness", "mode", "samples"}
+        if unknown:
+            self.errors.append(f"Unknown 'label_info' settings: {sorted(unknown)}")
     
     def _validate_post_processors(self, config: Dict[str, Any]):
         """Validate post-processors"""
@@ -134,7 +274,7 @@ class VoronoiConfigValidator:
             self.errors.append("'post_processors' must be a list")
             return
         
-        valid_types = ["crop", "elliptical_mask", "gaussian_noise", "perlin_noise"]
+        valid_types = ["crop", "elliptical_mask", "gaussian_noise", "perlin_noise", "gaussian_blur", "psf", "brightness_gradient"]
         valid_apply_to = ["image", "label", "both"]
         
         for i, processor in enumerate(processors):
@@ -224,6 +364,48 @@ class VoronoiConfigValidator:
                 self.errors.append(f"post_processors[{index}].params.noise_range is required")
             elif not isinstance(params["noise_range"], (int, float)) or params["noise_range"] <= 0:
                 self.errors.append(f"post_processors[{index}].params.noise_range must be a positive number")
+        
+        elif processor_type == "gaussian_blur":
+            if "sigma" not in params:
+                self.errors.append(f"post_processors[{index}].params.sigma is required")
+            elif not isinstance(params["sigma"], (int, float)) or params["sigma"] < 0:
+                self.errors.append(f"post_processors[{index}].params.sigma must be a non-negative number")
+            
+            if "sigma_y" in params and (not isinstance(params["sigma_y"], (int, float)) or params["sigma_y"] < 0):
+                self.errors.append(f"post_processors[{index}].params.sigma_y must be a non-negative number")
+            if "angle" in params and not isinstance(params["angle"], (int, float)):
+                self.errors.append(f"post_processors[{index}].params.angle must be a number")
+        
+        elif processor_type == "psf":
+            if ("kernel" in params) == ("path" in params):
+                self.errors.append(f"post_processors[{index}].params must have exactly one of 'kernel' and 'path'")
+            elif "kernel" in params:
+                kernel = params["kernel"]
+                if (not isinstance(kernel, list) or len(kernel) == 0
+                        or not all(isinstance(row, list) and len(row) == len(kernel[0]) > 0 for row in kernel)):
+                    self.errors.append(f"post_processors[{index}].params.kernel must be a non-empty 2D list with rows of equal length")
+                elif not all(isinstance(x, (int, float)) for row in kernel for x in row):
+                    self.errors.append(f"Each element of post_processors[{index}].params.kernel must be a number")
+                elif params.get("normalize", True) and sum(x for row in kernel for x in row) == 0:
+                    self.errors.append(f"post_processors[{index}].params.kernel cannot be normalized (zero sum)")
+            elif not isinstance(params["path"], str):
+                self.errors.append(f"post_processors[{index}].params.path must be a string")
+            elif not params["path"].endswith(".npy"):
+                self.errors.append(f"post_processors[{index}].params.path must be a .npy file")
+            
+            if "normalize" in params and not isinstance(params["normalize"], bool):
+                self.errors.append(f"post_processors[{index}].params.normalize must be a boolean")
+        
+        elif processor_type == "brightness_gradient":
+            for param in ["min_amplitude", "max_amplitude"]:
+                if param not in params:
+                    self.errors.append(f"post_processors[{index}].params.{param} is required")
+                elif not isinstance(params[param], (int, float)) or params[param] < 0:
+                    self.errors.append(f"post_processors[{index}].params.{param} must be a non-negative number")
+            
+            if (isinstance(params.get("min_amplitude"), (int, float)) and isinstance(params.get("max_amplitude"), (int, float))
+                    and params["min_amplitude"] > params["max_amplitude"]):
+                self.errors.append(f"post_processors[{index}].params.min_amplitude must be less than or equal to max_amplitude")
     
     def _validate_datatype_info(self, config: Dict[str, Any]):
         """Validate datatype information"""
@@ -280,6 +462,204 @@ class VoronoiConfigValidator:
             if split_config.get("split_height", 0) > config["height"]:
                 self.warnings.append("split_height is larger than the original image height")
     
+    def _validate_output_settings(self, config: Dict[str, Any]):
+        """Validate output settings"""
+        output_config = config["output"]
+        if not isinstance(output_config, dict):
+            self.errors.append("'output' must be a dictionary")
+            return
+        
+        if "label_format" in output_config and output_config["label_format"] not in LABEL_FORMATS:
+            self.errors.append(f"'output.label_format' must be one of {LABEL_FORMATS}")
+        
+        if "backend" in output_config and output_config["backend"] not in ["files", "tar", "vector"]:
+            self.errors.append("'output.backend' must be 'files', 'tar' or 'vector'")
+        elif output_config.get("backend") == "vector":
+            if "laguerre" in config:
+                self.errors.append("'output.backend: vector' is not supported with 'laguerre' (power diagrams have no facets)")
+            if "volume" in config:
+                self.errors.append("'output.backend: vector' is not supported with 'volume'")
+            if "qa" in config:
+                self.warnings.append("'qa' is ignored with 'output.backend: vector' (run qa.py on the rasterized dataset)")
+        
+        if "shard_size_mb" in output_config:
+            shard_size = output_config["shard_size_mb"]
+            if not isinstance(shard_size, (int, float)) or shard_size <= 0:
+                self.errors.append("'output.shard_size_mb' must be a positive number")
+            elif output_config.get("backend", "files") != "tar":
+                self.warnings.append("'output.shard_size_mb' is only used with 'output.backend: tar'")
+        
+        if "weight_map" in output_config:
+            self._validate_weight_map(output_config["weight_map"])
+        
+        if "grain_graph" in output_config:
+            if not isinstance(output_config["grain_graph"], bool):
+                self.errors.append("'output.grain_graph' must be a boolean")
+            elif output_config["grain_graph"]:
+                if "laguerre" in config:
+                    self.errors.append("'output.grain_graph' is not supported with 'laguerre' (power diagrams have no facets)")
+                if "volume" in config:
+                    self.errors.append("'output.grain_graph' is not supported with 'volume'")
+                if output_config.get("backend") == "vector":
+                    self.warnings.append("'output.grain_graph' is saved by rasterize.py with 'output.backend: vector'")
+        
+        unknown = set(output_config) - {"label_format", "backend", "shard_size_mb", "weight_map", "grain_graph"}
+        if unknown:
+            self.errors.append(f"Unknown 'output' settings: {sorted(unknown)}")
+    
+    def _validate_weight_map(self, weight_config: Any):
+        """Validate U-Net weight map settings"""
+        if not isinstance(weight_config, dict):
+            self.errors.append("'output.weight_map' must be a dictionary")
+            return
+        
+        if "w0" in weight_config:
+            w0 = weight_config["w0"]
+            if not isinstance(w0, (int, float)) or w0 < 0:
+                self.errors.append("'output.weight_map.w0' must be a non-negative number")
+        
+        if "sigma" in weight_config:
+            sigma = weight_config["sigma"]
+            if not isinstance(sigma, (int, float)) or sigma <= 0:
+                self.errors.append("'output.weight_map.sigma' must be a positive number")
+        
+        if "class_balance" in weight_config and not isinstance(weight_config["class_balance"], bool):
+            self.errors.append("'output.weight_map.class_balance' must be a boolean")
+        
+        unknown = set(weight_config) - {"w0", "sigma", "class_balance"}
+        if unknown:
+            self.errors.append(f"Unknown 'output.weight_map' settings: {sorted(unknown)}")
+    
+    def _validate_parallel_settings(self, config: Dict[str, Any]):
+        """Validate intra-diagram thread settings"""
+        parallel = config["parallel"]
+        if not isinstance(parallel, dict):
+            self.errors.append("'parallel' must be a dictionary")
+            return
+        
+        if parallel.get("threads") is not None:
+            if not isinstance(parallel["threads"], int) or parallel["threads"] <= 0:
+                self.errors.append("'parallel.threads' must be a positive integer or null (number of CPUs)")
+        
+        if "band_rows" in parallel:
+            if not isinstance(parallel["band_rows"], int) or parallel["band_rows"] <= 0:
+                self.errors.append("'parallel.band_rows' must be a positive integer")
+        
+        if any(isinstance(p, dict) and p.get("type") == "gaussian_noise" for p in config.get("post_processors", [])):
+            self.warnings.append("'gaussian_noise' draws different noise with 'parallel' (random generators seeded per band)")
+        
+        unknown = set(parallel) - {"threads", "band_rows"}
+        if unknown:
+            self.errors.append(f"Unknown 'parallel' settings: {sorted(unknown)}")
+    
+    def _validate_qa_settings(self, config: Dict[str, Any]):
+        """Validate QA contact sheet settings"""
+        qa_config = config["qa"]
+        if not isinstance(qa_config, dict):
+            self.errors.append("'qa' must be a dictionary")
+            return
+        
+        for key in ["sheets", "tiles_per_sheet", "thumb_size"]:
+            if key in qa_config and (not isinstance(qa_config[key], int) or qa_config[key] <= 0):
+                self.errors.append(f"'qa.{key}' must be a positive integer")
+        
+        if "seed" in qa_config and not isinstance(qa_config["seed"], int):
+            self.errors.append("'qa.seed' must be an integer")
+        
+        unknown = set(qa_config) - {"sheets", "tiles_per_sheet", "thumb_size", "seed"}
+        if unknown:
+            self.errors.append(f"Unknown 'qa' settings: {sorted(unknown)}")
+    
+    def _validate_laguerre_settings(self, config: Dict[str, Any]):
+        """Validate Laguerre (power diagram) settings"""
+        laguerre = config["laguerre"]
+        if not isinstance(laguerre, dict):
+            self.errors.append("'laguerre' must be a dictionary")
+            return
+        
+        method = laguerre.get("method", "lognormal")
+        valid_params = {"uniform": ["min_radius", "max_radius"], "lognormal": ["mean_radius", "sigma"]}
+        if method not in valid_params:
+            self.errors.append("'laguerre.method' must be 'uniform' or 'lognormal'")
+        else:
+            params = laguerre.get("params", {})
+            if not isinstance(params, dict):
+                self.errors.append("'laguerre.params' must be a dictionary")
+            else:
+                for key in params:
+                    if key not in valid_params[method]:
+                        self.errors.append(f"'laguerre.params.{key}' is not a valid parameter for '{method}'")
+                    elif not isinstance(params[key], (int, float)) or params[key] < 0:
+                        self.errors.append(f"'laguerre.params.{key}' must be a non-negative number")
+                if method == "uniform" and isinstance(params.get("min_radius"), (int, float)) and isinstance(params.get("max_radius"), (int, float)):
+                    if params["min_radius"] > params["max_radius"]:
+                        self.errors.append("'laguerre.params.min_radius' must be less than or equal to max_radius")
+                if method == "lognormal" and params.get("mean_radius") == 0:
+                    self.errors.append("'laguerre.params.mean_radius' must be positive")
+        
+        if "block" in laguerre:
+            block = laguerre["block"]
+            if not isinstance(block, list) or len(block) != 2 or not all(isinstance(b, int) and b > 0 for b in block):
+                self.errors.append("'laguerre.block' must be a list of 2 positive integers")
+        
+        if config.get("periodic", False):
+            self.errors.append("'periodic' is not supported with 'laguerre'")
+        if "texture" in config.get("image_info", {}):
+            self.errors.append("'image_info.texture' is not supported with 'laguerre'")
+        if isinstance(config.get("label_info"), dict) and config["label_info"].get("mode") == "coverage":
+            self.errors.append("'label_info.mode: coverage' is not supported with 'laguerre' (labels are outlined from the instance map)")
+        if "volume" in config:
+            self.warnings.append("'laguerre' is ignored by volumes")
+        
+        unknown = set(laguerre) - {"method", "params", "block"}
+        if unknown:
+            self.errors.append(f"Unknown 'laguerre' settings: {sorted(unknown)}")
+    
+    def _validate_volume_settings(self, config: Dict[str, Any]):
+        """Validate 3D volume settings (used by sections.py)"""
+        volume_config = config["volume"]
+        if not isinstance(volume_config, dict):
+            self.errors.append("'volume' must be a dictionary")
+            return
+        
+        # depth
+        if "depth" not in volume_config:
+            self.errors.append("'volume.depth' is required")
+        elif not isinstance(volume_config["depth"], int) or volume_config["depth"] <= 0:
+            self.errors.append("'volume.depth' must be a positive integer")
+        
+        if "sections_per_volume" in volume_config:
+            if not isinstance(volume_config["sections_per_volume"], int) or volume_config["sections_per_volume"] <= 0:
+                self.errors.append("'volume.sections_per_volume' must be a positive integer")
+        
+        if "max_tilt" in volume_config:
+            max_tilt = volume_config["max_tilt"]
+            if not isinstance(max_tilt, (int, float)) or not 0 <= max_tilt < 90:
+                self.errors.append("'volume.max_tilt' must be a number in [0, 90)")
+            elif isinstance(volume_config.get("depth"), int) and "width" in config and "height" in config:
+                extent = math.sin(math.radians(max_tilt)) * math.hypot(config["height"] - 1, config["width"] - 1)
+                if extent > volume_config["depth"] - 1:
+                    self.warnings.append("Sections tilted close to 'volume.max_tilt' do not fit in the volume and are clamped at its faces")
+        
+        if "path" in volume_config:
+            if volume_config["path"] is not None and not isinstance(volume_config["path"], str):
+                self.errors.append("'volume.path' must be a string")
+        
+        if "block" in volume_config:
+            block = volume_config["block"]
+            if not isinstance(block, list) or len(block) != 3 or not all(isinstance(x, int) and x > 0 for x in block):
+                self.errors.append("'volume.block' must be a list of 3 positive integers")
+        
+        unknown = set(volume_config) - {"depth", "sections_per_volume", "max_tilt", "path", "block"}
+        if unknown:
+            self.errors.append(f"Unknown 'volume' settings: {sorted(unknown)}")
+        
+        # 2D-only settings
+        if config.get("periodic", False):
+            self.errors.append("'periodic' is not supported for volumes")
+        if "bank" in config.get("point_generation", {}).get("params", {}):
+            self.errors.append("'bank' is not supported for volumes")
+    
     def get_errors(self) -> List[str]:
         """Get list of error messages"""
         return self.errors
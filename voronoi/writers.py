@@ -0,0 +1,195 @@
+"""
+Classes related to writing datasets into tar shards
+"""
+
+import io
+import os
+import json
+import queue
+import tarfile
+import threading
+import cv2
+import numpy as np
+from typing import Dict, Any, Iterator, Optional, Tuple
+from utils.label_codecs import encode_label, decode_label
+from utils.adjacency import GrainGraph
+
+# Size of a tar header and of the blocks member data is padded to
+TAR_BLOCK_SIZE = 512
+
+
+class TarShardWriter:
+    """Class for writing image/label pairs into size-bounded tar shards (WebDataset layout)
+
+    Each sample is stored as consecutive members sharing a key:
+    `<key>.image.png`, `<key>.label.<png|npz>`, `<key>.weight.npy` (float16
+    weight map, when given), `<key>.graph.npz` (grain graph, when given) and
+    `<key>.json` (metadata).
+    Encoding and writing happen on a background thread, so generation keeps
+    running while shards are written. A shard is closed when the next sample
+    would make it exceed the size limit, and an index of all shards is
+    written to index.json on close.
+
+    Attributes:
+        output_dir (str): Directory the shards are written to
+        shard_size (int): Maximum size of a shard in bytes (a single larger sample gets its own shard)
+        label_format (str): Label format ('png', 'packed' or 'rle')
+        shards (List[Dict[str, Any]]): Index entries of the shards written so far
+    """
+
+    def __init__(self, output_dir: str, shard_size: int = 256 * 1024 ** 2,
+                 label_format: str = "png", queue_size: int = 16):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.label_format = label_format
+        self.shards = []
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._tar = None
+        self._error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, key: str, image: np.ndarray, label, metadata: Dict[str, Any], weight: Optional[np.ndarray] = None,
+              graph: Optional[GrainGraph] = None):
+        """Queue a sample for writing (blocks while the queue is full)
+
+        Args:
+            key (str): Key of the sample (must not contain dots)
+            image (np.ndarray): Image
+            label (np.ndarray or PackedLabel): Label
+            metadata (Dict[str, Any]): JSON-serializable metadata (seed, parameters, ...)
+            weight (Optional[np.ndarray]): Loss weight map (stored as float16)
+            graph (Optional[GrainGraph]): Grain adjacency graph of the tile
+        """
+        if "." in key:
+            raise ValueError(f"Sample keys must not contain dots: {key}")
+        self._raise_error()
+        self._queue.put((key, image, label, metadata, weight, graph))
+
+    def close(self):
+        """Write the queued samples, close the last shard and write the index"""
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+        index = {
+            "label_format": self.label_format,
+            "samples": sum(shard["samples"] for shard in self.shards),
+            "shards": self.shards,
+        }
+        with open(os.path.join(self.output_dir, "index.json"), "w") as f:
+            json.dump(index, f, indent=2)
+
+    def __enter__(self) -> "TarShardWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._queue.put(None)
+            self._thread.join()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(f"Shard writer failed: {self._error}") from self._error
+
+    def _run(self):
+        """Encode and write queued samples until the end marker"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue  # Drain the queue so that producers do not block
+            try:
+                self._write_sample(*item)
+            except Exception as e:
+                self._error = e
+        try:
+            self._close_shard()
+        except Exception as e:
+            self._error = self._error or e
+
+    def _write_sample(self, key: str, image: np.ndarray, label, metadata: Dict[str, Any], weight: Optional[np.ndarray],
+                      graph: Optional[GrainGraph]):
+        """Encode a sample and append it to the current shard"""
+        label_extension, label_data = encode_label(label, self.label_format)
+        members = [
+            (f"{key}.image.png", cv2.imencode(".png", image)[1].tobytes()),
+            (f"{key}.label.{label_extension}", label_data),
+        ]
+        if weight is not None:
+            buffer = io.BytesIO()
+            np.save(buffer, weight.astype(np.float16, copy=False), allow_pickle=False)
+            members.append((f"{key}.weight.npy", buffer.getvalue()))
+        if graph is not None:
+            members.append((f"{key}.graph.npz", graph.to_bytes()))
+        members.append((f"{key}.json", json.dumps(metadata, sort_keys=True).encode()))
+        sample_size = sum(TAR_BLOCK_SIZE + -(-len(data) // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE for _, data in members)
+
+        # The end-of-archive blocks and record padding take at most one record
+        if self._tar is not None and self.shards[-1]["size"] + sample_size + tarfile.RECORDSIZE > self.shard_size:
+            self._close_shard()
+        if self._tar is None:
+            self._open_shard()
+
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644  # Fixed metadata (mtime 0) so that shards are reproducible
+            self._tar.addfile(info, io.BytesIO(data))
+        shard = self.shards[-1]
+        shard["samples"] += 1
+        shard["size"] += sample_size
+        shard["keys"].append(key)
+
+    def _open_shard(self):
+        name = f"shard-{len(self.shards):06d}.tar"
+        self._tar = tarfile.open(os.path.join(self.output_dir, name), "w", format=tarfile.USTAR_FORMAT)
+        self.shards.append({"file": name, "samples": 0, "size": 0, "keys": []})
+
+    def _close_shard(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+            shard = self.shards[-1]
+            shard["size"] = os.path.getsize(os.path.join(self.output_dir, shard["file"]))
+
+
+def read_shard(path: str, decode: bool = True) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Stream the samples of a tar shard in order
+
+    Args:
+        path (str): Path of the shard
+        decode (bool): Whether to decode members (image and label arrays, metadata dict) or return raw bytes
+
+    Yields:
+        Tuple[str, Dict[str, Any]]: Key of each sample and its members by suffix ('image', 'label', 'weight', 'graph', 'json')
+    """
+    key, sample = None, {}
+    with tarfile.open(path, "r|") as tar:
+        for member in tar:
+            member_key, suffix = member.name.split(".", 1)
+            if member_key != key and sample:
+                yield key, sample
+                sample = {}
+            key = member_key
+            data = tar.extractfile(member).read()
+            field, extension = suffix.rsplit(".", 1) if "." in suffix else (suffix, suffix)
+            if decode:
+                if field == "image":
+                    data = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+                    data = data[:, :, np.newaxis] if data.ndim == 2 else data
+                elif field == "label":
+                    data = decode_label(data, extension)
+                elif field == "weight":
+                    data = np.load(io.BytesIO(data), allow_pickle=False)
+                elif field == "graph":
+                    data = GrainGraph.from_bytes(data)
+                elif field == "json":
+                    data = json.loads(data)
+            sample[field] = data
+    if sample:
+        yield key, sample